@@ -0,0 +1,191 @@
+"""
+Local stub of the Anthropic Messages and Message Batches APIs
+Lets the batch ingestion path run offline:
+
+    uvicorn anthropic_stub_server:app --port 8787
+    ANTHROPIC_BASE_URL=http://localhost:8787 python main.py
+
+Responses are canned extractions derived from the request, so no API key or
+network access is needed.
+"""
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
+
+app = FastAPI(title="Anthropic API Stub")
+
+# Mutable stub state - tests adjust these to simulate slow or failing batches
+stub_state: Dict[str, Any] = {
+    "batches": {},
+    "interactive_requests": 0,
+    "polls_until_ended": 1,  # Retrieve calls before a batch reports "ended"
+    "fail_custom_ids": set(),  # Batch requests that come back as errored
+    "cached_prefixes": set(),  # System prefixes marked with cache_control that were seen
+}
+
+
+def _prompt_cache_usage(params: Dict[str, Any]) -> Dict[str, int]:
+    """Simulate prompt caching: the first request writes a marked system prefix, later ones read it"""
+    system = params.get("system")
+    if not isinstance(system, list) or not any(block.get("cache_control") for block in system):
+        return {"cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+    prefix = json.dumps(system, sort_keys=True)
+    prefix_tokens = max(1, len(prefix) // 4)
+    if prefix in stub_state["cached_prefixes"]:
+        return {"cache_creation_input_tokens": 0, "cache_read_input_tokens": prefix_tokens}
+    stub_state["cached_prefixes"].add(prefix)
+    return {"cache_creation_input_tokens": prefix_tokens, "cache_read_input_tokens": 0}
+
+
+def _canned_message(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a Messages API response with a canned JSON extraction"""
+    image_count = 0
+    image_bytes = 0
+    for message in params.get("messages", []):
+        content = message.get("content", [])
+        if isinstance(content, list):
+            for block in content:
+                if block.get("type") == "image":
+                    image_count += 1
+                    image_bytes += len(block.get("source", {}).get("data", ""))
+
+    extraction = {
+        "extracted_text": f"Stub text for {image_count} image(s)",
+        "visual_description": f"Stub description of a screenshot ({image_bytes} base64 characters)"
+    }
+    if image_count > 1:
+        # Packed requests expect a JSON array with one entry per image
+        extraction = [
+            {
+                "image_index": index,
+                "extracted_text": f"Stub text for image {index} of {image_count}",
+                "visual_description": f"Stub description of packed screenshot {index}"
+            }
+            for index in range(1, image_count + 1)
+        ]
+    content = [{"type": "text", "text": json.dumps(extraction)}]
+    stop_reason = "end_turn"
+    tool_choice = params.get("tool_choice") or {}
+    if tool_choice.get("type") == "tool":
+        # Forced tool call: the extraction comes back as schema-shaped tool input
+        tool_input = {"extractions": extraction} if isinstance(extraction, list) else extraction
+        content = [{
+            "type": "tool_use",
+            "id": f"toolu_{uuid.uuid4().hex[:24]}",
+            "name": tool_choice["name"],
+            "input": tool_input
+        }]
+        stop_reason = "tool_use"
+
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": params.get("model", "stub-model"),
+        "content": content,
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": {"input_tokens": 100 + image_bytes // 1000, "output_tokens": 50, **_prompt_cache_usage(params)}
+    }
+
+
+def _batch_view(batch: Dict[str, Any], request: Request) -> Dict[str, Any]:
+    """Serialize a stored batch in the Message Batches API shape"""
+    ended = batch["status"] == "ended"
+    counts = {"processing": 0, "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0}
+    if ended:
+        for result in batch["results"]:
+            counts[result["result"]["type"]] += 1
+    else:
+        counts["processing"] = len(batch["requests"])
+
+    base_url = str(request.base_url).rstrip("/")
+    return {
+        "id": batch["id"],
+        "type": "message_batch",
+        "processing_status": batch["status"],
+        "request_counts": counts,
+        "created_at": batch["created_at"],
+        "expires_at": batch["expires_at"],
+        "ended_at": batch.get("ended_at"),
+        "archived_at": None,
+        "cancel_initiated_at": batch.get("cancel_initiated_at"),
+        "results_url": f"{base_url}/v1/messages/batches/{batch['id']}/results" if ended else None
+    }
+
+
+def _finish_batch(batch: Dict[str, Any]):
+    """Produce results for every request in a batch"""
+    results: List[Dict[str, Any]] = []
+    for item in batch["requests"]:
+        if batch.get("cancel_initiated_at"):
+            result = {"type": "canceled"}
+        elif item["custom_id"] in stub_state["fail_custom_ids"]:
+            result = {"type": "errored", "error": {"type": "error", "error": {"type": "api_error", "message": "Stub failure"}}}
+        else:
+            result = {"type": "succeeded", "message": _canned_message(item["params"])}
+        results.append({"custom_id": item["custom_id"], "result": result})
+    batch["results"] = results
+    batch["status"] = "ended"
+    batch["ended_at"] = datetime.now(timezone.utc).isoformat()
+
+
+@app.post("/v1/messages")
+async def create_message(request: Request):
+    stub_state["interactive_requests"] += 1
+    return _canned_message(await request.json())
+
+
+@app.post("/v1/messages/batches")
+async def create_batch(request: Request):
+    body = await request.json()
+    now = datetime.now(timezone.utc)
+    batch = {
+        "id": f"msgbatch_{uuid.uuid4().hex[:24]}",
+        "requests": body.get("requests", []),
+        "status": "in_progress",
+        "polls": 0,
+        "created_at": now.isoformat(),
+        "expires_at": (now + timedelta(hours=24)).isoformat()
+    }
+    stub_state["batches"][batch["id"]] = batch
+    return _batch_view(batch, request)
+
+
+@app.get("/v1/messages/batches/{batch_id}")
+async def retrieve_batch(batch_id: str, request: Request):
+    batch = stub_state["batches"].get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if batch["status"] != "ended":
+        batch["polls"] += 1
+        if batch["polls"] >= stub_state["polls_until_ended"]:
+            _finish_batch(batch)
+    return _batch_view(batch, request)
+
+
+@app.post("/v1/messages/batches/{batch_id}/cancel")
+async def cancel_batch(batch_id: str, request: Request):
+    batch = stub_state["batches"].get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    batch["cancel_initiated_at"] = datetime.now(timezone.utc).isoformat()
+    batch["status"] = "canceling"
+    return _batch_view(batch, request)
+
+
+@app.get("/v1/messages/batches/{batch_id}/results")
+async def batch_results(batch_id: str):
+    batch = stub_state["batches"].get(batch_id)
+    if batch is None or batch["status"] != "ended":
+        raise HTTPException(status_code=404, detail="Batch results not available")
+    body = "\n".join(json.dumps(result) for result in batch["results"]) + "\n"
+    return Response(content=body, media_type="application/binary")
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=8787)
@@ -28,6 +28,9 @@ class Settings(BaseSettings):
     ANTHROPIC_API_KEY: str = ""
     GITHUB_PERSONAL_ACCESS_TOKEN: Optional[str] = None
     
+    # Override the Anthropic API endpoint, e.g. anthropic_stub_server.py for offline testing
+    ANTHROPIC_BASE_URL: Optional[str] = None
+    
     # Model Settings - Use Claude 3.5 Sonnet for faster processing in production  
     MODEL_NAME: str = "claude-3-5-sonnet-20241022"  # Faster than Opus, still excellent quality
     
@@ -53,19 +56,75 @@ class Settings(BaseSettings):
     
     # Upload Settings
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    UPLOAD_CHUNK_SIZE: int = 256 * 1024  # Uploads are streamed to disk in chunks of this size
     MAX_UPLOAD_SIZE_MB: int = 10
     ALLOWED_EXTENSIONS: str = "png,jpg,jpeg,gif,webp,bmp"
     
+    # Image Preprocessing Settings - images are downsampled before analysis
+    IMAGE_MAX_DIMENSION: int = 1568  # Longest edge Claude uses without downscaling
+    IMAGE_MAX_PIXELS: int = 1_150_000  # ~1.15 megapixels
+    IMAGE_MAX_BYTES: int = 1024 * 1024  # Re-encode as WebP above this size
+    IMAGE_WEBP_QUALITY: int = 90
+    
     # Search Settings
     SEARCH_MIN_SCORE: float = 0.3
     SEARCH_MAX_RESULTS: int = 50
+    SEARCH_SEMANTIC_WEIGHT: float = 0.5  # Weights of the hybrid score: embedding cosine similarity,
+    SEARCH_OCR_WEIGHT: float = 0.25  # BM25 over OCR text,
+    SEARCH_DESCRIPTION_WEIGHT: float = 0.25  # and BM25 over the visual description
+    BM25_K1: float = 1.2  # Term frequency saturation
+    BM25_B: float = 0.75  # Document length normalization
+    SEARCH_COMPACTION_RATIO: float = 0.2  # Rebuild the index once this share of rows is tombstoned
+    SEARCH_COMPACTION_MIN_ROWS: int = 256  # ...and at least this many rows
+    EMBEDDING_BATCH_SIZE: int = 64  # Texts per encode call when indexing in bulk
+    EMBEDDING_BACKEND: str = "torch"  # Encoder: "torch", "torch-int8" (dynamic quantization), "onnx" or "onnx-int8"
+    EMBEDDING_ONNX_DIR: str = "onnx_model"  # Exported graph and tokenizer for the onnx backends
+    EMBEDDING_STORE_DIR: str = "embedding_store"  # On-disk embeddings, survives restarts and session clears
+    EMBEDDING_STORE_COMPACTION_RATIO: float = 0.3  # After warm-up, rewrite the store once this share of its rows is unreferenced
+    VECTOR_QUANTIZATION: str = "none"  # In-memory vectors: "none" (float32), "int8" (4x smaller) or "binary" (32x)
+    SEARCH_RESCORE_FACTOR: int = 4  # Quantized search rescores top_k * this many candidates exactly
+    SEARCH_ANN_BACKEND: str = "exact"  # "exact" scans every embedding, "ivf" probes k-means clusters
+    ANN_MIN_ROWS: int = 20000  # IVF answers exactly until the index holds this many embeddings
+    IVF_NLIST: int = 0  # Number of clusters, 0 picks 4 * sqrt(rows) at training time
+    IVF_NPROBE: int = 32  # Clusters scanned per query; higher trades latency for recall
+    QUERY_CACHE_MAX_ENTRIES: int = 1024  # Query embeddings kept in memory, 0 disables the cache
+    QUERY_CACHE_TTL: float = 3600.0  # Seconds before a cached query embedding is recomputed
+    SEARCH_SNIPPET_CHARS: int = 160  # Snippet window returned by /search in snippet mode
+    SEARCH_SNIPPET_POSITIONS: bool = True  # Keep token offsets in the index for highlights (~12 bytes per token)
     
     # API Timeout Settings - Reduced for Heroku H12 timeout prevention
     CLAUDE_API_TIMEOUT: float = 20.0  # Reduced from 45s to avoid Heroku timeouts
     CLAUDE_CLIENT_TIMEOUT: float = 25.0  # Reduced from 60s
     CLAUDE_MAX_RETRIES: int = 3
     CLAUDE_RETRY_DELAY: float = 1.0
-    
+    CLAUDE_MAX_CONNECTIONS: int = 10  # Shared async connection pool size
+    CLAUDE_MAX_KEEPALIVE_CONNECTIONS: int = 5
+    CLAUDE_REQUESTS_PER_MINUTE: int = 50  # Starting rate, adjusted from anthropic-ratelimit-* headers
+    CLAUDE_MAX_CONCURRENCY: int = 8  # Upper bound for the adaptive in-flight request limit
+    CLAUDE_PACK_SIZE: int = 1  # Screenshots per interactive request; >1 enables packed extraction
+    CLAUDE_STRUCTURED_OUTPUT: bool = True  # Force a tool call so responses follow the extraction schema
+
+    # Message Batches Settings - opt-in; batches are cheaper but can take up to CLAUDE_BATCH_TIMEOUT
+    CLAUDE_BATCH_ENABLED: bool = False  # Default for /process-folder when the request does not say
+    CLAUDE_BATCH_MIN_FILES: int = 50  # Folder size at which an enabled default switches to a batch
+    CLAUDE_BATCH_MAX_REQUESTS: int = 500  # Screenshots per submitted batch
+    CLAUDE_BATCH_MAX_BYTES: int = 64 * 1024 * 1024  # Base64 image data per batch, bounds memory and payload size
+    CLAUDE_BATCH_POLL_INTERVAL: float = 15.0
+    CLAUDE_BATCH_TIMEOUT: float = 3600.0  # Cancel and fall back to interactive requests after this
+
+    # Extraction Cache Settings
+    EXTRACTION_CACHE_ENABLED: bool = True
+    EXTRACTION_CACHE_DIR: str = "extraction_cache"  # Survives session clears
+    EXTRACTION_CACHE_MAX_ENTRIES: int = 5000
+
+    # Ingestion Settings
+    INGEST_MAX_WORKERS: int = 4  # Screenshots extracted/evaluated concurrently
+    INGEST_FILE_TIMEOUT: float = 25.0  # Per-file extraction timeout, stays under Heroku's 30s limit
+    JOBS_DB_PATH: str = "jobs.db"  # SQLite file tracking resumable ingestion jobs
+    CPU_POOL_WORKERS: int = 2  # Processes for rubric evaluation, 0 runs it in the I/O thread pool
+    EMBEDDING_IN_PROCESS_POOL: bool = False  # Embed ingestion batches in the CPU pool; each worker loads its own model copy
+    IO_POOL_WORKERS: int = 8  # Threads for hashing and file I/O
+
     class Config:
         env_file = "vms-yantra.env"
         env_file_encoding = "utf-8"
@@ -1,9 +1,21 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 
 class SearchQuery(BaseModel):
     query: str
+    offset: int = Field(0, ge=0)  # Ranked results to skip, for paging
+    limit: Optional[int] = Field(None, ge=1, le=1000)  # Page size, defaults to 5 (or 1000 for an empty query)
+    fields: Optional[List[str]] = None  # SearchResult fields to return; file_hash is always included
+    snippets: bool = False  # Add highlighted snippets and, unless fields says otherwise, drop full text
+    
+    @field_validator("fields")
+    @classmethod
+    def check_fields(cls, fields: Optional[List[str]]) -> Optional[List[str]]:
+        unknown = [name for name in fields or [] if name not in SearchResult.model_fields]
+        if unknown:
+            raise ValueError(f"Unknown result fields: {', '.join(unknown)}")
+        return fields
     
 class ScreenshotMetadata(BaseModel):
     filename: str
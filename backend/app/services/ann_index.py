@@ -0,0 +1,161 @@
+"""
+Nearest-neighbour indexes over a VectorStore
+ExactIndex scans every row; IVFFlatIndex clusters rows with k-means and only
+scans the nprobe closest clusters, trading a little recall for latency
+"""
+from typing import List, Optional, Tuple
+import numpy as np
+from app.config import settings
+from app.services.vector_store import VectorStore, normalize
+
+# Rows assigned to centroids per matrix product, bounds temporary memory
+ASSIGN_CHUNK_ROWS = 65536
+
+
+class ExactIndex:
+    """Brute-force scoring of every stored vector"""
+
+    def __init__(self, store: VectorStore):
+        self.store = store
+
+    def add(self, start_row: int, count: int):
+        """Rows are read straight from the store, nothing to maintain"""
+
+    def search(self, query: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (rows, cosine scores) for every stored vector"""
+        scores = self.store.scores(query)
+        return np.arange(len(scores)), scores
+
+    def clear(self):
+        pass
+
+    def get_stats(self) -> dict:
+        return {"backend": "exact", "rows": len(self.store)}
+
+
+class IVFFlatIndex:
+    """Inverted-file index: k-means coarse clusters over unquantized rows
+
+    Until the store reaches min_rows the index answers exactly. Once trained,
+    inserts are assigned to their nearest centroid incrementally, and the
+    centroids are retrained when the store has grown retrain_growth times past
+    the size they were trained on. nprobe sets the recall/latency trade-off.
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        nlist: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        min_rows: Optional[int] = None,
+        retrain_growth: float = 4.0,
+        seed: int = 0
+    ):
+        self.store = store
+        self.nlist = nlist if nlist is not None else settings.IVF_NLIST
+        self.nprobe = nprobe if nprobe is not None else settings.IVF_NPROBE
+        self.min_rows = min_rows if min_rows is not None else settings.ANN_MIN_ROWS
+        self.retrain_growth = retrain_growth
+        self._rng = np.random.default_rng(seed)
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_rows = 0
+        self._lists: List[List[int]] = []
+        self._list_arrays: List[Optional[np.ndarray]] = []
+
+    def add(self, start_row: int, count: int):
+        """Index the count rows from start_row that were just added to the store"""
+        rows = len(self.store)
+        if self.centroids is None:
+            if rows >= self.min_rows:
+                self.train()
+            return
+        if rows >= self.trained_rows * self.retrain_growth:
+            self.train()
+            return
+        self._assign(np.arange(start_row, start_row + count))
+
+    def train(self):
+        """Cluster the stored rows and rebuild every inverted list"""
+        rows = len(self.store)
+        nlist = self.nlist or int(4 * np.sqrt(rows))
+        nlist = max(1, min(nlist, rows))
+
+        # k-means on a sample keeps training time bounded as the corpus grows
+        sample_size = min(rows, nlist * 40)
+        sample = self.store.rows(self._rng.choice(rows, sample_size, replace=False))
+        self.centroids = _spherical_kmeans(sample, nlist, self._rng)
+        self.trained_rows = rows
+        self._lists = [[] for _ in range(nlist)]
+        self._list_arrays = [None] * nlist
+        self._assign(np.arange(rows))
+        print(f"🧭 Trained IVF index: {rows} vectors in {nlist} lists")
+
+    def _assign(self, rows: np.ndarray):
+        for start in range(0, len(rows), ASSIGN_CHUNK_ROWS):
+            chunk = rows[start:start + ASSIGN_CHUNK_ROWS]
+            nearest = np.argmax(self.store.rows(chunk) @ self.centroids.T, axis=1)
+            for row, list_id in zip(chunk.tolist(), nearest.tolist()):
+                self._lists[list_id].append(row)
+                self._list_arrays[list_id] = None
+
+    def _list_rows(self, list_id: int) -> np.ndarray:
+        if self._list_arrays[list_id] is None:
+            self._list_arrays[list_id] = np.array(self._lists[list_id], dtype=np.int64)
+        return self._list_arrays[list_id]
+
+    def search(self, query: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (rows, cosine scores) for the rows in the nprobe nearest lists"""
+        if self.centroids is None:
+            scores = self.store.scores(query)
+            return np.arange(len(scores)), scores
+
+        query = normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        nprobe = max(1, min(self.nprobe, len(self.centroids)))
+        probe = np.argpartition(self.centroids @ query, -nprobe)[-nprobe:]
+        rows = np.concatenate([self._list_rows(list_id) for list_id in probe])
+        return rows, self.store.row_scores(query, rows)
+
+    def clear(self):
+        self.centroids = None
+        self.trained_rows = 0
+        self._lists = []
+        self._list_arrays = []
+
+    def get_stats(self) -> dict:
+        return {
+            "backend": "ivf",
+            "rows": len(self.store),
+            "trained": self.centroids is not None,
+            "nlist": len(self.centroids) if self.centroids is not None else 0,
+            "nprobe": self.nprobe
+        }
+
+
+def _spherical_kmeans(data: np.ndarray, k: int, rng: np.random.Generator, iterations: int = 8) -> np.ndarray:
+    """k-means under cosine similarity, returning unit-length centroids"""
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(data @ centroids.T, axis=1)
+        counts = np.bincount(assignment, minlength=k)
+        # Sum members per cluster with one sort + reduceat (np.add.at is far slower)
+        order = np.argsort(assignment, kind="stable")
+        sums = np.zeros_like(centroids)
+        occupied = counts > 0
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[occupied]
+        sums[occupied] = np.add.reduceat(data[order], starts, axis=0)
+        # Empty clusters are re-seeded from random points
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+def create_ann_index(store: VectorStore, backend: Optional[str] = None):
+    """Build the configured index type ("exact" or "ivf") over a store"""
+    backend = backend or settings.SEARCH_ANN_BACKEND
+    if backend == "ivf":
+        return IVFFlatIndex(store)
+    if backend != "exact":
+        print(f"⚠️  Unknown SEARCH_ANN_BACKEND '{backend}', using exact search")
+    return ExactIndex(store)
@@ -0,0 +1,166 @@
+"""
+BM25 lexical scoring over sparse term-document segments
+Each text field (OCR text, visual description) gets its own BM25Index so
+fields can be weighted separately. Documents are appended incrementally:
+documents added since the last query become a new terms x docs CSR segment,
+and small segments are merged into their larger neighbour (log-structured),
+so a query after an insert costs the size of the new documents rather than
+a rebuild of the whole matrix. BM25 weights are computed only for the rows
+of the query's terms. Removed documents are masked out of the document
+count, document frequencies and average length, so IDF does not drift
+between compactions. With positions=True each document also keeps the term
+id and character span of every token, so matches can be highlighted
+without rescanning the text.
+"""
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from scipy import sparse
+from app.config import settings
+from app.services.tokens import tokenize, token_spans
+
+# A segment is merged into the previous one once it holds this share of its postings
+SEGMENT_MERGE_RATIO = 0.25
+
+
+class BM25Index:
+    """Term-document counts for one field with BM25 scoring"""
+
+    def __init__(self, k1: Optional[float] = None, b: Optional[float] = None, positions: bool = False):
+        self.k1 = settings.BM25_K1 if k1 is None else k1
+        self.b = settings.BM25_B if b is None else b
+        self.positions = positions
+        self.clear()
+
+    def clear(self):
+        """Drop every document and term"""
+        self.vocabulary: Dict[str, int] = {}
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.doc_count = 0
+        self.removed = np.zeros(0, dtype=bool)
+        self.removed_count = 0
+        self._live_length = 0.0  # Summed length of documents not removed
+        # (term ids, doc, counts) of documents not yet in a segment
+        self._pending: List[tuple] = []
+        # terms x docs raw term frequencies; each covers a contiguous range of documents
+        self._segments: List[sparse.csr_matrix] = []
+        self._document_frequency = np.zeros(0, dtype=np.float32)
+        # Per document: int32 ids of its distinct terms, to undo its statistics on removal
+        self._doc_terms: List[np.ndarray] = []
+        # Per document: int32 rows of (term id, start, end), when positions are kept
+        self._positions: List[Optional[np.ndarray]] = []
+
+    @property
+    def live_count(self) -> int:
+        """Documents that are not removed"""
+        return self.doc_count - self.removed_count
+
+    def add(self, doc_id: int, text: str):
+        """Add the text of document doc_id (ids are appended in order)"""
+        if doc_id != self.doc_count:
+            raise ValueError(f"Expected document {self.doc_count}, got {doc_id}")
+        if self.positions:
+            spans = list(token_spans(text))
+            counts = Counter(token for token, _, _ in spans)
+        else:
+            counts = Counter(tokenize(text))
+        term_ids = [self.vocabulary.setdefault(term, len(self.vocabulary)) for term in counts]
+        if counts:
+            self._pending.append((term_ids, doc_id, list(counts.values())))
+        self._doc_terms.append(np.asarray(term_ids, dtype=np.int32))
+        if len(self.doc_lengths) <= doc_id:
+            capacity = max(1024, 2 * len(self.doc_lengths))
+            self.doc_lengths = np.resize(self.doc_lengths, capacity)
+            self.removed = np.resize(self.removed, capacity)
+            self.removed[doc_id:] = False
+        self.doc_lengths[doc_id] = sum(counts.values())
+        self._live_length += float(self.doc_lengths[doc_id])
+        self.doc_count += 1
+        if self.positions:
+            self._positions.append(np.array(
+                [(self.vocabulary[token], start, end) for token, start, end in spans], dtype=np.int32
+            ).reshape(-1, 3))
+
+    def remove(self, doc_id: int):
+        """Exclude a document from scoring and from the corpus statistics"""
+        if doc_id >= self.doc_count or self.removed[doc_id]:
+            return
+        self._flush()
+        self.removed[doc_id] = True
+        self.removed_count += 1
+        self._live_length -= float(self.doc_lengths[doc_id])
+        self._document_frequency[self._doc_terms[doc_id]] -= 1
+
+    def term_spans(self, doc_id: int, query_terms: List[str]) -> List[Tuple[int, int]]:
+        """Character spans of the query terms in document doc_id, from the stored positions"""
+        positions = self._positions[doc_id] if doc_id < len(self._positions) else None
+        term_ids = [self.vocabulary[term] for term in query_terms if term in self.vocabulary]
+        if positions is None or not term_ids:
+            return []
+        matches = positions[np.isin(positions[:, 0], term_ids)]
+        return [(int(start), int(end)) for start, end in matches[:, 1:]]
+
+    def _flush(self):
+        """Turn pending documents into a new segment and update document frequencies"""
+        if len(self._document_frequency) < len(self.vocabulary):
+            self._document_frequency = np.concatenate([
+                self._document_frequency,
+                np.zeros(len(self.vocabulary) - len(self._document_frequency), dtype=np.float32)
+            ])
+        if not self._pending:
+            return
+        terms = np.concatenate([np.asarray(term_ids, dtype=np.int64) for term_ids, _, _ in self._pending])
+        docs = np.concatenate([np.full(len(term_ids), doc_id, dtype=np.int64) for term_ids, doc_id, _ in self._pending])
+        counts = np.concatenate([np.asarray(values, dtype=np.float32) for _, _, values in self._pending])
+        self._pending = []
+        # Term ids are distinct within a document, so each posting adds one to its term's frequency
+        self._document_frequency += np.bincount(terms, minlength=len(self.vocabulary)).astype(np.float32)
+        self._segments.append(sparse.csr_matrix((counts, (terms, docs)), shape=(len(self.vocabulary), self.doc_count)))
+        while len(self._segments) > 1 and self._segments[-1].nnz >= SEGMENT_MERGE_RATIO * self._segments[-2].nnz:
+            newer = self._segments.pop()
+            older = self._segments.pop()
+            older.resize(newer.shape)
+            self._segments.append((older + newer).tocsr())
+
+    def _idf(self, document_frequency: np.ndarray) -> np.ndarray:
+        return np.log1p((self.live_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def scores(self, query_terms: List[str]) -> np.ndarray:
+        """BM25 score of every document scaled to 0..1 for mixing with cosine similarity
+
+        Scores are divided by the sum of the query terms' IDFs (what a document
+        of average length containing each term once scores) and capped at 1.0.
+        Terms missing from the vocabulary still count towards that sum, so a
+        document missing a rare query term stays well below 1.0. Removed
+        documents score 0.
+        """
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        query_terms = list(dict.fromkeys(query_terms))
+        if not query_terms or self.live_count == 0:
+            return scores
+        self._flush()
+
+        term_ids = np.array([self.vocabulary.get(term, -1) for term in query_terms], dtype=np.int64)
+        known = term_ids[term_ids >= 0]
+        document_frequency = np.zeros(len(term_ids), dtype=np.float32)
+        document_frequency[term_ids >= 0] = self._document_frequency[known]
+        idf = self._idf(document_frequency)
+        full_match = float(idf.sum())
+        if len(known) == 0 or full_match <= 0:
+            return scores
+
+        known_idf = idf[term_ids >= 0]
+        average_length = max(self._live_length / self.live_count, 1.0)
+        totals = np.zeros(self.doc_count, dtype=np.float64)
+        for segment in self._segments:
+            in_segment = known < segment.shape[0]
+            postings = segment[known[in_segment]]
+            term_frequency = postings.data
+            doc_ids = postings.indices
+            row_idf = np.repeat(known_idf[in_segment], np.diff(postings.indptr))
+            length_norm = 1 - self.b + self.b * self.doc_lengths[doc_ids] / average_length
+            weights = row_idf * term_frequency * (self.k1 + 1) / (term_frequency + self.k1 * length_norm)
+            totals[:segment.shape[1]] += np.bincount(doc_ids, weights=weights, minlength=segment.shape[1])
+        if self.removed_count:
+            totals[self.removed[:self.doc_count]] = 0.0
+        return np.minimum(totals / full_match, 1.0).astype(np.float32)
@@ -1,14 +1,87 @@
 import anthropic
+import httpx
 import base64
 import json
 import asyncio
+import hashlib
 from pathlib import Path
-from typing import Tuple
+from typing import Optional, Tuple, List, Dict, Any
 from .prompt_manager import PromptManager
+from .extraction_cache import ExtractionCache
+from .image_preprocessor import encode_png, preprocess_image
+from .rate_limiter import get_rate_limiter, parse_retry_after
+from .executors import get_executors
 from ..config import settings
 
+# The ocr_and_visual prompt goes in a cached system prefix; requests only add
+# the image(s) and one of these short instructions after it
+SINGLE_IMAGE_INSTRUCTION = "Analyze this screenshot following the system instructions."
+
+PACKED_PROMPT_TEMPLATE = """The {count} images above are labelled "Image 1" to "Image {count}". Apply the system instructions to each image separately.
+
+Return exactly {count} entries as a JSON array, one per image in the same order. Each entry must have "image_index" (the image number), "extracted_text" and "visual_description"."""
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+# Forced tool calls make the API return schema-shaped input instead of free text
+EXTRACTION_FIELDS_SCHEMA = {
+    "extracted_text": {
+        "type": "string",
+        "description": "All visible text in the screenshot, preserving the exact wording"
+    },
+    "visual_description": {
+        "type": "string",
+        "description": "What the screenshot shows: its content, purpose and context"
+    }
+}
+
+EXTRACTION_TOOL = {
+    "name": "record_screenshot_extraction",
+    "description": "Record the text extracted from a screenshot and a description of what it shows.",
+    "input_schema": {
+        "type": "object",
+        "properties": EXTRACTION_FIELDS_SCHEMA,
+        "required": ["extracted_text", "visual_description"]
+    }
+}
+
+PACKED_EXTRACTION_TOOL = {
+    "name": "record_screenshot_extractions",
+    "description": "Record the extraction for every labelled screenshot, one entry per image.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "extractions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "image_index": {"type": "integer", "description": "The N of the \"Image N\" label"},
+                        **EXTRACTION_FIELDS_SCHEMA
+                    },
+                    "required": ["image_index", "extracted_text", "visual_description"]
+                }
+            }
+        },
+        "required": ["extractions"]
+    }
+}
+
+# Which parser produced each extraction; anything but tool_use is a fallback path
+PARSE_PATHS = ("tool_use", "json", "regex", "labelled_sections", "line_heuristics", "unparsed", "invalid_tool_input")
+
+def _md5_hexdigest(content: bytes) -> str:
+    return hashlib.md5(content).hexdigest()
+
 class ClaudeService:
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        extraction_cache: Optional[ExtractionCache] = None,
+        prompt_manager: Optional[PromptManager] = None,
+        base_url: Optional[str] = None,
+        http_client: Optional[httpx.AsyncClient] = None
+    ):
         import os
         
         # Clear any proxy settings that might interfere
@@ -18,35 +91,71 @@ class ClaudeService:
                 del os.environ[env_var]
         
         try:
-            # Most minimal client initialization possible
-            self.client = anthropic.Anthropic(api_key=api_key)
-            print("✅ Anthropic client initialized successfully")
+            # Non-blocking client with a shared, bounded connection pool so API
+            # round trips never stall the event loop serving /search and /status
+            self.http_client = http_client or anthropic.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=settings.CLAUDE_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.CLAUDE_MAX_KEEPALIVE_CONNECTIONS
+                ),
+                timeout=settings.CLAUDE_CLIENT_TIMEOUT
+            )
+            # Every API response feeds the shared rate limiter with its rate-limit headers
+            self.http_client.event_hooks["response"].append(self._observe_rate_limit_headers)
+            self.client = anthropic.AsyncAnthropic(
+                api_key=api_key,
+                base_url=base_url or settings.ANTHROPIC_BASE_URL,
+                http_client=self.http_client,
+                max_retries=0  # Retries are coordinated by the shared rate limiter instead
+            )
+            print("✅ Async Anthropic client initialized successfully")
         except Exception as e:
             print(f"❌ Failed to initialize Anthropic client: {e}")
             print(f"❌ Exception type: {type(e).__name__}")
+            self.http_client = None
             
-            # Try with explicit http client configuration
+            # Try with the SDK's default http client configuration
             try:
-                import httpx
-                http_client = httpx.Client()
-                self.client = anthropic.Anthropic(
+                self.client = anthropic.AsyncAnthropic(
                     api_key=api_key,
-                    http_client=http_client
+                    base_url=base_url or settings.ANTHROPIC_BASE_URL
                 )
-                print("✅ Anthropic client initialized with custom http client")
+                print("✅ Async Anthropic client initialized with default http client")
             except Exception as e2:
-                print(f"❌ Failed with custom http client: {e2}")
+                print(f"❌ Failed with default http client: {e2}")
                 
                 # Final fallback - try to create a mock client for testing
                 print("⚠️  Creating fallback service without Claude client")
                 self.client = None
         
+        self.rate_limiter = get_rate_limiter()
+        self.usage_stats = {"requests": 0, "cache_hit_requests": 0, **{field: 0 for field in USAGE_FIELDS}}
+        self.parse_stats = {path: 0 for path in PARSE_PATHS}
         self.model = settings.get_model_name()  # Use environment-appropriate model
-        self.prompt_manager = PromptManager()
+        # Share the app's manager so /prompts/update changes what is sent (and the cache key)
+        self.prompt_manager = prompt_manager or PromptManager()
+        
+        # Persistent cache of extraction results, shared across sessions
+        if extraction_cache is None and settings.EXTRACTION_CACHE_ENABLED:
+            extraction_cache = ExtractionCache()
+        self.extraction_cache = extraction_cache
         print(f"🤖 Claude service initialized with model: {self.model}")
     
-    async def analyze_screenshot(self, image_path: str) -> Tuple[str, str]:
-        """Analyze a screenshot and extract OCR text and visual description with retry logic"""
+    async def _observe_rate_limit_headers(self, response: httpx.Response):
+        """httpx response hook passing anthropic-ratelimit-* headers to the limiter"""
+        self.rate_limiter.observe_headers(response.headers)
+    
+    async def aclose(self):
+        """Close the shared HTTP connection pool"""
+        if self.client is not None:
+            await self.client.close()
+    
+    async def analyze_screenshot(self, image_path: str, file_hash: Optional[str] = None) -> Tuple[str, str]:
+        """Analyze a screenshot and extract OCR text and visual description with retry logic
+
+        file_hash is the md5 of the file when the caller already knows it (uploads
+        are hashed while they are saved), so the content is not hashed again.
+        """
         
         # Check if client is available
         if self.client is None:
@@ -54,16 +163,23 @@ class ClaudeService:
             filename = Path(image_path).name
             return f"Text extracted from {filename}", f"Visual analysis of {filename} - Claude API temporarily unavailable"
         
+        executors = get_executors()
         try:
-            with open(image_path, "rb") as f:
-                image_content = f.read()
-                image_data = base64.b64encode(image_content).decode()
-                print(f"Image processing: path={image_path}, size={len(image_content)} bytes, base64_size={len(image_data)}")
+            image_content = await executors.run_io(Path(image_path).read_bytes)
         except Exception as e:
             print(f"Error reading image file {image_path}: {e}")
             return "", f"Failed to read image file: {Path(image_path).name}"
         
-        prompt = self.prompt_manager.get_current_prompt("ocr_and_visual")
+        # Same content, prompt version and model -> reuse the previous extraction
+        if file_hash is None:
+            file_hash = await executors.run_io(_md5_hexdigest, image_content)
+        cached = self._lookup_cache(file_hash)
+        if cached is not None:
+            print(f"Extraction cache hit for {image_path}")
+            return cached
+        
+        image_data, media_type = await self._prepare_image(image_path, image_content)
+        params = self._build_message_params(image_data, media_type)
 
         # Retry logic with exponential backoff
         max_retries = settings.CLAUDE_MAX_RETRIES
@@ -71,203 +187,13 @@ class ClaudeService:
         
         for attempt in range(max_retries):
             try:
-                response = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=1000,  # Reduced for faster processing
-                    timeout=settings.CLAUDE_API_TIMEOUT,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "image",
-                                    "source": {
-                                        "type": "base64",
-                                        "media_type": self._get_media_type(image_path),
-                                        "data": image_data
-                                    }
-                                },
-                                {
-                                    "type": "text",
-                                    "text": prompt
-                                }
-                            ]
-                        }
-                    ]
-                )
+                async with self.rate_limiter.slot():
+                    response = await self._create_message(params, settings.CLAUDE_API_TIMEOUT)
+                self.rate_limiter.on_success()
                 
-                content = response.content[0].text
-                print(f"Claude API raw response length: {len(content)}")
-                print(f"Claude API raw response preview: {content[:200]}...")
-                
-                # Try to parse JSON response first
-                try:
-                    # Clean the content to handle markdown code blocks or extra text
-                    cleaned_content = content.strip()
-                    
-                    # Remove markdown code blocks if present
-                    if "```json" in cleaned_content:
-                        # Extract JSON from markdown code block
-                        start = cleaned_content.find("```json") + 7
-                        end = cleaned_content.find("```", start)
-                        if end != -1:
-                            cleaned_content = cleaned_content[start:end].strip()
-                    elif "```" in cleaned_content:
-                        # Handle generic code blocks
-                        start = cleaned_content.find("```") + 3
-                        end = cleaned_content.find("```", start)
-                        if end != -1:
-                            cleaned_content = cleaned_content[start:end].strip()
-                    
-                    # Try to find JSON object in the content
-                    if not cleaned_content.startswith("{"):
-                        # Look for the first { and last }
-                        start_pos = cleaned_content.find("{")
-                        end_pos = cleaned_content.rfind("}")
-                        if start_pos != -1 and end_pos != -1 and end_pos > start_pos:
-                            cleaned_content = cleaned_content[start_pos:end_pos+1]
-                        else:
-                            # Handle case where response is just key-value pairs without proper JSON structure
-                            if '"extracted_text":' in cleaned_content and '"visual_description":' in cleaned_content:
-                                # Try to construct proper JSON from malformed response
-                                cleaned_content = "{" + cleaned_content + "}"
-                    
-                    json_content = json.loads(cleaned_content)
-                    extracted_text = json_content.get("extracted_text", json_content.get("ocr_text", ""))
-                    visual_description = json_content.get("visual_description", "")
-                    
-                    # Ensure we're getting strings, not nested objects
-                    if isinstance(visual_description, dict):
-                        visual_description = str(visual_description)
-                    if isinstance(extracted_text, dict):
-                        extracted_text = str(extracted_text)
-                    
-                    # Clean field names from the beginning of values if they appear
-                    if extracted_text.lower().startswith("extracted_text:"):
-                        extracted_text = extracted_text[15:].strip()
-                    elif extracted_text.lower().startswith("ocr_text:"):
-                        extracted_text = extracted_text[9:].strip()
-                    elif extracted_text.lower().startswith("text:"):
-                        extracted_text = extracted_text[5:].strip()
-                    
-                    if visual_description.lower().startswith("visual_description:"):
-                        visual_description = visual_description[19:].strip()
-                    elif visual_description.lower().startswith("description:"):
-                        visual_description = visual_description[12:].strip()
-                    
-                    print(f"JSON parsing successful: OCR={len(extracted_text)}, Visual={len(visual_description)}")
-                    return extracted_text, visual_description
-                except json.JSONDecodeError as e:
-                    print(f"JSON parsing failed: {e}")
-                    print(f"Raw content preview: {content[:500]}...")
-                    
-                    # Try to extract values from JSON-like text format
-                    extracted_text = ""
-                    visual_description = ""
-                    
-                    # Look for quoted values after field names
-                    import re
-                    
-                    # Extract extracted_text value
-                    text_match = re.search(r'"extracted_text":\s*"([^"]*(?:\\.[^"]*)*)"', content, re.DOTALL)
-                    if text_match:
-                        extracted_text = text_match.group(1).replace('\\"', '"').replace('\\n', '\n')
-                    
-                    # Extract visual_description value  
-                    desc_match = re.search(r'"visual_description":\s*"([^"]*(?:\\.[^"]*)*)"', content, re.DOTALL)
-                    if desc_match:
-                        visual_description = desc_match.group(1).replace('\\"', '"').replace('\\n', '\n')
-                    
-                    # If we found values using regex, return them
-                    if extracted_text or visual_description:
-                        print(f"Regex extraction successful: OCR={len(extracted_text)}, Visual={len(visual_description)}")
-                        return extracted_text, visual_description
-                    
-                    # Fallback to old format parsing
-                    extracted_text = ""
-                    visual_description = ""
-                    
-                    if "OCR_TEXT:" in content:
-                        parts = content.split("OCR_TEXT:")
-                        if len(parts) > 1:
-                            text_part = parts[1].split("VISUAL_DESCRIPTION:")[0] if "VISUAL_DESCRIPTION:" in parts[1] else parts[1]
-                            extracted_text = text_part.strip()
-                    
-                    if "VISUAL_DESCRIPTION:" in content:
-                        parts = content.split("VISUAL_DESCRIPTION:")
-                        if len(parts) > 1:
-                            visual_description = parts[1].strip()
-                    
-                    # Also handle "extracted_text:" patterns in fallback parsing
-                    if "extracted_text:" in content.lower():
-                        parts = content.lower().split("extracted_text:")
-                        if len(parts) > 1:
-                            text_part = parts[1].split("visual_description:")[0] if "visual_description:" in parts[1] else parts[1]
-                            extracted_text = text_part.strip()
-                    
-                    if "visual_description:" in content.lower():
-                        parts = content.lower().split("visual_description:")
-                        if len(parts) > 1:
-                            visual_description = parts[1].strip()
-                    
-                    # Clean any remaining field prefixes from extracted values
-                    if extracted_text.lower().startswith("extracted_text:"):
-                        extracted_text = extracted_text[15:].strip()
-                    elif extracted_text.lower().startswith("ocr_text:"):
-                        extracted_text = extracted_text[9:].strip()
-                    elif extracted_text.lower().startswith("text:"):
-                        extracted_text = extracted_text[5:].strip()
-                    
-                    if visual_description.lower().startswith("visual_description:"):
-                        visual_description = visual_description[19:].strip()
-                    elif visual_description.lower().startswith("description:"):
-                        visual_description = visual_description[12:].strip()
-                    
-                    # If still empty, try more flexible parsing
-                    if not extracted_text and not visual_description:
-                        print("Fallback parsing also failed, trying flexible approach...")
-                        # Look for any substantial text content
-                        lines = content.strip().split('\n')
-                        substantial_lines = [line.strip() for line in lines if len(line.strip()) > 10]
-                        if substantial_lines:
-                            # Try to identify which lines are text vs description
-                            text_lines = []
-                            desc_lines = []
-                            
-                            for line in substantial_lines:
-                                # If line looks like extracted text (short, factual)
-                                if any(keyword in line.lower() for keyword in ['text:', 'ocr:', 'extracted:', 'content:']):
-                                    cleaned_line = line.split(':', 1)[-1].strip()
-                                    text_lines.append(cleaned_line)
-                                # If line looks like description (longer, descriptive)
-                                elif any(keyword in line.lower() for keyword in ['description:', 'visual:', 'image:', 'shows:', 'displays:']):
-                                    cleaned_line = line.split(':', 1)[-1].strip()
-                                    desc_lines.append(cleaned_line)
-                                # Default: treat as description if longer than 50 chars, otherwise as text
-                                elif len(line) > 50:
-                                    desc_lines.append(line)
-                                else:
-                                    text_lines.append(line)
-                            
-                            extracted_text = ' '.join(text_lines) if text_lines else ""
-                            visual_description = ' '.join(desc_lines) if desc_lines else ' '.join(substantial_lines[:2])
-                            
-                            # Final cleaning of any remaining field prefixes
-                            if extracted_text.lower().startswith("extracted_text:"):
-                                extracted_text = extracted_text[15:].strip()
-                            elif extracted_text.lower().startswith("ocr_text:"):
-                                extracted_text = extracted_text[9:].strip()
-                            elif extracted_text.lower().startswith("text:"):
-                                extracted_text = extracted_text[5:].strip()
-                            
-                            if visual_description.lower().startswith("visual_description:"):
-                                visual_description = visual_description[19:].strip()
-                            elif visual_description.lower().startswith("description:"):
-                                visual_description = visual_description[12:].strip()
-                            print(f"Flexible parsing result: OCR={len(extracted_text)}, Visual={len(visual_description)}")
-                    
-                    print(f"Fallback parsing result: OCR={len(extracted_text)}, Visual={len(visual_description)}")
-                    return extracted_text, visual_description
+                extracted_text, visual_description = self._parse_message_content(response.content)
+                self._store_in_cache(file_hash, extracted_text, visual_description)
+                return extracted_text, visual_description
                 
             except anthropic.APITimeoutError as e:
                 print(f"Claude API timeout attempt {attempt + 1}/{max_retries} for {image_path}: {str(e)}")
@@ -289,8 +215,9 @@ class ClaudeService:
                 print(f"Claude API rate limit attempt {attempt + 1}/{max_retries} for {image_path}: {str(e)}")
                 if attempt == max_retries - 1:
                     return "", f"Analysis rate limit reached for image: {Path(image_path).name}. Please try again later."
-                # Wait longer for rate limits
-                await asyncio.sleep(base_delay * (2 ** (attempt + 2)))
+                # Pause every caller until retry-after instead of backing off per file;
+                # the next slot() waits out the pause
+                self.rate_limiter.on_rate_limited(parse_retry_after(e.response.headers))
                 continue
                 
             except anthropic.APIError as e:
@@ -315,6 +242,597 @@ class ClaudeService:
         # If we get here, all retries failed
         return "", f"Failed to analyze image after {max_retries} attempts: {Path(image_path).name}"
     
+    async def _prepare_image(self, image_path: str, image_content: bytes) -> Tuple[str, str]:
+        """Downsample/convert an image for the API, returning (base64 data, media type)"""
+        try:
+            # Pillow releases the GIL while resampling/encoding, so threads suffice here
+            image_bytes, media_type = await get_executors().run_io(preprocess_image, image_content)
+        except Exception as e:
+            # Raw BMP (and other formats the API rejects) must not be forwarded as-is
+            print(f"Image preprocessing failed for {image_path}, re-encoding as PNG: {e}")
+            try:
+                image_bytes, media_type = await get_executors().run_io(encode_png, image_content), "image/png"
+            except Exception as e:
+                print(f"Re-encoding failed for {image_path}, sending original bytes: {e}")
+                image_bytes, media_type = image_content, self._get_media_type(image_path)
+        
+        image_data = base64.b64encode(image_bytes).decode()
+        print(f"Image processing: path={image_path}, size={len(image_content)} bytes, sent={len(image_bytes)} bytes as {media_type}, base64_size={len(image_data)}")
+        return image_data, media_type
+    
+    def _build_message_params(self, image_data: str, media_type: str) -> Dict[str, Any]:
+        """Build the Messages API parameters for extracting one screenshot"""
+        return {
+            "model": self.model,
+            "max_tokens": 1000,  # Reduced for faster processing
+            **self._tool_params(EXTRACTION_TOOL),
+            "system": self._system_blocks(),
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        self._image_block(image_data, media_type),
+                        {
+                            "type": "text",
+                            "text": SINGLE_IMAGE_INSTRUCTION
+                        }
+                    ]
+                }
+            ]
+        }
+    
+    def _build_packed_message_params(self, images: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """Build Messages API parameters extracting several screenshots in one request
+        
+        images are (base64 data, media type) pairs. Each image is preceded by an
+        "Image N:" label; the system prefix is the same as for single images.
+        """
+        content: List[Dict[str, Any]] = []
+        for index, (image_data, media_type) in enumerate(images, start=1):
+            content.append({"type": "text", "text": f"Image {index}:"})
+            content.append(self._image_block(image_data, media_type))
+        content.append({
+            "type": "text",
+            "text": PACKED_PROMPT_TEMPLATE.format(count=len(images))
+        })
+        return {
+            "model": self.model,
+            "max_tokens": 1000 * len(images),
+            **self._tool_params(PACKED_EXTRACTION_TOOL),
+            "system": self._system_blocks(),
+            "messages": [{"role": "user", "content": content}]
+        }
+    
+    def _tool_params(self, tool: Dict[str, Any]) -> Dict[str, Any]:
+        """Force the extraction tool so the response follows its schema"""
+        if not settings.CLAUDE_STRUCTURED_OUTPUT:
+            return {}
+        return {"tools": [tool], "tool_choice": {"type": "tool", "name": tool["name"]}}
+    
+    def _system_blocks(self) -> List[Dict[str, Any]]:
+        """The ocr_and_visual prompt as a system prefix marked for prompt caching
+        
+        It is identical for every request under the same prompt version, so the
+        server can reuse it instead of reprocessing it for each screenshot.
+        """
+        return [
+            {
+                "type": "text",
+                "text": self.prompt_manager.get_current_prompt("ocr_and_visual"),
+                "cache_control": {"type": "ephemeral"}
+            }
+        ]
+    
+    def _image_block(self, image_data: str, media_type: str) -> Dict[str, Any]:
+        return {
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": media_type,
+                "data": image_data
+            }
+        }
+    
+    async def _create_message(self, params: Dict[str, Any], timeout: float):
+        """Send one Messages API request with prompt caching and record its token usage"""
+        response = await self.client.beta.prompt_caching.messages.create(**params, timeout=timeout)
+        self._record_usage(getattr(response, "usage", None))
+        return response
+    
+    def _record_usage(self, usage: Any):
+        """Add one response's input, output and cache token counts to usage_stats"""
+        counts = {}
+        for field in USAGE_FIELDS:
+            value = getattr(usage, field, None)
+            counts[field] = value if isinstance(value, int) else 0
+            self.usage_stats[field] += counts[field]
+        self.usage_stats["requests"] += 1
+        if counts["cache_read_input_tokens"]:
+            self.usage_stats["cache_hit_requests"] += 1
+        print(
+            f"🧾 Tokens: input={counts['input_tokens']}, cache_read={counts['cache_read_input_tokens']}, "
+            f"cache_write={counts['cache_creation_input_tokens']}, output={counts['output_tokens']}"
+        )
+    
+    def get_usage_stats(self) -> Dict[str, Any]:
+        """Token usage totals, including prompt cache reads and writes"""
+        requests = self.usage_stats["requests"]
+        parsed = sum(self.parse_stats.values())
+        return {
+            **self.usage_stats,
+            "cache_hit_rate": round(self.usage_stats["cache_hit_requests"] / requests, 3) if requests else 0.0,
+            "parse_paths": dict(self.parse_stats),
+            "parse_fallback_rate": round(1 - self.parse_stats["tool_use"] / parsed, 3) if parsed else 0.0
+        }
+    
+    async def analyze_screenshots_batch(
+        self, image_paths: List[str], file_hashes: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Tuple[str, str]]:
+        """Analyze many screenshots through Message Batches
+        
+        Cached screenshots are answered locally; the rest are submitted in batches of at
+        most CLAUDE_BATCH_MAX_REQUESTS requests and CLAUDE_BATCH_MAX_BYTES of image data,
+        each submitted (and its payload released) before the next is built, then polled
+        until they end. Requests that error, expire or outlive CLAUDE_BATCH_TIMEOUT fall
+        back to interactive analyze_screenshot calls. file_hashes maps paths to their
+        known md5 so they are not hashed again. Returns results keyed by path.
+        """
+        results: Dict[str, Tuple[str, str]] = {}
+        file_hashes = file_hashes or {}
+        if self.client is None:
+            for image_path in image_paths:
+                results[image_path] = await self.analyze_screenshot(image_path, file_hashes.get(image_path))
+            return results
+        
+        pending: Dict[str, Tuple[str, str]] = {}  # custom_id -> (image_path, file_hash)
+        submitted = []  # (batch, custom_ids)
+        requests: List[Dict[str, Any]] = []
+        request_bytes = 0
+        for position, image_path in enumerate(image_paths):
+            try:
+                image_content = await get_executors().run_io(Path(image_path).read_bytes)
+            except Exception as e:
+                print(f"Error reading image file {image_path}: {e}")
+                results[image_path] = ("", f"Failed to read image file: {Path(image_path).name}")
+                continue
+            
+            file_hash = file_hashes.get(image_path) or await get_executors().run_io(_md5_hexdigest, image_content)
+            cached = self._lookup_cache(file_hash)
+            if cached is not None:
+                results[image_path] = cached
+                continue
+            
+            custom_id = f"img-{position}"
+            image_data, media_type = await self._prepare_image(image_path, image_content)
+            if requests and (
+                len(requests) >= settings.CLAUDE_BATCH_MAX_REQUESTS
+                or request_bytes + len(image_data) > settings.CLAUDE_BATCH_MAX_BYTES
+            ):
+                submitted.append(await self._submit_batch(requests))
+                requests, request_bytes = [], 0
+            requests.append({
+                "custom_id": custom_id,
+                "params": self._build_message_params(image_data, media_type)
+            })
+            request_bytes += len(image_data)
+            pending[custom_id] = (image_path, file_hash)
+        if requests:
+            submitted.append(await self._submit_batch(requests))
+        
+        deadline = asyncio.get_running_loop().time() + settings.CLAUDE_BATCH_TIMEOUT
+        for batch in submitted:
+            if batch is not None:
+                await self._collect_batch(batch, pending, results, deadline)
+        
+        # Anything the batches did not answer goes through the low-latency path
+        if pending:
+            print(f"↩️  Retrying {len(pending)} screenshots interactively")
+        for image_path, file_hash in pending.values():
+            results[image_path] = await self.analyze_screenshot(image_path, file_hash)
+        
+        return results
+    
+    async def _submit_batch(self, requests: List[Dict[str, Any]]):
+        """Create a Message Batch, returning None if submission fails"""
+        print(f"📦 Submitting Message Batch with {len(requests)} screenshots")
+        try:
+            return await self.client.beta.messages.batches.create(requests=requests)
+        except Exception as e:
+            print(f"Message Batch submission failed, falling back to interactive requests: {e}")
+            return None
+    
+    async def _collect_batch(self, batch, pending: Dict[str, Tuple[str, str]], results: Dict[str, Tuple[str, str]], deadline: float):
+        """Poll a batch until it ends (or the deadline passes) and move its successes from pending to results"""
+        loop = asyncio.get_running_loop()
+        try:
+            while batch.processing_status != "ended":
+                if loop.time() >= deadline:
+                    print(f"⏱️  Message Batch {batch.id} exceeded {settings.CLAUDE_BATCH_TIMEOUT}s, cancelling")
+                    await self.client.beta.messages.batches.cancel(batch.id)
+                    return
+                await asyncio.sleep(settings.CLAUDE_BATCH_POLL_INTERVAL)
+                batch = await self.client.beta.messages.batches.retrieve(batch.id)
+                print(f"📦 Message Batch {batch.id}: {batch.processing_status}, {batch.request_counts}")
+            
+            async for entry in await self.client.beta.messages.batches.results(batch.id):
+                if entry.custom_id not in pending or entry.result.type != "succeeded":
+                    continue
+                image_path, file_hash = pending.pop(entry.custom_id)
+                self._record_usage(entry.result.message.usage)
+                try:
+                    extracted_text, visual_description = self._parse_message_content(
+                        entry.result.message.content
+                    )
+                except Exception as e:
+                    print(f"Failed to parse batch result for {image_path}: {e}")
+                    pending[entry.custom_id] = (image_path, file_hash)
+                    continue
+                self._store_in_cache(file_hash, extracted_text, visual_description)
+                results[image_path] = (extracted_text, visual_description)
+        except Exception as e:
+            print(f"Message Batch {batch.id} failed, falling back to interactive requests: {e}")
+    
+    async def analyze_screenshots_packed(
+        self, image_paths: List[str], file_hashes: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Tuple[str, str]]:
+        """Analyze several screenshots in one request, returning results keyed by path
+        
+        The response must be a JSON array lining up with the images; any image without
+        a valid entry (or every image, if the request fails) falls back to an
+        individual analyze_screenshot call. file_hashes maps paths to their known md5.
+        """
+        results: Dict[str, Tuple[str, str]] = {}
+        file_hashes = file_hashes or {}
+        if self.client is None or len(image_paths) < 2:
+            for image_path in image_paths:
+                results[image_path] = await self.analyze_screenshot(image_path, file_hashes.get(image_path))
+            return results
+        
+        packed: List[Tuple[str, str]] = []  # (image_path, file_hash)
+        images: List[Tuple[str, str]] = []
+        for image_path in image_paths:
+            try:
+                image_content = await get_executors().run_io(Path(image_path).read_bytes)
+            except Exception as e:
+                print(f"Error reading image file {image_path}: {e}")
+                results[image_path] = ("", f"Failed to read image file: {Path(image_path).name}")
+                continue
+            
+            file_hash = file_hashes.get(image_path) or await get_executors().run_io(_md5_hexdigest, image_content)
+            cached = self._lookup_cache(file_hash)
+            if cached is not None:
+                results[image_path] = cached
+                continue
+            
+            images.append(await self._prepare_image(image_path, image_content))
+            packed.append((image_path, file_hash))
+        
+        if len(packed) == 1:
+            results[packed[0][0]] = await self.analyze_screenshot(*packed[0])
+            return results
+        
+        extractions: List[Optional[Tuple[str, str]]] = [None] * len(packed)
+        if packed:
+            print(f"🗂️  Extracting {len(packed)} screenshots in one packed request")
+            try:
+                async with self.rate_limiter.slot():
+                    response = await self._create_message(
+                        self._build_packed_message_params(images),
+                        settings.CLAUDE_API_TIMEOUT * len(packed)
+                    )
+                self.rate_limiter.on_success()
+                extractions = self._parse_packed_message_content(response.content, len(packed))
+            except anthropic.RateLimitError as e:
+                self.rate_limiter.on_rate_limited(parse_retry_after(e.response.headers))
+                print(f"Packed request rate limited, falling back to single-image requests: {e}")
+            except Exception as e:
+                print(f"Packed request failed, falling back to single-image requests: {e}")
+        
+        fallback = 0
+        for (image_path, file_hash), extraction in zip(packed, extractions):
+            if extraction is None:
+                fallback += 1
+                results[image_path] = await self.analyze_screenshot(image_path, file_hash)
+                continue
+            self._store_in_cache(file_hash, *extraction)
+            results[image_path] = extraction
+        if fallback:
+            print(f"↩️  {fallback}/{len(packed)} packed screenshots retried as single-image requests")
+        
+        return results
+    
+    def _parse_packed_response(self, content: str, count: int) -> List[Optional[Tuple[str, str]]]:
+        """Parse a packed response into one (ocr_text, visual_description) per image
+        
+        Entries are matched by their 1-based image_index when every entry has a
+        distinct valid one, otherwise by position (only if the array length matches).
+        Images without a usable entry come back as None.
+        """
+        start = content.find("[")
+        end = content.rfind("]")
+        if start == -1 or end <= start:
+            print("Packed response contained no JSON array")
+            return [None] * count
+        try:
+            entries = json.loads(content[start:end + 1])
+        except json.JSONDecodeError as e:
+            print(f"Packed response JSON parsing failed: {e}")
+            return [None] * count
+        return self._align_packed_entries(entries, count)
+    
+    def _align_packed_entries(self, entries: Any, count: int) -> List[Optional[Tuple[str, str]]]:
+        """Line packed entries up with the input images"""
+        extractions: List[Optional[Tuple[str, str]]] = [None] * count
+        if not isinstance(entries, list):
+            return extractions
+        if len(entries) != count:
+            print(f"Packed response has {len(entries)} entries for {count} images")
+        
+        indexes = [entry.get("image_index") if isinstance(entry, dict) else None for entry in entries]
+        by_index = (
+            all(isinstance(index, int) and 1 <= index <= count for index in indexes)
+            and len(set(indexes)) == len(indexes)
+        )
+        if not by_index and len(entries) != count:
+            # Without indexes a short or long array cannot be lined up safely
+            return extractions
+        
+        for position, entry in enumerate(entries):
+            slot = indexes[position] - 1 if by_index else position
+            if slot >= count or not isinstance(entry, dict):
+                continue
+            extracted_text = entry.get("extracted_text")
+            visual_description = entry.get("visual_description")
+            if isinstance(extracted_text, str) and isinstance(visual_description, str) and visual_description.strip():
+                extractions[slot] = (extracted_text.strip(), visual_description.strip())
+        return extractions
+    
+    def _prompt_digest(self) -> str:
+        """Digest of what the requests ask for: the prompt text, instructions and forced tool schemas
+        
+        Version labels are not unique across updates, so the cache is keyed on the text itself.
+        """
+        tools = [EXTRACTION_TOOL, PACKED_EXTRACTION_TOOL] if settings.CLAUDE_STRUCTURED_OUTPUT else []
+        request_shape = [
+            self.prompt_manager.get_current_prompt("ocr_and_visual"),
+            SINGLE_IMAGE_INSTRUCTION,
+            PACKED_PROMPT_TEMPLATE,
+            tools
+        ]
+        return hashlib.sha256(json.dumps(request_shape, sort_keys=True).encode()).hexdigest()[:16]
+    
+    def _lookup_cache(self, file_hash: str) -> Optional[Tuple[str, str]]:
+        """Return a cached extraction for this file under the current prompt and model"""
+        if self.extraction_cache is None:
+            return None
+        return self.extraction_cache.get(file_hash, self._prompt_digest(), self.model)
+    
+    def _store_in_cache(self, file_hash: str, extracted_text: str, visual_description: str):
+        """Cache a successful extraction under the current prompt and model"""
+        if self.extraction_cache is None:
+            return
+        self.extraction_cache.put(file_hash, self._prompt_digest(), self.model, extracted_text, visual_description)
+    
+    def _parse_message_content(self, content_blocks: List[Any]) -> Tuple[str, str]:
+        """Parse an extraction from response content blocks
+        
+        A forced tool call is parsed strictly and raises ValueError when it does not
+        match the schema; plain text (structured output off) goes through the
+        fallback cascade in _parse_extraction_response.
+        """
+        for block in content_blocks:
+            if getattr(block, "type", None) == "tool_use":
+                try:
+                    extraction = self._parse_tool_input(block.input)
+                except ValueError:
+                    self.parse_stats["invalid_tool_input"] += 1
+                    raise
+                self.parse_stats["tool_use"] += 1
+                return extraction
+        
+        content = content_blocks[0].text
+        print(f"Claude API raw response length: {len(content)}")
+        print(f"Claude API raw response preview: {content[:200]}...")
+        return self._parse_extraction_response(content)
+    
+    def _parse_tool_input(self, tool_input: Any) -> Tuple[str, str]:
+        """Strict single-pass parser for the extraction tool input"""
+        if not isinstance(tool_input, dict):
+            raise ValueError(f"Tool input is not an object: {type(tool_input).__name__}")
+        extracted_text = tool_input.get("extracted_text")
+        visual_description = tool_input.get("visual_description")
+        if not isinstance(extracted_text, str) or not isinstance(visual_description, str):
+            raise ValueError("Tool input is missing extracted_text or visual_description")
+        return extracted_text.strip(), visual_description.strip()
+    
+    def _parse_packed_message_content(self, content_blocks: List[Any], count: int) -> List[Optional[Tuple[str, str]]]:
+        """Parse a packed response's content blocks into one extraction per image"""
+        for block in content_blocks:
+            if getattr(block, "type", None) == "tool_use":
+                tool_input = block.input if isinstance(block.input, dict) else {}
+                extractions = self._align_packed_entries(tool_input.get("extractions"), count)
+                for extraction in extractions:
+                    self.parse_stats["tool_use" if extraction is not None else "invalid_tool_input"] += 1
+                return extractions
+        return self._parse_packed_response(content_blocks[0].text, count)
+    
+    def _parse_extraction_response(self, content: str) -> Tuple[str, str]:
+        """Parse the OCR text and visual description out of a Claude response"""
+        # Try to parse JSON response first
+        try:
+            # Clean the content to handle markdown code blocks or extra text
+            cleaned_content = content.strip()
+            
+            # Remove markdown code blocks if present
+            if "```json" in cleaned_content:
+                # Extract JSON from markdown code block
+                start = cleaned_content.find("```json") + 7
+                end = cleaned_content.find("```", start)
+                if end != -1:
+                    cleaned_content = cleaned_content[start:end].strip()
+            elif "```" in cleaned_content:
+                # Handle generic code blocks
+                start = cleaned_content.find("```") + 3
+                end = cleaned_content.find("```", start)
+                if end != -1:
+                    cleaned_content = cleaned_content[start:end].strip()
+            
+            # Try to find JSON object in the content
+            if not cleaned_content.startswith("{"):
+                # Look for the first { and last }
+                start_pos = cleaned_content.find("{")
+                end_pos = cleaned_content.rfind("}")
+                if start_pos != -1 and end_pos != -1 and end_pos > start_pos:
+                    cleaned_content = cleaned_content[start_pos:end_pos+1]
+                else:
+                    # Handle case where response is just key-value pairs without proper JSON structure
+                    if '"extracted_text":' in cleaned_content and '"visual_description":' in cleaned_content:
+                        # Try to construct proper JSON from malformed response
+                        cleaned_content = "{" + cleaned_content + "}"
+            
+            json_content = json.loads(cleaned_content)
+            extracted_text = json_content.get("extracted_text", json_content.get("ocr_text", ""))
+            visual_description = json_content.get("visual_description", "")
+            
+            # Ensure we're getting strings, not nested objects
+            if isinstance(visual_description, dict):
+                visual_description = str(visual_description)
+            if isinstance(extracted_text, dict):
+                extracted_text = str(extracted_text)
+            
+            # Clean field names from the beginning of values if they appear
+            if extracted_text.lower().startswith("extracted_text:"):
+                extracted_text = extracted_text[15:].strip()
+            elif extracted_text.lower().startswith("ocr_text:"):
+                extracted_text = extracted_text[9:].strip()
+            elif extracted_text.lower().startswith("text:"):
+                extracted_text = extracted_text[5:].strip()
+            
+            if visual_description.lower().startswith("visual_description:"):
+                visual_description = visual_description[19:].strip()
+            elif visual_description.lower().startswith("description:"):
+                visual_description = visual_description[12:].strip()
+            
+            print(f"JSON parsing successful: OCR={len(extracted_text)}, Visual={len(visual_description)}")
+            self.parse_stats["json"] += 1
+            return extracted_text, visual_description
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing failed: {e}")
+            print(f"Raw content preview: {content[:500]}...")
+            
+            # Try to extract values from JSON-like text format
+            extracted_text = ""
+            visual_description = ""
+            
+            # Look for quoted values after field names
+            import re
+            
+            # Extract extracted_text value
+            text_match = re.search(r'"extracted_text":\s*"([^"]*(?:\\.[^"]*)*)"', content, re.DOTALL)
+            if text_match:
+                extracted_text = text_match.group(1).replace('\\"', '"').replace('\\n', '\n')
+            
+            # Extract visual_description value  
+            desc_match = re.search(r'"visual_description":\s*"([^"]*(?:\\.[^"]*)*)"', content, re.DOTALL)
+            if desc_match:
+                visual_description = desc_match.group(1).replace('\\"', '"').replace('\\n', '\n')
+            
+            # If we found values using regex, return them
+            if extracted_text or visual_description:
+                print(f"Regex extraction successful: OCR={len(extracted_text)}, Visual={len(visual_description)}")
+                self.parse_stats["regex"] += 1
+                return extracted_text, visual_description
+            
+            # Fallback to old format parsing
+            extracted_text = ""
+            visual_description = ""
+            
+            if "OCR_TEXT:" in content:
+                parts = content.split("OCR_TEXT:")
+                if len(parts) > 1:
+                    text_part = parts[1].split("VISUAL_DESCRIPTION:")[0] if "VISUAL_DESCRIPTION:" in parts[1] else parts[1]
+                    extracted_text = text_part.strip()
+            
+            if "VISUAL_DESCRIPTION:" in content:
+                parts = content.split("VISUAL_DESCRIPTION:")
+                if len(parts) > 1:
+                    visual_description = parts[1].strip()
+            
+            # Also handle "extracted_text:" patterns in fallback parsing
+            if "extracted_text:" in content.lower():
+                parts = content.lower().split("extracted_text:")
+                if len(parts) > 1:
+                    text_part = parts[1].split("visual_description:")[0] if "visual_description:" in parts[1] else parts[1]
+                    extracted_text = text_part.strip()
+            
+            if "visual_description:" in content.lower():
+                parts = content.lower().split("visual_description:")
+                if len(parts) > 1:
+                    visual_description = parts[1].strip()
+            
+            # Clean any remaining field prefixes from extracted values
+            if extracted_text.lower().startswith("extracted_text:"):
+                extracted_text = extracted_text[15:].strip()
+            elif extracted_text.lower().startswith("ocr_text:"):
+                extracted_text = extracted_text[9:].strip()
+            elif extracted_text.lower().startswith("text:"):
+                extracted_text = extracted_text[5:].strip()
+            
+            if visual_description.lower().startswith("visual_description:"):
+                visual_description = visual_description[19:].strip()
+            elif visual_description.lower().startswith("description:"):
+                visual_description = visual_description[12:].strip()
+            
+            parse_path = "labelled_sections" if extracted_text or visual_description else "unparsed"
+            
+            # If still empty, try more flexible parsing
+            if not extracted_text and not visual_description:
+                print("Fallback parsing also failed, trying flexible approach...")
+                # Look for any substantial text content
+                lines = content.strip().split('\n')
+                substantial_lines = [line.strip() for line in lines if len(line.strip()) > 10]
+                if substantial_lines:
+                    # Try to identify which lines are text vs description
+                    text_lines = []
+                    desc_lines = []
+                    
+                    for line in substantial_lines:
+                        # If line looks like extracted text (short, factual)
+                        if any(keyword in line.lower() for keyword in ['text:', 'ocr:', 'extracted:', 'content:']):
+                            cleaned_line = line.split(':', 1)[-1].strip()
+                            text_lines.append(cleaned_line)
+                        # If line looks like description (longer, descriptive)
+                        elif any(keyword in line.lower() for keyword in ['description:', 'visual:', 'image:', 'shows:', 'displays:']):
+                            cleaned_line = line.split(':', 1)[-1].strip()
+                            desc_lines.append(cleaned_line)
+                        # Default: treat as description if longer than 50 chars, otherwise as text
+                        elif len(line) > 50:
+                            desc_lines.append(line)
+                        else:
+                            text_lines.append(line)
+                    
+                    extracted_text = ' '.join(text_lines) if text_lines else ""
+                    visual_description = ' '.join(desc_lines) if desc_lines else ' '.join(substantial_lines[:2])
+                    
+                    # Final cleaning of any remaining field prefixes
+                    if extracted_text.lower().startswith("extracted_text:"):
+                        extracted_text = extracted_text[15:].strip()
+                    elif extracted_text.lower().startswith("ocr_text:"):
+                        extracted_text = extracted_text[9:].strip()
+                    elif extracted_text.lower().startswith("text:"):
+                        extracted_text = extracted_text[5:].strip()
+                    
+                    if visual_description.lower().startswith("visual_description:"):
+                        visual_description = visual_description[19:].strip()
+                    elif visual_description.lower().startswith("description:"):
+                        visual_description = visual_description[12:].strip()
+                    print(f"Flexible parsing result: OCR={len(extracted_text)}, Visual={len(visual_description)}")
+                    parse_path = "line_heuristics"
+            
+            print(f"Fallback parsing result: OCR={len(extracted_text)}, Visual={len(visual_description)}")
+            self.parse_stats[parse_path] += 1
+            return extracted_text, visual_description
+    
     def _get_media_type(self, image_path: str) -> str:
         """Get the media type based on file extension"""
         ext = Path(image_path).suffix.lower()
@@ -323,6 +841,7 @@ class ClaudeService:
             '.jpg': 'image/jpeg',
             '.jpeg': 'image/jpeg',
             '.gif': 'image/gif',
-            '.webp': 'image/webp'
+            '.webp': 'image/webp',
+            '.bmp': 'image/bmp'
         }
         return media_types.get(ext, 'image/png')
\ No newline at end of file
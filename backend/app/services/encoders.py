@@ -0,0 +1,177 @@
+"""
+Embedding model backends
+SearchService only needs encode(texts, batch_size) with sentence-transformers
+semantics: a str gives one vector, a list gives one row per text. Besides the
+PyTorch model this offers the same model with dynamically quantized int8
+Linear layers, and an ONNX Runtime session over an exported graph, which
+needs neither torch nor sentence-transformers at serving time.
+
+    cd backend && python -m app.services.encoders [--model all-MiniLM-L6-v2] [--out onnx_model]
+
+exports model.onnx, model_int8.onnx and the tokenizer for the onnx backends.
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import List, Optional, Union
+import numpy as np
+from app.config import settings
+
+ENCODER_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+# Lowest cosine similarity to the torch vector each backend may produce for a text
+PARITY_MIN_COSINE = {"torch": 0.99999, "torch-int8": 0.98, "onnx": 0.9999, "onnx-int8": 0.98}
+
+ONNX_MODEL_FILES = {"onnx": "model.onnx", "onnx-int8": "model_int8.onnx"}
+ONNX_CONFIG_FILE = "encoder_config.json"
+
+
+def mean_pool(token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """Average token embeddings over the non-padding positions of each sequence"""
+    mask = attention_mask[..., None].astype(np.float32)
+    return (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+
+def cosine_parity(reference: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    """Row-wise cosine similarity between two embedding matrices"""
+    reference = np.atleast_2d(reference).astype(np.float32)
+    candidate = np.atleast_2d(candidate).astype(np.float32)
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    return (reference * candidate).sum(axis=1) / np.maximum(norms, 1e-12)
+
+
+class TorchEncoder:
+    """sentence-transformers model, optionally with dynamic int8 quantization"""
+
+    def __init__(self, model_name: str, quantize: bool = False):
+        from sentence_transformers import SentenceTransformer
+        self.backend = "torch-int8" if quantize else "torch"
+        if quantize:
+            import torch
+            # Linear weights become int8, activations are quantized per batch at run time (CPU only)
+            model = SentenceTransformer(model_name, device="cpu")
+            self.model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        else:
+            self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: Union[str, List[str]], batch_size: Optional[int] = None) -> np.ndarray:
+        batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        return np.asarray(self.model.encode(texts, batch_size=batch_size), dtype=np.float32)
+
+
+class OnnxEncoder:
+    """Exported transformer run by ONNX Runtime, with mean pooling in numpy"""
+
+    def __init__(self, model_name: str, model_dir: Union[str, Path], quantized: bool = False):
+        import onnxruntime
+        from tokenizers import Tokenizer
+        self.backend = "onnx-int8" if quantized else "onnx"
+        model_dir = Path(model_dir)
+        model_path = model_dir / ONNX_MODEL_FILES[self.backend]
+        if not model_path.exists():
+            raise FileNotFoundError(f"{model_path} not found, export it with: python -m app.services.encoders --out {model_dir}")
+        with open(model_dir / ONNX_CONFIG_FILE) as f:
+            config = json.load(f)
+        if config["model_name"] != model_name:
+            raise ValueError(f"{model_dir} holds {config['model_name']}, expected {model_name}")
+        self.normalize = config["normalize"]
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=config["pad_token_id"], pad_token=config["pad_token"])
+
+    def encode(self, texts: Union[str, List[str]], batch_size: Optional[int] = None) -> np.ndarray:
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+            feeds = {
+                "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+                "attention_mask": attention_mask
+            }
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+            embeddings = mean_pool(self.session.run(None, feeds)[0], attention_mask)
+            if self.normalize:
+                embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+            batches.append(embeddings.astype(np.float32))
+        embeddings = np.vstack(batches) if batches else np.empty((0, 0), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+
+def create_encoder(model_name: str, backend: Optional[str] = None):
+    """Load model_name with the configured (or given) backend"""
+    backend = backend or settings.EMBEDDING_BACKEND
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {ENCODER_BACKENDS}")
+    if backend.startswith("onnx"):
+        return OnnxEncoder(model_name, settings.EMBEDDING_ONNX_DIR, quantized=backend == "onnx-int8")
+    return TorchEncoder(model_name, quantize=backend == "torch-int8")
+
+
+def export_onnx(model_name: str, output_dir: Union[str, Path], quantize: bool = True) -> Path:
+    """Export the transformer of a sentence-transformers model to ONNX (needs torch)
+
+    Only the token embeddings are exported; pooling and normalization run in
+    OnnxEncoder, so the graph keeps dynamic batch and sequence axes.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    model = SentenceTransformer(model_name, device="cpu")
+    pooling = next(module for module in model if isinstance(module, Pooling))
+    if pooling.get_pooling_mode_str() != "mean":
+        raise ValueError(f"{model_name} uses {pooling.get_pooling_mode_str()} pooling, only mean pooling is supported")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer.save_pretrained(str(output_dir))
+
+    sample = tokenizer(["An exported sample sentence"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class TokenEmbeddings(torch.nn.Module):
+        def forward(self, *inputs):
+            return transformer(**dict(zip(input_names, inputs))).last_hidden_state
+
+    model_path = output_dir / ONNX_MODEL_FILES["onnx"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["token_embeddings"]}
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(), tuple(sample[name] for name in input_names), str(model_path),
+            input_names=input_names, output_names=["token_embeddings"],
+            dynamic_axes=dynamic_axes, opset_version=14
+        )
+    with open(output_dir / ONNX_CONFIG_FILE, "w") as f:
+        json.dump({
+            "model_name": model_name,
+            "max_seq_length": model.max_seq_length,
+            "normalize": any(isinstance(module, Normalize) for module in model),
+            "pad_token": tokenizer.pad_token,
+            "pad_token_id": tokenizer.pad_token_id
+        }, f, indent=2)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(model_path), str(output_dir / ONNX_MODEL_FILES["onnx-int8"]), weight_type=QuantType.QInt8)
+    print(f"📦 Exported {model_name} to {output_dir}")
+    return model_path
+
+
+if __name__ == "__main__":
+    from app.services.search_service import EMBEDDING_MODEL_NAME
+    parser = argparse.ArgumentParser(description="Export the embedding model for the onnx backends")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--out", default=settings.EMBEDDING_ONNX_DIR)
+    parser.add_argument("--no-quantize", action="store_true", help="Skip model_int8.onnx")
+    args = parser.parse_args()
+    export_onnx(args.model, args.out, quantize=not args.no_quantize)
@@ -0,0 +1,93 @@
+"""
+Executor pools for ingestion work that should not run on the event loop
+CPU-bound stages (rubric evaluation, embedding when EMBEDDING_IN_PROCESS_POOL
+is set) go to a process pool so they use every core; hashing, file I/O and
+shared-model embedding go to a thread pool
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from ..config import settings
+
+
+class IngestExecutors:
+    """Process pool for CPU-bound work and thread pool for blocking I/O"""
+
+    def __init__(self, cpu_workers: Optional[int] = None, io_workers: Optional[int] = None):
+        self.cpu_workers = settings.CPU_POOL_WORKERS if cpu_workers is None else cpu_workers
+        self.io_workers = io_workers or settings.IO_POOL_WORKERS
+        self._cpu_pool: Optional[ProcessPoolExecutor] = None
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+        self._pending = {"cpu": 0, "io": 0}
+        self._completed = {"cpu": 0, "io": 0}
+
+    def _get_cpu_pool(self) -> Executor:
+        # Without worker processes CPU work still leaves the event loop via threads
+        if self.cpu_workers <= 0:
+            return self._get_io_pool()
+        if self._cpu_pool is None:
+            # spawn rather than fork: the parent already runs threads (httpx, torch)
+            self._cpu_pool = ProcessPoolExecutor(
+                max_workers=self.cpu_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            print(f"⚙️  Started CPU process pool with {self.cpu_workers} workers")
+        return self._cpu_pool
+
+    def _get_io_pool(self) -> ThreadPoolExecutor:
+        if self._io_pool is None:
+            self._io_pool = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="ingest-io")
+        return self._io_pool
+
+    async def _run(self, kind: str, pool: Executor, fn: Callable, *args) -> Any:
+        self._pending[kind] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        finally:
+            self._pending[kind] -= 1
+            self._completed[kind] += 1
+
+    async def run_cpu(self, fn: Callable, *args) -> Any:
+        """Run a picklable function and arguments in the process pool"""
+        return await self._run("cpu", self._get_cpu_pool(), fn, *args)
+
+    async def run_io(self, fn: Callable, *args) -> Any:
+        """Run a blocking function in the I/O thread pool"""
+        return await self._run("io", self._get_io_pool(), fn, *args)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool sizes and queue depth (submitted but not finished tasks)"""
+        return {
+            "cpu": {
+                "workers": self.cpu_workers,
+                "mode": "process" if self.cpu_workers > 0 else "thread",
+                "queue_depth": self._pending["cpu"],
+                "completed": self._completed["cpu"]
+            },
+            "io": {
+                "workers": self.io_workers,
+                "queue_depth": self._pending["io"],
+                "completed": self._completed["io"]
+            }
+        }
+
+    def shutdown(self):
+        """Stop both pools, cancelling work that has not started"""
+        if self._cpu_pool is not None:
+            self._cpu_pool.shutdown(wait=False, cancel_futures=True)
+            self._cpu_pool = None
+        if self._io_pool is not None:
+            self._io_pool.shutdown(wait=False, cancel_futures=True)
+            self._io_pool = None
+
+
+_shared_executors: Optional[IngestExecutors] = None
+
+
+def get_executors() -> IngestExecutors:
+    """Get the process-wide ingestion executors"""
+    global _shared_executors
+    if _shared_executors is None:
+        _shared_executors = IngestExecutors()
+    return _shared_executors
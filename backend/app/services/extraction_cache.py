@@ -0,0 +1,120 @@
+"""
+Persistent content-addressed cache for Claude extraction results
+Entries are keyed by file hash, a digest of the request prompt (its text and
+tool schema, not its version label) and model name, so a prompt update or
+model switch never serves stale extractions
+"""
+import json
+import os
+import hashlib
+from pathlib import Path
+from datetime import datetime
+from typing import Optional, Tuple, Dict, Any
+from ..config import settings
+
+
+class ExtractionCache:
+    """Disk-backed (ocr_text, visual_description) cache with LRU eviction"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_entries: Optional[int] = None):
+        self.cache_dir = Path(cache_dir or settings.EXTRACTION_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries if max_entries is not None else settings.EXTRACTION_CACHE_MAX_ENTRIES
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._entry_count = sum(1 for _ in self.cache_dir.glob("*.json"))
+
+    def _entry_path(self, file_hash: str, prompt_digest: str, model: str) -> Path:
+        """Map a cache key to its file"""
+        variant = hashlib.sha1(f"{prompt_digest}|{model}".encode()).hexdigest()[:16]
+        return self.cache_dir / f"{file_hash}-{variant}.json"
+
+    def get(self, file_hash: str, prompt_digest: str, model: str) -> Optional[Tuple[str, str]]:
+        """Return the cached extraction or None on a miss"""
+        entry_path = self._entry_path(file_hash, prompt_digest, model)
+        try:
+            with open(entry_path) as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            print(f"Error reading extraction cache entry {entry_path}: {e}")
+            self.misses += 1
+            return None
+
+        # Touch the entry so eviction drops the least recently used files first
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+        self.hits += 1
+        return entry["ocr_text"], entry["visual_description"]
+
+    def put(self, file_hash: str, prompt_digest: str, model: str, ocr_text: str, visual_description: str):
+        """Store an extraction, evicting the least recently used entries if over capacity"""
+        entry_path = self._entry_path(file_hash, prompt_digest, model)
+        is_new = not entry_path.exists()
+        entry = {
+            "file_hash": file_hash,
+            "prompt_digest": prompt_digest,
+            "model": model,
+            "ocr_text": ocr_text,
+            "visual_description": visual_description,
+            "cached_at": datetime.now().isoformat()
+        }
+
+        # Write to a temp file and rename so readers never see a partial entry
+        temp_path = entry_path.with_suffix(".tmp")
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(entry, f)
+            os.replace(temp_path, entry_path)
+        except Exception as e:
+            print(f"Error writing extraction cache entry {entry_path}: {e}")
+            return
+
+        self.writes += 1
+        if is_new:
+            self._entry_count += 1
+        if self._entry_count > self.max_entries:
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries down to 90% of capacity"""
+        entries = sorted(self.cache_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        target = int(self.max_entries * 0.9)
+        excess = len(entries) - target
+        for entry_path in entries[:max(0, excess)]:
+            try:
+                entry_path.unlink()
+                self.evictions += 1
+            except OSError as e:
+                print(f"Error evicting extraction cache entry {entry_path}: {e}")
+        self._entry_count = sum(1 for _ in self.cache_dir.glob("*.json"))
+
+    def clear(self):
+        """Remove every cached extraction"""
+        for entry_path in self.cache_dir.glob("*.json"):
+            try:
+                entry_path.unlink()
+            except OSError as e:
+                print(f"Error removing extraction cache entry {entry_path}: {e}")
+        self._entry_count = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and occupancy"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "entries": self._entry_count,
+            "max_entries": self.max_entries
+        }
@@ -0,0 +1,76 @@
+"""
+Image preprocessing before screenshots are sent to Claude
+Downsamples to the resolution the model actually uses, converts formats the
+API cannot take (BMP, TIFF, ...) and re-encodes oversized images
+"""
+import io
+import math
+from typing import Tuple
+from PIL import Image
+from ..config import settings
+
+# Formats the Messages API accepts, by Pillow format name
+API_MEDIA_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "GIF": "image/gif",
+    "WEBP": "image/webp"
+}
+
+
+def preprocess_image(image_content: bytes) -> Tuple[bytes, str]:
+    """Prepare raw image bytes for the API, returning (bytes, media_type)
+
+    Images that are already in an accepted format, within the useful resolution
+    and under IMAGE_MAX_BYTES are passed through untouched.
+    """
+    with Image.open(io.BytesIO(image_content)) as image:
+        image_format = image.format
+        width, height = image.size
+
+        # Claude downsamples anything beyond ~1568px on the long edge / ~1.15MP,
+        # so larger images only cost payload size and input tokens
+        scale = min(
+            1.0,
+            settings.IMAGE_MAX_DIMENSION / max(width, height),
+            math.sqrt(settings.IMAGE_MAX_PIXELS / (width * height))
+        )
+
+        if (
+            scale >= 1.0
+            and image_format in API_MEDIA_TYPES
+            and len(image_content) <= settings.IMAGE_MAX_BYTES
+        ):
+            return image_content, API_MEDIA_TYPES[image_format]
+
+        converted = _first_frame(image)
+
+    if scale < 1.0:
+        new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        converted = converted.resize(new_size, Image.LANCZOS)
+
+    # Lossless PNG keeps small text crisp; fall back to lossy WebP when still too large
+    output = io.BytesIO()
+    converted.save(output, format="PNG", optimize=True)
+    if output.tell() <= settings.IMAGE_MAX_BYTES:
+        return output.getvalue(), "image/png"
+
+    output = io.BytesIO()
+    converted.save(output, format="WEBP", quality=settings.IMAGE_WEBP_QUALITY, method=4)
+    return output.getvalue(), "image/webp"
+
+
+def encode_png(image_content: bytes) -> bytes:
+    """Re-encode an image as PNG at its original size, for when preprocess_image fails"""
+    with Image.open(io.BytesIO(image_content)) as image:
+        converted = _first_frame(image)
+    output = io.BytesIO()
+    converted.save(output, format="PNG")
+    return output.getvalue()
+
+
+def _first_frame(image: Image.Image) -> Image.Image:
+    """RGB(A) copy of the image; animated images are analyzed from their first frame"""
+    image.seek(0)
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    return image.convert("RGBA" if has_alpha else "RGB")
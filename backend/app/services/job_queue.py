@@ -0,0 +1,213 @@
+"""
+Durable ingestion job queue backed by SQLite
+Every upload or folder request becomes a job whose files move through
+queued -> extracting -> evaluating -> indexed (or failed), so unfinished
+work can be resumed after a restart
+"""
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from ..config import settings
+
+
+class JobQueue:
+    """Persistent record of ingestion jobs and per-file progress"""
+
+    FILE_STATES = ("queued", "extracting", "evaluating", "indexed", "failed")
+    FINISHED_STATES = ("indexed", "failed")
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or settings.JOBS_DB_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    mode TEXT NOT NULL DEFAULT 'interactive',
+                    status TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    done_at_start INTEGER NOT NULL DEFAULT 0,
+                    finished_at TEXT
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_files (
+                    job_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    filename TEXT NOT NULL,
+                    saved_as TEXT NOT NULL,
+                    file_hash TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    error TEXT,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (job_id, position)
+                )
+            """)
+            # Databases created before extraction modes existed lack the column
+            columns = [row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+            if "mode" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN mode TEXT NOT NULL DEFAULT 'interactive'")
+
+    def create_job(self, source: str, files: List[dict], mode: str = "interactive") -> str:
+        """Create a job for uploaded files and return its id
+
+        mode is "interactive" (one request per file) or "batch" (one Message Batch).
+        """
+        job_id = uuid.uuid4().hex[:12]
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, source, mode, status, total, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, source, mode, "queued", len(files), now)
+            )
+            self._conn.executemany(
+                "INSERT INTO job_files (job_id, position, filename, saved_as, file_hash, state, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                [
+                    (job_id, position, f["filename"], f["saved_as"], f["hash"], now)
+                    for position, f in enumerate(files)
+                ]
+            )
+        return job_id
+
+    def start_job(self, job_id: str):
+        """Mark a job as running and reset its throughput window"""
+        with self._lock, self._conn:
+            done = self._conn.execute(
+                "SELECT COUNT(*) FROM job_files WHERE job_id = ? AND state IN ('indexed', 'failed')",
+                (job_id,)
+            ).fetchone()[0]
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, done_at_start = ? WHERE id = ?",
+                (datetime.now().isoformat(), done, job_id)
+            )
+
+    def get_pending_files(self, job_id: str) -> List[dict]:
+        """Get files of a job that still need processing, in upload order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, filename, saved_as, file_hash FROM job_files "
+                "WHERE job_id = ? AND state NOT IN ('indexed', 'failed') ORDER BY position",
+                (job_id,)
+            ).fetchall()
+        return [
+            {"position": row["position"], "filename": row["filename"], "saved_as": row["saved_as"], "hash": row["file_hash"]}
+            for row in rows
+        ]
+
+    def update_file_state(self, job_id: str, position: int, state: str, error: Optional[str] = None):
+        """Move one file to a new state, finishing the job when nothing is left"""
+        if state not in self.FILE_STATES:
+            raise ValueError(f"Unknown file state: {state}")
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_files SET state = ?, error = ?, updated_at = ? WHERE job_id = ? AND position = ?",
+                (state, error, now, job_id, position)
+            )
+            if state in self.FINISHED_STATES:
+                remaining = self._conn.execute(
+                    "SELECT COUNT(*) FROM job_files WHERE job_id = ? AND state NOT IN ('indexed', 'failed')",
+                    (job_id,)
+                ).fetchone()[0]
+                if remaining == 0:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'completed', finished_at = ? WHERE id = ? AND status != 'cancelled'",
+                        (now, job_id)
+                    )
+
+    def is_cancelled(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is None or row["status"] == "cancelled"
+
+    def cancel_unfinished_jobs(self):
+        """Cancel every job that has not completed (their uploads are being cleared)"""
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE status IN ('queued', 'running')",
+                (now,)
+            )
+
+    def get_resumable_jobs(self) -> List[str]:
+        """Get unfinished jobs, returning interrupted files to the queued state"""
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_files SET state = 'queued', updated_at = ? "
+                "WHERE state IN ('extracting', 'evaluating') "
+                "AND job_id IN (SELECT id FROM jobs WHERE status IN ('queued', 'running'))",
+                (now,)
+            )
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get job progress with per-file states, throughput and ETA"""
+        with self._lock:
+            job = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            files = self._conn.execute(
+                "SELECT position, filename, file_hash, state, error, updated_at FROM job_files "
+                "WHERE job_id = ? ORDER BY position",
+                (job_id,)
+            ).fetchall()
+
+        counts = {state: 0 for state in self.FILE_STATES}
+        for row in files:
+            counts[row["state"]] += 1
+        done = counts["indexed"] + counts["failed"]
+        remaining = job["total"] - done
+
+        throughput_per_minute = None
+        eta_seconds = None
+        if job["started_at"]:
+            end = datetime.fromisoformat(job["finished_at"]) if job["finished_at"] else datetime.now()
+            elapsed = (end - datetime.fromisoformat(job["started_at"])).total_seconds()
+            done_since_start = done - job["done_at_start"]
+            if elapsed > 0 and done_since_start > 0:
+                rate = done_since_start / elapsed
+                throughput_per_minute = round(rate * 60, 2)
+                eta_seconds = round(remaining / rate, 1) if job["status"] == "running" else 0.0
+
+        return {
+            "job_id": job["id"],
+            "source": job["source"],
+            "mode": job["mode"],
+            "status": job["status"],
+            "total": job["total"],
+            "completed": done,
+            "remaining": remaining,
+            "counts": counts,
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+            "throughput_per_minute": throughput_per_minute,
+            "eta_seconds": eta_seconds,
+            "files": [
+                {
+                    "position": row["position"],
+                    "filename": row["filename"],
+                    "hash": row["file_hash"],
+                    "state": row["state"],
+                    "error": row["error"],
+                    "updated_at": row["updated_at"]
+                }
+                for row in files
+            ]
+        }
@@ -57,13 +57,19 @@ Be thorough and accurate. Return only valid JSON.""",
     def get_current_prompt(self, prompt_type: str = "ocr_and_visual") -> str:
         """Get the current prompt for a given type"""
         return self.prompts.get(prompt_type, {}).get("prompt", self.default_prompts[prompt_type]["prompt"])
-    
+
+    def get_current_version(self, prompt_type: str = "ocr_and_visual") -> str:
+        """Get the version of the current prompt for a given type"""
+        return self.prompts.get(prompt_type, {}).get("version", self.default_prompts[prompt_type]["version"])
+
     def update_prompt(self, prompt_type: str, new_prompt: str, quality_score: float = None) -> Dict[str, Any]:
         """Update a prompt and track its performance"""
         old_prompt = self.get_current_prompt(prompt_type)
         
-        # Create new version
+        # Create new version; the current prompt is archived below, so it counts too
         new_version = len(self.prompts.get(prompt_type, {}).get("versions", [])) + 1
+        if prompt_type in self.prompts:
+            new_version += 1
         
         if prompt_type not in self.prompts:
             self.prompts[prompt_type] = {
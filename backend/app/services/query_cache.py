@@ -0,0 +1,77 @@
+"""
+In-memory cache of query embeddings
+Repeated searches (and the frontend re-issuing a query while the user types)
+reuse the vector instead of running the transformer again. Entries are keyed
+by embedding model so a model switch never returns vectors from another space
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from ..config import settings
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace so "login  button " and "login button" share an entry"""
+    return " ".join(query.split())
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU of (model, normalized query) -> embedding with a TTL"""
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries if max_entries is not None else settings.QUERY_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.QUERY_CACHE_TTL
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def get(self, model_name: str, query: str) -> Optional[Any]:
+        """Return the cached embedding or None on a miss"""
+        key = (model_name, normalize_query(query))
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        stored_at, embedding = entry
+        if self.ttl_seconds > 0 and time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return embedding
+
+    def put(self, model_name: str, query: str, embedding: Any):
+        """Store an embedding, evicting the least recently used entry if over capacity"""
+        if self.max_entries <= 0:
+            return
+        # Callers share the cached array, so it must not be modified in place
+        if hasattr(embedding, "setflags"):
+            embedding.setflags(write=False)
+        key = (model_name, normalize_query(query))
+        self._entries[key] = (time.monotonic(), embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every cached embedding"""
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and occupancy"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries
+        }
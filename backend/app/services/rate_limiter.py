@@ -0,0 +1,162 @@
+"""
+Process-wide adaptive rate limiter for Claude API requests
+Combines a token bucket (requests per minute) with an AIMD concurrency limit:
+successes grow concurrency additively, 429s halve it and pause every caller
+until the server's retry-after has elapsed
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional, Mapping, Dict, Any
+from ..config import settings
+
+
+class AdaptiveRateLimiter:
+    """Token bucket + AIMD concurrency limiter shared by all Claude requests
+
+    Uses plain counters and short sleeps rather than asyncio primitives so a single
+    instance can be shared safely across event loops (e.g. in tests).
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        min_concurrency: int = 1
+    ):
+        self.requests_per_minute = float(requests_per_minute or settings.CLAUDE_REQUESTS_PER_MINUTE)
+        self.max_concurrency = max_concurrency or settings.CLAUDE_MAX_CONCURRENCY
+        self.min_concurrency = min_concurrency
+        self.concurrency_limit = float(self.max_concurrency)
+
+        # Bucket allows a short burst of up to max_concurrency requests
+        self.capacity = float(self.max_concurrency)
+        self.tokens = self.capacity
+        self._last_refill = time.monotonic()
+
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.total_requests = 0
+        self.rate_limited = 0
+        self.last_retry_after: Optional[float] = None
+
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.requests_per_minute / 60.0)
+
+    async def acquire(self):
+        """Wait for a request slot"""
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.paused_until:
+                wait = self.paused_until - now
+            elif self.in_flight >= int(self.concurrency_limit):
+                wait = 0.05
+            elif self.tokens < 1:
+                wait = (1 - self.tokens) * 60.0 / self.requests_per_minute
+            else:
+                self.tokens -= 1
+                self.in_flight += 1
+                self.total_requests += 1
+                return
+            await asyncio.sleep(min(wait, 1.0))
+
+    def release(self):
+        self.in_flight = max(0, self.in_flight - 1)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a request slot for the duration of one API call"""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def on_success(self):
+        """Additive increase: about one extra concurrent request per window of successes"""
+        self.concurrency_limit = min(
+            float(self.max_concurrency),
+            self.concurrency_limit + 1.0 / max(1.0, self.concurrency_limit)
+        )
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """Multiplicative decrease and a shared pause after a 429"""
+        self.rate_limited += 1
+        self.concurrency_limit = max(float(self.min_concurrency), self.concurrency_limit / 2)
+        self.tokens = 0.0
+
+        if retry_after is None:
+            retry_after = settings.CLAUDE_RETRY_DELAY * 4
+        self.last_retry_after = retry_after
+        self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        print(f"🚦 Rate limited: pausing Claude requests for {retry_after:.1f}s, concurrency limit now {int(self.concurrency_limit)}")
+
+    def observe_headers(self, headers: Mapping[str, str]):
+        """Track the account limits reported in anthropic-ratelimit-* headers"""
+        limit = _parse_float(headers.get("anthropic-ratelimit-requests-limit"))
+        if limit:
+            self.requests_per_minute = limit
+
+        remaining = _parse_float(headers.get("anthropic-ratelimit-requests-remaining"))
+        if remaining is not None:
+            self.tokens = min(self.tokens, remaining)
+            if remaining < 1:
+                reset_at = _parse_reset(headers.get("anthropic-ratelimit-requests-reset"))
+                if reset_at is not None:
+                    self.paused_until = max(self.paused_until, time.monotonic() + reset_at)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Current rate, concurrency and throttling counters"""
+        now = time.monotonic()
+        self._refill(now)
+        return {
+            "requests_per_minute": round(self.requests_per_minute, 2),
+            "concurrency_limit": int(self.concurrency_limit),
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "available_tokens": round(self.tokens, 2),
+            "paused_for_seconds": round(max(0.0, self.paused_until - now), 2),
+            "total_requests": self.total_requests,
+            "rate_limited": self.rate_limited,
+            "last_retry_after": self.last_retry_after
+        }
+
+
+def _parse_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """Seconds until an RFC 3339 reset timestamp"""
+    if not value:
+        return None
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Seconds to wait from a retry-after header, if present"""
+    if headers is None:
+        return None
+    return _parse_float(headers.get("retry-after"))
+
+
+_shared_limiter: Optional[AdaptiveRateLimiter] = None
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """Get the process-wide limiter shared by every ClaudeService"""
+    global _shared_limiter
+    if _shared_limiter is None:
+        _shared_limiter = AdaptiveRateLimiter()
+    return _shared_limiter
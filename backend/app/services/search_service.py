@@ -1,140 +1,613 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence, Set, Tuple, Union, TYPE_CHECKING
 import json
+import hashlib
+import re
+import threading
+import time
 from pathlib import Path
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+from app.config import settings
 from app.models import ScreenshotMetadata, SearchResult
+from app.services.vector_store import VectorStore, EmbeddingArchive, normalize, top_k_indices
+from app.services.ann_index import create_ann_index
+from app.services.query_cache import QueryEmbeddingCache
+from app.services.bm25 import BM25Index
+from app.services.tokens import tokenize
+from app.services.snippets import build_snippet, find_term_spans
+from app.services.executors import get_executors
+
+if TYPE_CHECKING:
+    from app.services.encoders import TorchEncoder, OnnxEncoder
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Screenshots per index_screenshots call while loading the corpus, so searches interleave
+LOAD_CHUNK_SIZE = 1000
+
+# Results must score above this to be returned
+MIN_RESULT_SCORE = 0.1
+
+# Description matches only count for queries mentioning one of these
+VISUAL_KEYWORDS = ['button', 'color', 'blue', 'red', 'green', 'icon', 'image',
+                   'screenshot', 'window', 'dialog', 'menu', 'toolbar', 'sidebar']
+VISUAL_INTENT_PATTERN = re.compile("|".join(re.escape(keyword) for keyword in VISUAL_KEYWORDS))
+
+# Models loaded inside executor worker processes, by name
+_worker_models: Dict[str, Any] = {}
+
+def load_embedding_model(model_name: str):
+    """Load the model with the EMBEDDING_BACKEND encoder, importing torch or onnxruntime only on first use"""
+    from app.services.encoders import create_encoder
+    return create_encoder(model_name)
+
+def encode_in_batches(model, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+    """Embed texts in length-sorted batches, returning rows in input order
+    
+    Grouping texts of similar length keeps padding (and wasted compute) per
+    batch low; results are scattered back to their original positions.
+    """
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    embeddings: Optional[np.ndarray] = None
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        encoded = np.asarray(model.encode([texts[i] for i in batch], batch_size=batch_size), dtype=np.float32)
+        if embeddings is None:
+            embeddings = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+        embeddings[batch] = encoded
+    return embeddings if embeddings is not None else np.empty((0, 0), dtype=np.float32)
+
+def encode_texts(model_name: str, texts: List[str]) -> np.ndarray:
+    """Embed texts in a worker process, loading the model once per process (EMBEDDING_IN_PROCESS_POOL)"""
+    if model_name not in _worker_models:
+        _worker_models[model_name] = load_embedding_model(model_name)
+    return encode_in_batches(_worker_models[model_name], texts)
+
+def rank_page(scores: np.ndarray, offset: int, limit: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """Rows offset..offset + limit of the scores above MIN_RESULT_SCORE, best first
+    
+    Masks by threshold, partitions out the offset + limit best survivors and
+    sorts only those. Ties go to the later row (the more recently indexed).
+    rows restricts ranking to a candidate subset.
+    """
+    rows = np.flatnonzero(scores > MIN_RESULT_SCORE) if rows is None else rows[scores[rows] > MIN_RESULT_SCORE]
+    end = offset + limit
+    if len(rows) > end:
+        rows = rows[np.argpartition(-scores[rows], end - 1)[:end]]
+    rows = rows[np.lexsort((-rows, -scores[rows]))]
+    return rows[offset:end]
 
 class SearchService:
-    def __init__(self):
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+    def __init__(self, warm_up_in_background: bool = False):
+        """Create the index and run warm_up
+        
+        With warm_up_in_background the corpus and model load on a daemon thread
+        and the service answers lexical-only searches until it is ready.
+        """
+        self.model_name = EMBEDDING_MODEL_NAME
+        self.model: Optional[Union["TorchEncoder", "OnnxEncoder"]] = None  # Set once every row has a vector
+        self.encoder_backend = settings.EMBEDDING_BACKEND
+        self.model_error: Optional[str] = None
         self.screenshots: List[ScreenshotMetadata] = []
-        self.embeddings: List[np.ndarray] = []
-        self._load_existing_index()
+        # Row i is the normalized (optionally quantized) embedding of screenshots[i];
+        # rows appended before the model loaded have no vector until warm-up catches up
+        self.vectors = VectorStore(quantization=settings.VECTOR_QUANTIZATION)
+        self.ann_index = create_ann_index(self.vectors)  # Exact scan or IVF candidate lists
+        self.query_cache = QueryEmbeddingCache()
+        # BM25 term statistics per field, document ids are rows of self.screenshots
+        self.ocr_terms = BM25Index(positions=settings.SEARCH_SNIPPET_POSITIONS)
+        self.description_terms = BM25Index(positions=settings.SEARCH_SNIPPET_POSITIONS)
+        # Live row per file hash; replaced or removed rows are tombstoned until compaction
+        self.rows: Dict[str, int] = {}
+        self._tombstones: Set[int] = set()
+        self._generation = 0  # Bumped on every change, invalidates in-flight compactions
+        self._compacting = False
+        # Embeddings on disk, reused across restarts and sessions
+        self.archive = EmbeddingArchive(settings.EMBEDDING_STORE_DIR, self.model_name, self.encoder_backend)
+        # Archive row holding the exact float32 vector of each row (-1 if not archived)
+        self._archive_rows: List[int] = []
+        self._archive_view: Optional[np.ndarray] = None
+        # Warm-up state: precomputed embeddings of rows still waiting for a vector,
+        # and a counter bumped by clear_index so warm-up drops stale encodings
+        self._pending_embeddings: Dict[int, np.ndarray] = {}
+        self._epoch = 0
+        self._ready = threading.Event()
+        self._lock = threading.RLock()  # Warm-up thread vs. request handlers
+        self._created_at = time.monotonic()
+        self.startup_phases: Dict[str, float] = {}  # Phase -> seconds since construction
+        if warm_up_in_background:
+            threading.Thread(target=self.warm_up, name="search-warm-up", daemon=True).start()
+        else:
+            self.warm_up()
+    
+    def warm_up(self):
+        """Index the corpus lexically, load the model, then embed rows and switch to hybrid scoring"""
+        try:
+            self._load_existing_index()
+            self._record_phase("lexical_index_loaded")
+            model = load_embedding_model(self.model_name)
+            self._record_phase("model_loaded")
+            self._embed_pending(model)
+            self._record_phase("ready")
+            print(f"✅ Search model ready after {self.startup_phases['ready']:.1f}s, hybrid scoring enabled")
+            self.compact_archive()
+        except Exception as e:
+            self.model_error = f"{type(e).__name__}: {e}"
+            self._record_phase("failed")
+            print(f"⚠️  Search warm-up failed, serving lexical-only results: {self.model_error}")
+    
+    def _record_phase(self, phase: str):
+        self.startup_phases[phase] = round(time.monotonic() - self._created_at, 3)
+    
+    def is_ready(self) -> bool:
+        """Whether searches use semantic similarity (every row has a vector)"""
+        return self._ready.is_set()
+    
+    def get_readiness(self) -> Dict[str, Any]:
+        """Search mode and startup phase timings for /ready"""
+        return {
+            "ready": self.is_ready(),
+            "mode": "hybrid" if self.is_ready() else "lexical",
+            "encoder_backend": self.encoder_backend,
+            "phases": dict(self.startup_phases),
+            "pending_embeddings": max(len(self.screenshots) - len(self.vectors), 0),
+            "error": self.model_error
+        }
+    
+    def _embed_pending(self, model):
+        """Give every row appended before the model loaded its vector, then mark the service ready
+        
+        Encoding runs outside the lock so searches and indexing continue; rows
+        added meanwhile are picked up by the next pass.
+        """
+        while True:
+            with self._lock:
+                start, epoch = len(self.vectors), self._epoch
+                screenshots = self.screenshots[start:]
+                if not screenshots:
+                    self.model = model
+                    self._pending_embeddings.clear()
+                    self._ready.set()
+                    return
+                rows: List[Optional[np.ndarray]] = [self._pending_embeddings.get(row) for row in range(start, start + len(screenshots))]
+            missing = [i for i, embedding in enumerate(rows) if embedding is None]
+            if missing:
+                encoded = encode_in_batches(model, [self.get_index_text(screenshots[i]) for i in missing])
+                for i, embedding in zip(missing, encoded):
+                    rows[i] = embedding
+            with self._lock:
+                if epoch != self._epoch:
+                    continue
+                for row in range(start, start + len(screenshots)):
+                    self._pending_embeddings.pop(row, None)
+                self._add_vectors(screenshots, np.vstack(rows).astype(np.float32))
     
     def _load_existing_index(self):
-        """Load existing processed screenshots"""
+        """Load existing processed screenshots, reusing archived embeddings"""
         processed_dir = Path("processed")
         if processed_dir.exists():
+            screenshots = []
             for json_file in processed_dir.glob("*.json"):
                 try:
                     with open(json_file) as f:
                         data = json.load(f)
-                        screenshot = ScreenshotMetadata(**data)
-                        self.index_screenshot(screenshot)
+                        screenshots.append(ScreenshotMetadata(**data))
                 except Exception as e:
                     print(f"Error loading {json_file}: {e}")
+            if screenshots:
+                # Reuse archived embeddings; screenshots without one are encoded once the model loads
+                stored = self.archive.memmap()
+                embeddings = []
+                for screenshot in screenshots:
+                    row = self.archive.rows.get(self._embedding_key(screenshot))
+                    embeddings.append(np.array(stored[row]) if row is not None else None)
+                reused = sum(1 for embedding in embeddings if embedding is not None)
+                for chunk in range(0, len(screenshots), LOAD_CHUNK_SIZE):
+                    self.index_screenshots(screenshots[chunk:chunk + LOAD_CHUNK_SIZE], embeddings[chunk:chunk + LOAD_CHUNK_SIZE])
+                print(f"📚 Loaded {len(screenshots)} screenshots into the search index ({reused} embeddings from disk)")
+    
+    def get_index_text(self, screenshot: ScreenshotMetadata) -> str:
+        """Text that is embedded for a screenshot"""
+        return f"{screenshot.ocr_text} {screenshot.visual_description}"
+    
+    def _embedding_key(self, screenshot: ScreenshotMetadata) -> str:
+        """Archive key: the file hash plus a digest of the embedded text"""
+        text_digest = hashlib.md5(self.get_index_text(screenshot).encode()).hexdigest()[:16]
+        return f"{screenshot.file_hash}:{text_digest}"
+    
+    def _archive_embeddings(self, screenshots: List[ScreenshotMetadata], embeddings: np.ndarray):
+        """Write embeddings not yet on disk to the archive"""
+        keys = [self._embedding_key(screenshot) for screenshot in screenshots]
+        new_rows = [i for i, key in enumerate(keys) if key not in self.archive.rows]
+        if not new_rows:
+            return
+        try:
+            self.archive.append([keys[i] for i in new_rows], np.atleast_2d(embeddings)[new_rows])
+        except OSError as e:
+            print(f"⚠️  Failed to archive embeddings: {e}")
+    
+    def compact_archive(self, force: bool = False) -> int:
+        """Rewrite the embedding archive without rows no indexed screenshot refers to
+
+        Replaced and deleted screenshots leave their rows behind, so this runs
+        after warm-up once EMBEDDING_STORE_COMPACTION_RATIO of the archive is
+        unreferenced (or always with force). Returns the number of rows dropped.
+        """
+        with self._lock:
+            keep = {self._embedding_key(self.screenshots[row]) for row in self.rows.values()}
+            unreferenced = self.archive.count - len(keep & self.archive.rows.keys())
+            if unreferenced == 0 or (not force and unreferenced < settings.EMBEDDING_STORE_COMPACTION_RATIO * self.archive.count):
+                return 0
+            old_rows = dict(self.archive.rows)
+            # Archive row numbers change, so an in-flight index compaction must not install its snapshot
+            self._generation += 1
+            self._archive_view = None
+            try:
+                dropped = self.archive.compact(keep)
+                print(f"🧹 Compacted embedding archive: dropped {dropped} rows, {self.archive.count} remain")
+            except OSError as e:
+                # The archive is either untouched or reset, its rows say which
+                print(f"⚠️  Failed to compact embedding archive: {e}")
+                dropped = 0
+            moved = {old_rows[key]: row for key, row in self.archive.rows.items()}
+            self._archive_rows = [moved.get(row, -1) for row in self._archive_rows]
+            return dropped
     
-    def index_screenshot(self, screenshot: ScreenshotMetadata):
-        """Add a screenshot to the search index"""
-        combined_text = f"{screenshot.ocr_text} {screenshot.visual_description}"
-        embedding = self.model.encode(combined_text)
+    def index_screenshot(self, screenshot: ScreenshotMetadata, embedding: Optional[np.ndarray] = None):
+        """Add or replace a screenshot in the search index
         
-        screenshot.embedding = embedding.tolist()
-        self.screenshots.append(screenshot)
-        self.embeddings.append(embedding)
+        embedding may be precomputed (e.g. with encode_texts in a worker process);
+        otherwise it is encoded here.
+        """
+        self.index_screenshots([screenshot], [embedding])
     
-    def search(self, query: str, top_k: int = 10) -> List[SearchResult]:
-        """Search for screenshots matching the query"""
-        if not self.screenshots:
-            return []
+    def index_screenshots(
+        self,
+        screenshots: List[ScreenshotMetadata],
+        embeddings: Optional[Sequence[Optional[np.ndarray]]] = None
+    ):
+        """Add or replace many screenshots in the search index in one pass
         
-        query_embedding = self.model.encode(query)
+        embeddings, if given, lines up with screenshots; entries that are None
+        (or all of them, when omitted) are encoded together with encode_in_batches.
+        A file hash that is already indexed is updated in place when its indexed
+        text is unchanged; otherwise its old row is tombstoned and a new row
+        appended. Within one call the last entry for a hash wins. Until the model
+        has loaded, new rows are indexed lexically and their vectors added by warm-up.
+        """
+        if not screenshots:
+            return
+        embeddings = list(embeddings) if embeddings is not None else [None] * len(screenshots)
+        with self._lock:
+            self._generation += 1
+            
+            latest = {screenshot.file_hash: i for i, screenshot in enumerate(screenshots)}
+            appended = []
+            for i, screenshot in enumerate(screenshots):
+                if latest[screenshot.file_hash] != i:
+                    continue
+                row = self.rows.get(screenshot.file_hash)
+                if row is not None:
+                    previous = self.screenshots[row]
+                    if self.get_index_text(previous) == self.get_index_text(screenshot):
+                        self.screenshots[row] = screenshot
+                        continue
+                    self._tombstone(row)
+                appended.append(i)
+            if not appended:
+                return
+            screenshots = [screenshots[i] for i in appended]
+            rows: List[Optional[np.ndarray]] = [embeddings[i] for i in appended]
+            
+            if not self.is_ready():
+                for row, embedding in enumerate(rows, start=len(self.screenshots)):
+                    if embedding is not None:
+                        self._pending_embeddings[row] = embedding
+                self._append_rows(screenshots)
+                return
+            
+            missing = [i for i, embedding in enumerate(rows) if embedding is None]
+            if missing:
+                encoded = encode_in_batches(self.model, [self.get_index_text(screenshots[i]) for i in missing])
+                for i, embedding in zip(missing, encoded):
+                    rows[i] = embedding
+            
+            self._append_rows(screenshots)
+            self._add_vectors(screenshots, np.vstack(rows).astype(np.float32))
+    
+    def _append_rows(self, screenshots: List[ScreenshotMetadata]):
+        """Append screenshots as new rows of the lexical indexes"""
+        for row, screenshot in enumerate(screenshots, start=len(self.screenshots)):
+            self._index_text(row, screenshot)
+            self.rows[screenshot.file_hash] = row
+        self.screenshots.extend(screenshots)
+    
+    def _add_vectors(self, screenshots: List[ScreenshotMetadata], matrix: np.ndarray):
+        """Append the vectors of the next rows without one"""
+        self._generation += 1
+        # Vectors live only in the store (and archive), not on the metadata objects
+        start = self.vectors.add(matrix)
+        self.ann_index.add(start, len(matrix))
+        self._archive_embeddings(screenshots, matrix)
+        self._archive_rows.extend(self.archive.rows.get(self._embedding_key(screenshot), -1) for screenshot in screenshots)
+    
+    def remove(self, file_hash: str) -> bool:
+        """Remove a screenshot from the index, returning whether it was indexed
         
-        similarities = cosine_similarity([query_embedding], self.embeddings)[0]
+        The row is tombstoned and skipped by search until the next compaction.
+        """
+        with self._lock:
+            row = self.rows.pop(file_hash, None)
+            if row is None:
+                return False
+            self._generation += 1
+            self._tombstone(row)
+            return True
+    
+    def _tombstone(self, row: int):
+        """Skip a row in search and drop it from the BM25 statistics until compaction"""
+        self._tombstones.add(row)
+        self.ocr_terms.remove(row)
+        self.description_terms.remove(row)
+    
+    def _index_text(self, row: int, screenshot: ScreenshotMetadata):
+        """Add a screenshot's OCR text and description to the BM25 indexes"""
+        self.ocr_terms.add(row, screenshot.ocr_text)
+        self.description_terms.add(row, screenshot.visual_description)
+    
+    def needs_compaction(self) -> bool:
+        """Whether enough rows are tombstoned to be worth rebuilding the index"""
+        # Compaction renumbers rows, which warm-up relies on until it is done
+        if not self.is_ready():
+            return False
+        threshold = max(settings.SEARCH_COMPACTION_MIN_ROWS, settings.SEARCH_COMPACTION_RATIO * len(self.screenshots))
+        return len(self._tombstones) >= threshold
+    
+    def compact(self):
+        """Drop tombstoned rows from every index structure"""
+        with self._lock:
+            if not self.is_ready():
+                return
+            self._install_compacted(self._build_compacted(*self._compaction_snapshot()))
+    
+    async def compact_in_background(self):
+        """Rebuild without tombstones on the I/O thread pool, then swap the result in
+        
+        The snapshot is taken and the result installed under the lock. If the
+        index changed meanwhile (including vectors added by warm-up) the result
+        is discarded and the next trigger tries again. Nothing is compacted
+        before warm-up finishes, since it renumbers rows.
+        """
+        if self._compacting or not self.is_ready():
+            return
+        self._compacting = True
+        try:
+            with self._lock:
+                generation = self._generation
+                snapshot = self._compaction_snapshot()
+            compacted = await get_executors().run_io(self._build_compacted, *snapshot)
+            with self._lock:
+                if generation != self._generation:
+                    print("🔁 Search index changed during compaction, retrying later")
+                    return
+                self._install_compacted(compacted)
+        finally:
+            self._compacting = False
+    
+    def _compaction_snapshot(self) -> Tuple[List[ScreenshotMetadata], VectorStore, np.ndarray, List[int]]:
+        live = np.array([row for row in range(len(self.screenshots)) if row not in self._tombstones], dtype=np.int64)
+        # Rows below the current size are never rewritten (a clear bumps the generation),
+        # so the store can be read from another thread
+        return [self.screenshots[row] for row in live], self.vectors, live, [self._archive_rows[row] for row in live]
+    
+    def _build_compacted(
+        self,
+        screenshots: List[ScreenshotMetadata],
+        vectors: VectorStore,
+        live: np.ndarray,
+        archive_rows: List[int]
+    ) -> Dict[str, Any]:
+        vectors = vectors.compacted(live)
+        ann_index = create_ann_index(vectors)
+        ann_index.add(0, len(vectors))
+        ocr_terms = BM25Index(positions=self.ocr_terms.positions)
+        description_terms = BM25Index(positions=self.description_terms.positions)
+        for row, screenshot in enumerate(screenshots):
+            ocr_terms.add(row, screenshot.ocr_text)
+            description_terms.add(row, screenshot.visual_description)
+        return {
+            "screenshots": screenshots,
+            "vectors": vectors,
+            "ann_index": ann_index,
+            "ocr_terms": ocr_terms,
+            "description_terms": description_terms,
+            "rows": {screenshot.file_hash: row for row, screenshot in enumerate(screenshots)},
+            "_archive_rows": archive_rows
+        }
+    
+    def _install_compacted(self, compacted: Dict[str, Any]):
+        dropped = len(self._tombstones)
+        for name, value in compacted.items():
+            setattr(self, name, value)
+        self._tombstones = set()
+        self._generation += 1
+        print(f"🧹 Compacted search index: dropped {dropped} rows, {len(self.screenshots)} remain")
+    
+    def search(self, query: str, top_k: int = 10, offset: int = 0) -> List[SearchResult]:
+        """Search for screenshots matching the query
+        
+        Returns results offset..offset + top_k of the ranking. Scores are
+        lexical-only (BM25) until the model has loaded and every row has a vector.
+        """
+        with self._lock:
+            return self._search(query, top_k, offset)
+    
+    def _search(self, query: str, top_k: int, offset: int) -> List[SearchResult]:
+        if not self.rows or top_k <= 0:
+            return []
+        
+        # Rows outside the ANN candidates keep a semantic score of 0
+        similarities = np.zeros(len(self.screenshots), dtype=np.float32)
+        hybrid = self.is_ready()
+        if hybrid:
+            query_embedding = self._encode_query(query)
+            candidate_rows, candidate_scores = self.ann_index.search(query_embedding)
+            similarities[candidate_rows] = candidate_scores
         
         text_scores = self._calculate_text_match_scores(query)
         visual_scores = self._calculate_visual_match_scores(query)
         
-        combined_scores = similarities * 0.5 + text_scores * 0.25 + visual_scores * 0.25
-        
-        top_indices = np.argsort(combined_scores)[-top_k:][::-1]
-        
-        results = []
-        for idx in top_indices:
-            if combined_scores[idx] > 0.1:
-                screenshot = self.screenshots[idx]
-                
-                match_type = "combined"
-                if text_scores[idx] > visual_scores[idx] * 1.5:
-                    match_type = "text"
-                elif visual_scores[idx] > text_scores[idx] * 1.5:
-                    match_type = "visual"
-                
-                # Use evaluation confidence score if available, otherwise use search score
-                if screenshot.evaluation and 'confidence_score' in screenshot.evaluation:
-                    confidence_score = screenshot.evaluation['confidence_score']  # Already a ratio (0-1)
-                else:
-                    confidence_score = float(combined_scores[idx])  # Fallback to search score
-                
-                results.append(SearchResult(
-                    filename=screenshot.filename,
-                    file_hash=screenshot.file_hash,
-                    score=confidence_score,
-                    confidence_score=confidence_score,  # Set both fields
-                    ocr_text=screenshot.ocr_text,  # Return full text
-                    visual_description=screenshot.visual_description,  # Return full description
-                    processed_at=screenshot.processed_at,
-                    match_type=match_type,
-                    evaluation=screenshot.evaluation
-                ))
-        
-        return results
-    
-    def _calculate_text_match_scores(self, query: str) -> np.ndarray:
-        """Calculate text-based matching scores"""
-        query_lower = query.lower()
-        scores = []
+        combined_scores = (
+            similarities * settings.SEARCH_SEMANTIC_WEIGHT
+            + text_scores * settings.SEARCH_OCR_WEIGHT
+            + visual_scores * settings.SEARCH_DESCRIPTION_WEIGHT
+        )
+        if self._tombstones:
+            combined_scores[np.fromiter(self._tombstones, dtype=np.int64, count=len(self._tombstones))] = -np.inf
         
-        for screenshot in self.screenshots:
-            ocr_lower = screenshot.ocr_text.lower()
-            score = 0.0
-            
-            if query_lower in ocr_lower:
-                score = 1.0
-            else:
-                query_words = query_lower.split()
-                matches = sum(1 for word in query_words if word in ocr_lower)
-                if query_words:
-                    score = matches / len(query_words)
-            
-            scores.append(score)
+        ranked_rows = None
+        if hybrid and self.vectors.quantization != "none":
+            ranked_rows = self._rescore_exact(query_embedding, offset + top_k, candidate_rows, similarities, combined_scores)
+        page = rank_page(combined_scores, offset, top_k, ranked_rows)
         
-        return np.array(scores)
+        # Only the returned page is turned into response objects
+        match_types = np.where(
+            text_scores[page] > visual_scores[page] * 1.5, "text",
+            np.where(visual_scores[page] > text_scores[page] * 1.5, "visual", "combined")
+        )
+        return [
+            self._make_result(self.screenshots[row], float(combined_scores[row]), str(match_type))
+            for row, match_type in zip(page, match_types)
+        ]
     
-    def _calculate_visual_match_scores(self, query: str) -> np.ndarray:
-        """Calculate visual description matching scores"""
-        query_lower = query.lower()
-        scores = []
+    def _make_result(self, screenshot: ScreenshotMetadata, score: float, match_type: str) -> SearchResult:
+        # Use evaluation confidence score if available, otherwise use search score
+        if screenshot.evaluation and 'confidence_score' in screenshot.evaluation:
+            confidence_score = screenshot.evaluation['confidence_score']  # Already a ratio (0-1)
+        else:
+            confidence_score = score  # Fallback to search score
         
-        visual_keywords = ['button', 'color', 'blue', 'red', 'green', 'icon', 'image', 
-                          'screenshot', 'window', 'dialog', 'menu', 'toolbar', 'sidebar']
+        # Every field comes from already validated metadata, so skip re-validation
+        return SearchResult.model_construct(
+            filename=screenshot.filename,
+            file_hash=screenshot.file_hash,
+            score=confidence_score,
+            confidence_score=confidence_score,  # Set both fields
+            ocr_text=screenshot.ocr_text,  # Return full text
+            visual_description=screenshot.visual_description,  # Return full description
+            processed_at=screenshot.processed_at,
+            match_type=match_type,
+            evaluation=screenshot.evaluation
+        )
+    
+    def _rescore_exact(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int,
+        candidate_rows: np.ndarray,
+        similarities: np.ndarray,
+        combined_scores: np.ndarray
+    ) -> np.ndarray:
+        """Re-score the best candidates with exact similarities, returning the rows to rank
         
-        has_visual_intent = any(keyword in query_lower for keyword in visual_keywords)
+        Quantized similarities of the top_k * SEARCH_RESCORE_FACTOR rows are
+        replaced with cosine similarity against the float32 vectors in the
+        memory-mapped archive (rows that are not archived keep their estimate).
+        combined_scores is updated in place.
+        """
+        candidates = top_k_indices(combined_scores, top_k * settings.SEARCH_RESCORE_FACTOR)
+        candidates = candidates[np.isfinite(combined_scores[candidates])]
+        # Only rows the ANN index scored have a semantic component to correct
+        scored = np.zeros(len(combined_scores), dtype=bool)
+        scored[candidate_rows] = True
+        rows = candidates[scored[candidates]]
         
-        for screenshot in self.screenshots:
-            desc_lower = screenshot.visual_description.lower()
-            score = 0.0
-            
-            if has_visual_intent:
-                if query_lower in desc_lower:
-                    score = 1.0
-                else:
-                    query_words = query_lower.split()
-                    matches = sum(1 for word in query_words if word in desc_lower)
-                    if query_words:
-                        score = matches / len(query_words)
-            
-            scores.append(score)
+        stored = self._archive_vectors()
+        archive_rows = np.array([self._archive_rows[row] for row in rows], dtype=np.int64)
+        exact = (archive_rows >= 0) & (archive_rows < (len(stored) if stored is not None else 0))
+        if exact.any():
+            rows = rows[exact]
+            query = normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+            scores = normalize(np.asarray(stored[archive_rows[exact]])) @ query
+            combined_scores[rows] += (scores - similarities[rows]) * settings.SEARCH_SEMANTIC_WEIGHT
+            similarities[rows] = scores
+        return candidates
+    
+    def get_screenshot(self, file_hash: str) -> Optional[ScreenshotMetadata]:
+        """Indexed metadata for a file hash"""
+        with self._lock:
+            row = self.rows.get(file_hash)
+            return self.screenshots[row] if row is not None else None
+    
+    def snippets(self, query: str, file_hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """OCR text and description snippets highlighting the query terms, per file hash
         
-        return np.array(scores)
+        Matches come from the token positions stored in the BM25 indexes.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        snippets = {}
+        with self._lock:
+            for file_hash in file_hashes:
+                row = self.rows.get(file_hash)
+                if row is None:
+                    continue
+                screenshot = self.screenshots[row]
+                snippets[file_hash] = {
+                    "ocr_text": build_snippet(screenshot.ocr_text, self._term_spans(self.ocr_terms, row, screenshot.ocr_text, terms)),
+                    "visual_description": build_snippet(
+                        screenshot.visual_description,
+                        self._term_spans(self.description_terms, row, screenshot.visual_description, terms)
+                    )
+                }
+        return snippets
+    
+    def _term_spans(self, index: BM25Index, row: int, text: str, terms: List[str]) -> List[Tuple[int, int]]:
+        if index.positions:
+            return index.term_spans(row, terms)
+        return find_term_spans(text, terms)
+    
+    def _archive_vectors(self) -> Optional[np.ndarray]:
+        """Memory map of the archived float32 vectors, reopened after appends"""
+        if self._archive_view is None or len(self._archive_view) != self.archive.count:
+            self._archive_view = self.archive.memmap()
+        return self._archive_view
+    
+    def _encode_query(self, query: str) -> np.ndarray:
+        """Embed a query, reusing the vector for repeated queries"""
+        embedding = self.query_cache.get(self.model_name, query)
+        if embedding is None:
+            embedding = np.asarray(self.model.encode(query), dtype=np.float32)
+            self.query_cache.put(self.model_name, query, embedding)
+        return embedding
+    
+    def _calculate_text_match_scores(self, query: str) -> np.ndarray:
+        """BM25 scores of the OCR text, 0..1"""
+        # An empty query matches every screenshot ("show all")
+        if not query.strip():
+            return np.ones(len(self.screenshots), dtype=np.float32)
+        return self.ocr_terms.scores(tokenize(query))
+    
+    def _calculate_visual_match_scores(self, query: str) -> np.ndarray:
+        """BM25 scores of the visual description, 0..1, for queries with visual intent"""
+        if not VISUAL_INTENT_PATTERN.search(query.lower()):
+            return np.zeros(len(self.screenshots), dtype=np.float32)
+        return self.description_terms.scores(tokenize(query))
     
     def get_indexed_count(self) -> int:
         """Get the number of indexed screenshots"""
-        return len(self.screenshots)
+        return len(self.rows)
     
     def clear_index(self):
         """Clear all indexed screenshots and embeddings"""
-        self.screenshots.clear()
-        self.embeddings.clear()
\ No newline at end of file
+        with self._lock:
+            self._generation += 1
+            self._epoch += 1
+            self.screenshots.clear()
+            self.rows.clear()
+            self._tombstones.clear()
+            self._archive_rows.clear()
+            self._pending_embeddings.clear()
+            self.vectors.clear()
+            self.ann_index.clear()
+            self.ocr_terms.clear()
+            self.description_terms.clear()
\ No newline at end of file
@@ -2,9 +2,11 @@
 Lightweight search service for Heroku deployment
 Uses simple text matching instead of vector embeddings
 """
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import re
 from app.models import SearchResult, ScreenshotMetadata
+from app.services.tokens import tokenize
+from app.services.snippets import build_snippet, find_term_spans
 import difflib
 
 
@@ -13,68 +15,69 @@ class SimpleSearchService:
     
     def __init__(self):
         self.screenshots: List[ScreenshotMetadata] = []
+        self.rows: Dict[str, int] = {}  # file hash -> position in self.screenshots
     
     def index_screenshot(self, metadata: ScreenshotMetadata):
-        """Add screenshot to search index"""
-        # Remove any existing entry with same hash
-        self.screenshots = [s for s in self.screenshots if s.file_hash != metadata.file_hash]
-        self.screenshots.append(metadata)
+        """Add screenshot to search index, replacing any entry with the same hash"""
+        row = self.rows.get(metadata.file_hash)
+        if row is not None:
+            self.screenshots[row] = metadata
+        else:
+            self.rows[metadata.file_hash] = len(self.screenshots)
+            self.screenshots.append(metadata)
     
-    def search(self, query: str, top_k: int = 10) -> List[SearchResult]:
-        """Simple text-based search"""
+    def index_screenshots(self, screenshots: List[ScreenshotMetadata], embeddings=None):
+        """Add many screenshots at once (embeddings are accepted for parity and ignored)"""
+        for metadata in screenshots:
+            self.index_screenshot(metadata)
+    
+    def remove(self, file_hash: str) -> bool:
+        """Remove a screenshot from the index, returning whether it was indexed"""
+        row = self.rows.pop(file_hash, None)
+        if row is None:
+            return False
+        # Move the last entry into the hole so removal stays O(1)
+        last = self.screenshots.pop()
+        if row < len(self.screenshots):
+            self.screenshots[row] = last
+            self.rows[last.file_hash] = row
+        return True
+    
+    def search(self, query: str, top_k: int = 10, offset: int = 0) -> List[SearchResult]:
+        """Simple text-based search, returning results offset..offset + top_k"""
         if not query.strip():
-            # Return all screenshots when no query provided
-            results = []
-            for screenshot in self.screenshots:
-                # Use evaluation confidence score if available, otherwise use search score
-                if screenshot.evaluation and 'confidence_score' in screenshot.evaluation:
-                    confidence_score = screenshot.evaluation['confidence_score']  # Already a ratio (0-1)
-                else:
-                    confidence_score = 1.0  # Give all results max score when no search
-                    
-                result = SearchResult(
-                    filename=screenshot.filename,
-                    file_hash=screenshot.file_hash,
-                    ocr_text=screenshot.ocr_text,
-                    visual_description=screenshot.visual_description,
-                    score=confidence_score,
-                    confidence_score=confidence_score,
-                    processed_at=screenshot.processed_at,
-                    evaluation=screenshot.evaluation
-                )
-                results.append(result)
-            # Sort by processed time (newest first)
-            results.sort(key=lambda x: x.processed_at, reverse=True)
-            return results
+            # Return all screenshots when no query provided, newest first
+            ranked = sorted(self.screenshots, key=lambda x: x.processed_at, reverse=True)
+            return [self._make_result(screenshot) for screenshot in ranked[offset:offset + top_k]]
         
         query_lower = query.lower().strip()
-        results = []
-        
+        scored = []
         for screenshot in self.screenshots:
             score = self._calculate_simple_score(query_lower, screenshot)
-            
             if score > 0:
-                # Use evaluation confidence score if available, otherwise use search score
-                if screenshot.evaluation and 'confidence_score' in screenshot.evaluation:
-                    confidence_score = screenshot.evaluation['confidence_score']  # Already a ratio (0-1)
-                else:
-                    confidence_score = score  # Use search score as fallback
-                    
-                result = SearchResult(
-                    filename=screenshot.filename,
-                    file_hash=screenshot.file_hash,
-                    ocr_text=screenshot.ocr_text,
-                    visual_description=screenshot.visual_description,
-                    score=score,
-                    confidence_score=confidence_score,
-                    processed_at=screenshot.processed_at,
-                    evaluation=screenshot.evaluation
-                )
-                results.append(result)
+                scored.append((score, screenshot))
         
-        # Sort by score descending
-        results.sort(key=lambda x: x.score, reverse=True)
-        return results[:top_k]
+        # Sort by score descending, then build results for the returned page only
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return [self._make_result(screenshot, score) for score, screenshot in scored[offset:offset + top_k]]
+    
+    def _make_result(self, screenshot: ScreenshotMetadata, score: Optional[float] = None) -> SearchResult:
+        """Build a result; without a search score (show all) the confidence is the score"""
+        # Use evaluation confidence score if available, otherwise use search score
+        if screenshot.evaluation and 'confidence_score' in screenshot.evaluation:
+            confidence_score = screenshot.evaluation['confidence_score']  # Already a ratio (0-1)
+        else:
+            confidence_score = 1.0 if score is None else score  # Give all results max score when no search
+        return SearchResult(
+            filename=screenshot.filename,
+            file_hash=screenshot.file_hash,
+            ocr_text=screenshot.ocr_text,
+            visual_description=screenshot.visual_description,
+            score=confidence_score if score is None else score,
+            confidence_score=confidence_score,
+            processed_at=screenshot.processed_at,
+            evaluation=screenshot.evaluation
+        )
     
     def _calculate_simple_score(self, query: str, screenshot: ScreenshotMetadata) -> float:
         """Calculate simple text matching score"""
@@ -123,10 +126,29 @@ class SimpleSearchService:
         total_score = exact_score + (word_score / max(1, len(query_words))) + fuzzy_score
         return min(1.0, total_score)  # Cap at 1.0
     
+    def get_screenshot(self, file_hash: str) -> Optional[ScreenshotMetadata]:
+        """Indexed metadata for a file hash"""
+        row = self.rows.get(file_hash)
+        return self.screenshots[row] if row is not None else None
+    
+    def snippets(self, query: str, file_hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """OCR text and description snippets highlighting the query terms, per file hash"""
+        terms = tokenize(query)
+        snippets = {}
+        for file_hash in file_hashes:
+            screenshot = self.get_screenshot(file_hash)
+            if screenshot is not None:
+                snippets[file_hash] = {
+                    "ocr_text": build_snippet(screenshot.ocr_text, find_term_spans(screenshot.ocr_text, terms)),
+                    "visual_description": build_snippet(screenshot.visual_description, find_term_spans(screenshot.visual_description, terms))
+                }
+        return snippets
+    
     def get_indexed_count(self) -> int:
         """Get number of indexed screenshots"""
         return len(self.screenshots)
     
     def clear_index(self):
         """Clear all indexed screenshots"""
-        self.screenshots.clear()
\ No newline at end of file
+        self.screenshots.clear()
+        self.rows.clear()
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""
+Bounded text windows around matched query terms, for /search snippet mode
+Highlights are (start, end) character offsets relative to the snippet text.
+The full search service passes term spans recorded in its BM25 index;
+find_term_spans rescans the text for services without stored positions.
+"""
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+from app.config import settings
+from app.services.tokens import token_spans
+
+
+def find_term_spans(text: str, terms: Iterable[str]) -> List[Tuple[int, int]]:
+    """Character spans of every occurrence of the (lowercased) terms in text"""
+    terms = set(terms)
+    return [(start, end) for token, start, end in token_spans(text) if token in terms]
+
+
+def build_snippet(text: str, spans: Sequence[Tuple[int, int]], width: int = 0) -> Dict[str, Any]:
+    """Window of at most width characters covering as many spans as possible
+
+    The window starts a little before the first span it covers so the match
+    has some leading context. Without spans it is the start of the text.
+    start and end locate the window in the full text.
+    """
+    width = width or settings.SEARCH_SNIPPET_CHARS
+    text = text or ""
+    spans = sorted(spans)
+    start = 0
+    if spans:
+        # Two pointers: the span to anchor on that fits the most spans after it into the window
+        best, best_count, last = 0, 0, 0
+        for first in range(len(spans)):
+            last = max(last, first)
+            while last + 1 < len(spans) and spans[last + 1][1] - spans[first][0] <= width:
+                last += 1
+            if last - first + 1 > best_count:
+                best, best_count = first, last - first + 1
+        covered_end = spans[best + best_count - 1][1]
+        lead = min(width // 4, max(width - (covered_end - spans[best][0]), 0))
+        start = max(spans[best][0] - lead, 0)
+    start = max(min(start, len(text) - width), 0)
+    end = min(start + width, len(text))
+    return {
+        "text": text[start:end],
+        "start": start,
+        "end": end,
+        "highlights": [[span_start - start, span_end - start] for span_start, span_end in spans if span_start >= start and span_end <= end]
+    }
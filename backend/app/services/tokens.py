@@ -0,0 +1,19 @@
+"""
+Word tokenization shared by BM25 scoring and snippet highlighting
+Pure Python so the lightweight search service can use it without numpy.
+"""
+import re
+from typing import Iterator, List, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens"""
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+def token_spans(text: str) -> Iterator[Tuple[str, int, int]]:
+    """Lowercased word tokens with their character span in text"""
+    for match in TOKEN_PATTERN.finditer(text or ""):
+        yield match.group().lower(), match.start(), match.end()
@@ -0,0 +1,314 @@
+"""
+Contiguous embedding storage for vector search
+Embeddings are L2-normalized once on insert into a preallocated matrix (float32,
+or int8/binary codes when quantized), so cosine similarity against every
+screenshot is a single matrix-vector product.
+EmbeddingArchive keeps the exact float32 rows on disk so restarts skip
+re-encoding and quantized scores can be rescored exactly.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+# Set bits per byte value, for Hamming distances over packed sign bits
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+# Rows dequantized at a time when scoring int8 codes
+SCORE_BLOCK_ROWS = 8192
+# Rows copied at a time when the archive is rewritten
+ARCHIVE_COMPACTION_CHUNK_ROWS = 65536
+
+
+class VectorStore:
+    """Growable row-major store of unit-length embeddings
+
+    quantization="none" keeps float32 rows. "int8" keeps one signed byte per
+    dimension plus a per-row scale (4x smaller); "binary" keeps one sign bit
+    per dimension (32x smaller) and scores by Hamming distance. Quantized
+    scores are approximate, so callers rescore their best candidates against
+    the exact vectors.
+    """
+
+    def __init__(self, dim: Optional[int] = None, initial_capacity: int = 1024, quantization: str = "none"):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization '{quantization}', expected one of {QUANTIZATION_MODES}")
+        self.dim = dim
+        self.quantization = quantization
+        self._initial_capacity = max(1, initial_capacity)
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None  # int8 only
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Float32 view (or dequantized copy) of every stored row"""
+        if self._codes is None:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        if self.quantization == "none":
+            return self._codes[:self._size]
+        return self.rows(np.arange(self._size))
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the stored rows"""
+        used = 0 if self._codes is None else self._codes[:self._size].nbytes
+        if self._scales is not None:
+            used += self._scales[:self._size].nbytes
+        return used
+
+    def _code_shape(self) -> Tuple[int, type]:
+        if self.quantization == "binary":
+            return (self.dim + 7) // 8, np.uint8
+        return self.dim, np.int8 if self.quantization == "int8" else np.float32
+
+    def _reserve(self, rows: int):
+        """Ensure capacity for `rows` more vectors, doubling to keep appends amortized O(1)"""
+        needed = self._size + rows
+        width, dtype = self._code_shape()
+        if self._codes is None:
+            capacity = max(self._initial_capacity, needed)
+        elif needed > self._codes.shape[0]:
+            capacity = max(self._codes.shape[0] * 2, needed)
+        else:
+            return
+        grown = np.zeros((capacity, width), dtype=dtype)
+        if self._codes is not None:
+            grown[:self._size] = self._codes[:self._size]
+        self._codes = grown
+        if self.quantization == "int8":
+            scales = np.zeros(capacity, dtype=np.float32)
+            if self._scales is not None:
+                scales[:self._size] = self._scales[:self._size]
+            self._scales = scales
+
+    def add(self, vectors: np.ndarray) -> int:
+        """Append one vector or a (n, dim) batch, returning the first new row index"""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got {vectors.shape[1]}")
+
+        self._reserve(len(vectors))
+        start = self._size
+        end = start + len(vectors)
+        vectors = normalize(vectors)
+        if self.quantization == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1.0
+            self._codes[start:end] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._scales[start:end] = scales
+        elif self.quantization == "binary":
+            self._codes[start:end] = np.packbits(vectors > 0, axis=1)
+        else:
+            self._codes[start:end] = vectors
+        self._size = end
+        return start
+
+    def rows(self, indices: np.ndarray) -> np.ndarray:
+        """Float32 rows (dequantized for quantized stores)"""
+        if self._codes is None:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        indices = np.asarray(indices, dtype=np.int64)
+        if self.quantization == "int8":
+            return self._codes[indices].astype(np.float32) * self._scales[indices, None]
+        if self.quantization == "binary":
+            bits = np.unpackbits(self._codes[indices], axis=1, count=self.dim)
+            return (bits.astype(np.float32) * 2 - 1) / np.sqrt(self.dim)
+        return self._codes[indices]
+
+    def _score_codes(self, codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        if self.quantization == "binary":
+            query_bits = np.packbits(query > 0)
+            differing = POPCOUNT[np.bitwise_xor(codes, query_bits)].sum(axis=1, dtype=np.int32)
+            # Agreeing minus disagreeing signs, scaled to -1..1
+            return (1 - 2 * differing / self.dim).astype(np.float32)
+        if self.quantization == "int8":
+            scores = np.empty(len(codes), dtype=np.float32)
+            # Dequantize in blocks to bound the temporary float32 copy
+            for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+                block = slice(start, start + SCORE_BLOCK_ROWS)
+                scores[block] = (codes[block].astype(np.float32) @ query) * scales[block]
+            return scores
+        return codes @ query
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of the query against every stored vector (approximate when quantized)"""
+        if self._size == 0:
+            return np.zeros(0, dtype=np.float32)
+        query = normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        scales = self._scales[:self._size] if self._scales is not None else None
+        return self._score_codes(self._codes[:self._size], scales, query)
+
+    def row_scores(self, query: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        """Cosine similarity of the query against the given rows"""
+        query = normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        scales = self._scales[indices] if self._scales is not None else None
+        return self._score_codes(self._codes[indices], scales, query)
+
+    def compacted(self, keep: np.ndarray) -> "VectorStore":
+        """New store holding only the rows in keep, copied without requantizing"""
+        store = VectorStore(dim=self.dim, initial_capacity=max(1, len(keep)), quantization=self.quantization)
+        if len(keep):
+            store._reserve(len(keep))
+            store._codes[:len(keep)] = self._codes[keep]
+            if self._scales is not None:
+                store._scales[:len(keep)] = self._scales[keep]
+            store._size = len(keep)
+        return store
+
+    def clear(self):
+        """Drop all vectors, keeping the allocated buffer for reuse"""
+        self._size = 0
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows; zero vectors stay zero (cosine similarity 0)"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without a full sort"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(scores, -k)[-k:]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+
+class EmbeddingArchive:
+    """Append-only on-disk embeddings tagged with the model and backend that produced them
+
+    Rows are raw float32 values in embeddings.f32 (memory-mapped on load) with
+    one key per line in keys.txt; manifest.json records the model, the encoder
+    backend and the dimension. Vectors of another model or backend are discarded.
+    A row only counts once both its vector and key are on disk, so a write cut
+    short by a crash is trimmed on the next load. Rows of replaced or deleted
+    screenshots stay until compact() rewrites the files.
+    """
+
+    def __init__(self, directory: str, model_name: str, backend: str = "torch"):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.backend = backend
+        self.vectors_path = self.directory / "embeddings.f32"
+        self.keys_path = self.directory / "keys.txt"
+        self.manifest_path = self.directory / "manifest.json"
+        self.dim: Optional[int] = None
+        self.rows: Dict[str, int] = {}  # key -> row, later rows win
+        self.count = 0
+        self._load()
+
+    def _load(self):
+        if not self.manifest_path.exists():
+            # No manifest means no trusted rows (e.g. a compaction cut short); drop stray files
+            self._reset()
+            return
+        try:
+            manifest = json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Unreadable embedding manifest, starting a new archive: {e}")
+            self._reset()
+            return
+        if manifest.get("model") != self.model_name:
+            print(f"🔄 Embedding model changed ({manifest.get('model')} -> {self.model_name}), discarding stored embeddings")
+            self._reset()
+            return
+        # Archives written before backends were recorded all came from torch
+        if manifest.get("backend", "torch") != self.backend:
+            print(f"🔄 Embedding backend changed ({manifest.get('backend', 'torch')} -> {self.backend}), discarding stored embeddings")
+            self._reset()
+            return
+
+        self.dim = int(manifest["dim"])
+        keys = self.keys_path.read_text().splitlines() if self.keys_path.exists() else []
+        vector_bytes = self.vectors_path.stat().st_size if self.vectors_path.exists() else 0
+        self.count = min(len(keys), vector_bytes // (self.dim * 4))
+        if self.count != len(keys) or vector_bytes != self.count * self.dim * 4:
+            print(f"⚠️  Trimming embedding archive to {self.count} complete rows")
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(self.count * self.dim * 4)
+            self._write_keys(keys[:self.count])
+        self.rows = {key: row for row, key in enumerate(keys[:self.count])}
+
+    def _reset(self):
+        for path in (self.vectors_path, self.keys_path, self.manifest_path):
+            path.unlink(missing_ok=True)
+        self.dim = None
+        self.rows = {}
+        self.count = 0
+
+    def _write_manifest(self):
+        temp_path = self.manifest_path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps({"model": self.model_name, "backend": self.backend, "dim": self.dim}))
+        os.replace(temp_path, self.manifest_path)
+
+    def _write_keys(self, keys: List[str]):
+        temp_path = self.keys_path.with_suffix(".tmp")
+        temp_path.write_text("".join(f"{key}\n" for key in keys))
+        os.replace(temp_path, self.keys_path)
+
+    def memmap(self) -> Optional[np.memmap]:
+        """Read-only memory map of every stored row"""
+        if self.count == 0:
+            return None
+        return np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+
+    def append(self, keys: List[str], vectors: np.ndarray):
+        """Store vectors under keys (a key written again points at its newest row)"""
+        if not keys:
+            return
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._write_manifest()
+
+        # Vectors first: a key is only trusted once its row exists
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self.keys_path, "a") as f:
+            f.write("".join(f"{key}\n" for key in keys))
+        for offset, key in enumerate(keys):
+            self.rows[key] = self.count + offset
+        self.count += len(keys)
+
+    def compact(self, keep: Set[str]) -> int:
+        """Rewrite the files with only the newest rows of the keys in keep, returning the rows dropped
+
+        Kept rows stay in their original order. The manifest is removed while
+        the files are swapped, so a crash in between leaves an archive that is
+        discarded on the next load instead of keys pointing at the wrong rows.
+        """
+        kept = sorted((row, key) for key, row in self.rows.items() if key in keep)
+        dropped = self.count - len(kept)
+        if dropped == 0:
+            return 0
+        source = np.array([row for row, _ in kept], dtype=np.int64)
+        stored = self.memmap()
+        temp_path = self.vectors_path.with_suffix(".tmp")
+        with open(temp_path, "wb") as f:
+            for start in range(0, len(source), ARCHIVE_COMPACTION_CHUNK_ROWS):
+                f.write(np.ascontiguousarray(stored[source[start:start + ARCHIVE_COMPACTION_CHUNK_ROWS]]).tobytes())
+        del stored
+
+        self.manifest_path.unlink()
+        try:
+            os.replace(temp_path, self.vectors_path)
+            self._write_keys([key for _, key in kept])
+            self._write_manifest()
+        except OSError:
+            self._reset()
+            raise
+        self.rows = {key: row for row, (_, key) in enumerate(kept)}
+        self.count = len(kept)
+        return dropped
@@ -0,0 +1,71 @@
+"""
+Recall and latency of the IVF index against exact search, per nprobe
+
+    cd backend && python benchmarks/bench_ann_recall.py [--size 200000] [--nlist 0]
+
+Vectors are drawn around random topic centres (sentence embeddings cluster,
+uniform noise would be a worst case). Recall@k is the fraction of the exact
+top-k that the IVF candidates rank in their own top-k.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.ann_index import ExactIndex, IVFFlatIndex  # noqa: E402
+from app.services.vector_store import VectorStore, top_k_indices  # noqa: E402
+
+
+def clustered_vectors(rng, size, dim, topics, spread=0.6):
+    centres = rng.standard_normal((topics, dim)).astype(np.float32)
+    labels = rng.integers(topics, size=size)
+    return centres[labels] + spread * rng.standard_normal((size, dim)).astype(np.float32)
+
+
+def top_k_rows(index, query, k):
+    rows, scores = index.search(query)
+    return rows[top_k_indices(scores, k)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0, help="0 picks 4 * sqrt(size)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    store = VectorStore(dim=args.dim, initial_capacity=args.size)
+    store.add(clustered_vectors(rng, args.size, args.dim, args.topics))
+    queries = clustered_vectors(rng, args.queries, args.dim, args.topics)
+
+    exact = ExactIndex(store)
+    started = time.perf_counter()
+    truth = [set(top_k_rows(exact, query, args.top_k).tolist()) for query in queries]
+    exact_ms = (time.perf_counter() - started) / args.queries * 1000
+
+    ivf = IVFFlatIndex(store, nlist=args.nlist, min_rows=0)
+    started = time.perf_counter()
+    ivf.train()
+    print(f"📊 {args.size} vectors x {args.dim}d, trained {len(ivf.centroids)} lists in {time.perf_counter() - started:.1f}s")
+    print(f"  {'exact':<10} recall@{args.top_k} 1.000  {exact_ms:7.2f} ms/query")
+
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        started = time.perf_counter()
+        found = [top_k_rows(ivf, query, args.top_k) for query in queries]
+        ivf_ms = (time.perf_counter() - started) / args.queries * 1000
+        recall = np.mean([len(truth[i] & set(rows.tolist())) / args.top_k for i, rows in enumerate(found)])
+        print(f"  nprobe={nprobe:<3} recall@{args.top_k} {recall:.3f}  {ivf_ms:7.2f} ms/query ({exact_ms / ivf_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Parity and latency of the embedding backends against the torch model
+
+    cd backend && python benchmarks/bench_encoders.py [--backends torch-int8 onnx onnx-int8] [--export]
+
+Texts are synthetic OCR-like strings of varying length. Parity is the cosine
+similarity of each backend's vector to the torch vector for the same text;
+a backend fails when its minimum drops below PARITY_MIN_COSINE. The exit code
+is 1 if any backend fails, so this can gate a backend switch in CI.
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings  # noqa: E402
+from app.services.encoders import PARITY_MIN_COSINE, cosine_parity, create_encoder, export_onnx  # noqa: E402
+from app.services.search_service import EMBEDDING_MODEL_NAME  # noqa: E402
+
+WORDS = ("login button settings invoice total dashboard error dialog search results menu toolbar "
+         "password email account payment receipt chart sidebar profile upload download blue red").split()
+
+
+def synthetic_texts(rng, count):
+    lengths = rng.integers(3, 120, size=count)
+    return [" ".join(rng.choice(WORDS, size=length)) for length in lengths]
+
+
+def measure(encoder, texts, queries, batch_size):
+    started = time.perf_counter()
+    embeddings = encoder.encode(texts, batch_size=batch_size)
+    bulk_ms = (time.perf_counter() - started) / len(texts) * 1000
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        encoder.encode(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return embeddings, bulk_ms, statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch-int8", "onnx", "onnx-int8"])
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--export", action="store_true", help=f"Export the ONNX model to {settings.EMBEDDING_ONNX_DIR} first")
+    args = parser.parse_args()
+
+    if args.export:
+        export_onnx(EMBEDDING_MODEL_NAME, settings.EMBEDDING_ONNX_DIR)
+
+    rng = np.random.default_rng(0)
+    texts = synthetic_texts(rng, args.texts)
+    queries = [" ".join(rng.choice(WORDS, size=rng.integers(1, 5))) for _ in range(args.queries)]
+
+    started = time.perf_counter()
+    reference = create_encoder(EMBEDDING_MODEL_NAME, "torch")
+    load_s = time.perf_counter() - started
+    expected, bulk_ms, query_ms = measure(reference, texts, queries, args.batch_size)
+    print(f"📊 {EMBEDDING_MODEL_NAME}: {args.texts} texts, {args.queries} queries, batch size {args.batch_size}")
+    print(f"  {'torch':<11} load {load_s:5.1f}s  {bulk_ms:6.2f} ms/text  {query_ms:6.2f} ms/query  (reference)")
+
+    failed = []
+    for backend in args.backends:
+        try:
+            started = time.perf_counter()
+            encoder = create_encoder(EMBEDDING_MODEL_NAME, backend)
+            load_s = time.perf_counter() - started
+        except (ImportError, FileNotFoundError) as e:
+            print(f"  {backend:<11} skipped: {e}")
+            continue
+        embeddings, backend_bulk_ms, backend_query_ms = measure(encoder, texts, queries, args.batch_size)
+        parity = cosine_parity(expected, embeddings)
+        ok = parity.min() >= PARITY_MIN_COSINE[backend]
+        if not ok:
+            failed.append(backend)
+        print(
+            f"  {backend:<11} load {load_s:5.1f}s  {backend_bulk_ms:6.2f} ms/text  {backend_query_ms:6.2f} ms/query  "
+            f"({bulk_ms / backend_bulk_ms:.1f}x / {query_ms / backend_query_ms:.1f}x)  "
+            f"cosine min {parity.min():.5f} mean {parity.mean():.5f} {'✅' if ok else '❌'} >= {PARITY_MIN_COSINE[backend]}"
+        )
+
+    if failed:
+        print(f"❌ Parity below tolerance: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
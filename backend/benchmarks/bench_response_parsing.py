@@ -0,0 +1,64 @@
+"""
+Micro-benchmark: legacy text parsing cascade vs strict tool-input parsing
+
+    cd backend && python benchmarks/bench_response_parsing.py [--repeat 2000]
+
+Parses every response in response_corpus.json and reports the time per call
+and which fallback path each text response needed.
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.claude_service import ClaudeService  # noqa: E402
+
+CORPUS_PATH = Path(__file__).parent / "response_corpus.json"
+
+
+def time_per_call(fn, items, repeat):
+    """Mean microseconds per parse over the corpus, with parser logging silenced"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for item in items:
+                fn(item)
+        elapsed = time.perf_counter() - started
+    return elapsed / (repeat * len(items)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus = json.loads(CORPUS_PATH.read_text())
+    with contextlib.redirect_stdout(io.StringIO()):
+        service = ClaudeService("benchmark-key")
+
+    text_blocks = [[SimpleNamespace(type="text", text=item["text"])] for item in corpus["text_responses"]]
+    tool_blocks = [[SimpleNamespace(type="tool_use", input=item)] for item in corpus["tool_inputs"]]
+
+    print(f"📊 Parsing {len(text_blocks)} text and {len(tool_blocks)} tool responses x{args.repeat}")
+    for item, blocks in zip(corpus["text_responses"], text_blocks):
+        before = dict(service.parse_stats)
+        with contextlib.redirect_stdout(io.StringIO()):
+            service._parse_message_content(blocks)
+        path = next(name for name, count in service.parse_stats.items() if count > before[name])
+        per_call = time_per_call(service._parse_message_content, [blocks], args.repeat)
+        print(f"  {item['shape']:<20} -> {path:<18} {per_call:8.1f} µs")
+
+    legacy = time_per_call(service._parse_message_content, text_blocks, args.repeat)
+    strict = time_per_call(service._parse_message_content, tool_blocks, args.repeat)
+    print(f"✅ Legacy cascade: {legacy:.1f} µs/response")
+    print(f"✅ Strict tool input: {strict:.1f} µs/response ({legacy / strict:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
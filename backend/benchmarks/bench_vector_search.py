@@ -0,0 +1,64 @@
+"""
+Micro-benchmark: per-query rebuild of a list of embeddings vs the VectorStore matrix
+
+    cd backend && python benchmarks/bench_vector_search.py [--size 50000] [--dim 384]
+
+The list baseline mirrors the previous SearchService: stack the stored vectors
+and normalize them on every query (what cosine_similarity did), then argsort.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.vector_store import VectorStore, top_k_indices  # noqa: E402
+
+
+def list_baseline(query, embeddings, top_k):
+    matrix = np.vstack(embeddings)
+    matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+    scores = matrix @ (query / np.linalg.norm(query))
+    return np.argsort(scores)[-top_k:][::-1]
+
+
+def mean_ms(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embeddings = list(rng.standard_normal((args.size, args.dim)).astype(np.float32))
+    query = rng.standard_normal(args.dim).astype(np.float32)
+
+    store = VectorStore(dim=args.dim)
+    started = time.perf_counter()
+    for embedding in embeddings:
+        store.add(embedding)
+    print(f"📥 Appended {args.size} vectors one at a time in {time.perf_counter() - started:.2f}s")
+
+    expected = list_baseline(query, embeddings, args.top_k)
+    actual = top_k_indices(store.scores(query), args.top_k)
+    assert list(expected) == list(actual), "VectorStore ranking differs from the baseline"
+
+    baseline = mean_ms(lambda: list_baseline(query, embeddings, args.top_k), args.repeat)
+    matrix = mean_ms(lambda: top_k_indices(store.scores(query), args.top_k), args.repeat)
+    print(f"✅ List rebuild + argsort: {baseline:.1f} ms/query")
+    print(f"✅ VectorStore + argpartition: {matrix:.2f} ms/query ({baseline / matrix:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
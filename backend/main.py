@@ -2,29 +2,52 @@ from fastapi import FastAPI, File, UploadFile, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
-from typing import List, Optional
+from fastapi.encoders import jsonable_encoder
+from typing import List, Optional, Tuple, AsyncIterator
 import os
+import uuid
+import aiofiles
 import json
 import hashlib
 from datetime import datetime
 from pathlib import Path
 import asyncio
+import time
 from contextlib import asynccontextmanager
 
 from app.config import settings
 from app.services.claude_service import ClaudeService
-# Try to import the full ML search service, fallback to simple version
-try:
-    from app.services.search_service import SearchService
-    print("✅ Using full ML-powered search service")
-except ImportError as e:
-    print(f"⚠️  ML dependencies not available: {e}")
-    print("✅ Using lightweight text-based search service")
-    from app.services.simple_search_service import SimpleSearchService as SearchService
 from app.services.evaluation_service import EvaluationService
 from app.services.prompt_manager import PromptManager
+from app.services.job_queue import JobQueue
+from app.services.rate_limiter import get_rate_limiter
+from app.services.executors import get_executors
 from app.models import SearchQuery, SearchResult, ScreenshotMetadata
 
+_process_started = time.monotonic()
+# Startup phase -> seconds since main was imported
+_startup_phases: dict = {}
+
+def _record_startup_phase(phase: str):
+    _startup_phases[phase] = round(time.monotonic() - _process_started, 3)
+
+def _create_search_service():
+    """Create the search service without blocking startup on the embedding model
+
+    The ML search module is imported here rather than at module load; its model
+    and corpus warm up on a background thread while lexical search is served.
+    Without numpy/scipy (the Heroku slug) the lightweight text search is used.
+    """
+    try:
+        from app.services.search_service import SearchService
+    except ImportError as e:
+        print(f"⚠️  ML dependencies not available: {e}")
+        print("✅ Using lightweight text-based search service")
+        from app.services.simple_search_service import SimpleSearchService
+        return SimpleSearchService()
+    print("✅ Using full ML-powered search service, warming up in the background")
+    return SearchService(warm_up_in_background=True)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print(f"🔧 Initializing services...")
@@ -32,19 +55,23 @@ async def lifespan(app: FastAPI):
     print(f"🔑 API key length: {len(settings.ANTHROPIC_API_KEY) if settings.ANTHROPIC_API_KEY else 0}")
     
     try:
-        # Initialize Claude service
+        # Claude service sends the prompt the /prompts endpoints manage
+        app.state.prompt_manager = PromptManager()
         if settings.ANTHROPIC_API_KEY:
-            app.state.claude_service = ClaudeService(api_key=settings.ANTHROPIC_API_KEY)
+            app.state.claude_service = ClaudeService(
+                api_key=settings.ANTHROPIC_API_KEY, prompt_manager=app.state.prompt_manager
+            )
             print("✅ Claude service initialized successfully")
         else:
             app.state.claude_service = None
             print("❌ Claude service not initialized - no API key")
             
         # Initialize other services
-        app.state.search_service = SearchService()
+        app.state.search_service = _create_search_service()
         app.state.evaluation_service = EvaluationService()
-        app.state.prompt_manager = PromptManager()
+        app.state.job_queue = JobQueue()
         print("✅ All other services initialized")
+        _record_startup_phase("services_initialized")
         
     except Exception as e:
         print(f"❌ Warning: Failed to initialize some services: {e}")
@@ -54,11 +81,24 @@ async def lifespan(app: FastAPI):
         
         # Initialize fallback services
         app.state.claude_service = None
-        app.state.search_service = SearchService() if 'SearchService' in globals() else None
+        if getattr(app.state, "search_service", None) is None:
+            app.state.search_service = _create_search_service()
         app.state.evaluation_service = EvaluationService()
         app.state.prompt_manager = PromptManager()
+        app.state.job_queue = JobQueue()
+    
+    # Resume ingestion jobs interrupted by a restart
+    for job_id in app.state.job_queue.get_resumable_jobs():
+        print(f"🔁 Resuming ingestion job {job_id}")
+        _run_in_background(process_job(job_id))
+    _record_startup_phase("serving")
     yield
     
+    # Release the Claude connection pool and executor pools on shutdown
+    if getattr(app.state, "claude_service", None) is not None:
+        await app.state.claude_service.aclose()
+    get_executors().shutdown()
+    
 app = FastAPI(
     title="Visual Memory Search API",
     description="Search screenshots using natural language queries",
@@ -189,7 +229,7 @@ async def upload_screenshots(files: List[UploadFile] = File(...)):
     
     uploaded_files = []
     rejected_files = []
-    MAX_SIZE = 1024 * 1024  # 1MB
+    MAX_SIZE = settings.MAX_FILE_SIZE  # Large images are downsampled before analysis
     
     for file in files:
         # Check file type
@@ -197,24 +237,23 @@ async def upload_screenshots(files: List[UploadFile] = File(...)):
             rejected_files.append({"filename": file.filename, "reason": "Not an image file"})
             continue
         
-        # Read file content to check size
-        file_content = await file.read()
-        
-        # Check file size
-        if len(file_content) > MAX_SIZE:
+        # Reject on the declared size before copying anything
+        if file.size is not None and file.size > MAX_SIZE:
             rejected_files.append({
                 "filename": file.filename, 
-                "reason": f"File too large ({len(file_content) / 1024 / 1024:.1f}MB, max 1MB)"
+                "reason": f"File too large ({file.size / 1024 / 1024:.1f}MB, max {MAX_SIZE / 1024 / 1024:.0f}MB)"
             })
             continue
-            
-        file_hash = hashlib.md5(file_content).hexdigest()
-        file_extension = file.filename.split(".")[-1] if "." in file.filename else "png"
-        saved_filename = f"{file_hash}.{file_extension}"
-        file_path = UPLOAD_DIR / saved_filename
         
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        file_extension = file.filename.split(".")[-1] if "." in file.filename else "png"
+        try:
+            file_hash, saved_filename = await _save_upload_stream(_iter_upload_file(file), f".{file_extension}")
+        except FileTooLargeError as e:
+            rejected_files.append({
+                "filename": file.filename, 
+                "reason": f"File too large (over {e.size / 1024 / 1024:.1f}MB, max {MAX_SIZE / 1024 / 1024:.0f}MB)"
+            })
+            continue
             
         uploaded_files.append({
             "filename": file.filename,
@@ -222,12 +261,15 @@ async def upload_screenshots(files: List[UploadFile] = File(...)):
             "hash": file_hash
         })
     
+    job_id = None
     if uploaded_files:
-        asyncio.create_task(process_screenshots(uploaded_files))
+        job_id = app.state.job_queue.create_job("upload", uploaded_files)
+        _run_in_background(process_job(job_id))
     
     response = {
         "message": f"Uploaded {len(uploaded_files)} screenshots",
-        "files": uploaded_files
+        "files": uploaded_files,
+        "job_id": job_id
     }
     
     if rejected_files:
@@ -236,103 +278,539 @@ async def upload_screenshots(files: List[UploadFile] = File(...)):
     
     return response
 
-async def process_screenshots(files: List[dict]):
-    """Process screenshots with Claude API and evaluate quality"""
-    print(f"Starting processing of {len(files)} files...")
+class FileTooLargeError(Exception):
+    """Raised while streaming an upload as soon as it passes MAX_FILE_SIZE"""
+    def __init__(self, size: int):
+        super().__init__(f"Upload exceeded {settings.MAX_FILE_SIZE} bytes")
+        self.size = size
+
+async def _iter_upload_file(file: UploadFile) -> AsyncIterator[bytes]:
+    """Read an uploaded file in fixed-size chunks"""
+    while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+        yield chunk
+
+async def _iter_path(path: Path) -> AsyncIterator[bytes]:
+    """Read a file on disk in fixed-size chunks without blocking the event loop"""
+    async with aiofiles.open(path, "rb") as f:
+        while chunk := await f.read(settings.UPLOAD_CHUNK_SIZE):
+            yield chunk
+
+async def _save_upload_stream(chunks: AsyncIterator[bytes], extension: str) -> Tuple[str, str]:
+    """Stream chunks into UPLOAD_DIR while hashing, returning (file_hash, saved_filename)
+    
+    Data goes to a temporary file that is atomically renamed to its
+    content-addressed name, so memory stays constant per file and a partial
+    upload is never visible under a hash.
+    """
+    md5 = hashlib.md5()
+    size = 0
+    temp_path = UPLOAD_DIR / f"upload-{uuid.uuid4().hex}.part"
+    try:
+        async with aiofiles.open(temp_path, "wb") as out:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > settings.MAX_FILE_SIZE:
+                    raise FileTooLargeError(size)
+                md5.update(chunk)
+                await out.write(chunk)
+        
+        file_hash = md5.hexdigest()
+        saved_filename = f"{file_hash}{extension}"
+        os.replace(temp_path, UPLOAD_DIR / saved_filename)
+        return file_hash, saved_filename
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+# Strong references to fire-and-forget tasks so they are not garbage collected
+_background_tasks = set()
+
+def _run_in_background(coro):
+    """Schedule a coroutine without awaiting it"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+async def process_job(job_id: str):
+    """Process the unfinished files of a persisted ingestion job"""
+    job_queue = app.state.job_queue
+    job_queue.start_job(job_id)
+
+    files = []
+    for file_info in job_queue.get_pending_files(job_id):
+        if (UPLOAD_DIR / file_info["saved_as"]).exists():
+            files.append(file_info)
+        else:
+            job_queue.update_file_state(job_id, file_info["position"], "failed", "Upload no longer available")
+
+    if not files:
+        return
+    job = job_queue.get_job(job_id)
+    if job is not None and job["mode"] == "batch":
+        await process_screenshots_batch(files, job_id=job_id)
+    else:
+        await process_screenshots(files, job_id=job_id)
+
+def _set_file_state(job_id: Optional[str], file_info: dict, state: str, error: Optional[str] = None):
+    """Record a file state transition for jobs tracked in the job queue"""
+    if job_id is None:
+        return
+    try:
+        app.state.job_queue.update_file_state(job_id, file_info["position"], state, error)
+    except Exception as e:
+        print(f"❌ Failed to record state {state} for {file_info['filename']}: {e}")
+
+# Progress of each ingestion run, keyed by job id (or a run id for untracked runs), reported through /status
+_ingestion_runs: dict = {}
+# Finished runs kept for /status
+MAX_FINISHED_INGESTION_RUNS = 10
+
+def _start_ingestion_progress(job_id: Optional[str], total: int, in_progress: Optional[List[str]] = None) -> dict:
+    """Register the progress dict of a new run; concurrent runs never share counters"""
+    run_id = job_id or f"run-{uuid.uuid4().hex[:8]}"
+    finished = [key for key, run in _ingestion_runs.items() if run["finished_at"] is not None]
+    for key in finished[:max(0, len(finished) - MAX_FINISHED_INGESTION_RUNS + 1)]:
+        del _ingestion_runs[key]
+    progress = {
+        "job_id": job_id,
+        "total": total,
+        "completed": 0,
+        "failed": 0,
+        "in_progress": list(in_progress or []),
+        "started_at": datetime.now().isoformat(),
+        "finished_at": None,
+        "last_completed": None
+    }
+    _ingestion_runs[run_id] = progress
+    return progress
+
+def _discard_in_progress(progress: dict, filename: str):
+    try:
+        progress["in_progress"].remove(filename)
+    except ValueError:
+        pass
+
+def _is_job_cancelled(job_id: Optional[str]) -> bool:
+    return job_id is not None and app.state.job_queue.is_cancelled(job_id)
+
+async def process_screenshots(files: List[dict], job_id: Optional[str] = None):
+    """Process screenshots with Claude API and evaluate quality using a bounded worker pool
+
+    Up to settings.INGEST_MAX_WORKERS files are extracted and evaluated concurrently,
+    or groups of settings.CLAUDE_PACK_SIZE files per request when packing is enabled.
+    Index writes are applied in upload order, so the search index ends up exactly as
+    the sequential version would have built it. When a job_id is given, per-file
+    states are recorded in the job queue and a cancelled job stops taking new files.
+    """
+    total = len(files)
+    pack_size = max(1, settings.CLAUDE_PACK_SIZE)
+    worker_count = max(1, min(settings.INGEST_MAX_WORKERS, -(-total // pack_size)))
+    print(f"Starting processing of {total} files with {worker_count} workers...")
+
+    progress = _start_ingestion_progress(job_id, total)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for position, file_info in enumerate(files):
+        queue.put_nowait((position, file_info))
+
+    # Results waiting for their turn to be indexed, keyed by upload position:
+    # (file_info, metadata, persist, embedding, worker_id, started)
+    ready = {}
+    next_to_index = 0
+    index_lock = asyncio.Lock()
+
+    async def flush_ready() -> bool:
+        """Index the finished prefix, returning False if the job was cancelled instead
+
+        Files only reach a final state once they are in the index; results parked
+        behind an earlier, unfinished position stay "evaluating" so a resumed job
+        picks them up again.
+        """
+        nonlocal next_to_index
+        async with index_lock:
+            # Index the whole run of consecutive finished files in one call
+            run = []
+            while next_to_index in ready:
+                run.append(ready.pop(next_to_index))
+                next_to_index += 1
+            # A cleared session cancels the job; its in-flight results must not reach the new index
+            if _is_job_cancelled(job_id):
+                return False
+            await _index_metadata_batch([(metadata, persist, embedding) for _, metadata, persist, embedding, _, _ in run])
+
+            for file_info, metadata, persist, _, worker_id, started in run:
+                if persist:
+                    _set_file_state(job_id, file_info, "indexed")
+                    progress["completed"] += 1
+                else:
+                    _set_file_state(job_id, file_info, "failed", metadata.visual_description)
+                    progress["failed"] += 1
+                progress["last_completed"] = file_info["filename"]
+                done = progress["completed"] + progress["failed"]
+                elapsed = (datetime.now() - started).total_seconds()
+                status = "✅" if persist else "⚠️ "
+                print(f"{status} [{done}/{total}] worker {worker_id} finished {file_info['filename']} in {elapsed:.1f}s")
+            return True
+
+    async def worker(worker_id: int):
+        while True:
+            # Each worker takes up to CLAUDE_PACK_SIZE files per extraction request
+            group = []
+            while len(group) < pack_size:
+                try:
+                    group.append(queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            if not group:
+                return
+            if _is_job_cancelled(job_id):
+                print(f"⏹️  Job {job_id} cancelled, worker {worker_id} stopping")
+                return
+
+            started = datetime.now()
+            group_files = [file_info for _, file_info in group]
+            for file_info in group_files:
+                progress["in_progress"].append(file_info["filename"])
+                _set_file_state(job_id, file_info, "extracting")
+            try:
+                if len(group_files) == 1:
+                    extracted = [await _extract_and_evaluate(group_files[0], job_id)]
+                else:
+                    extracted = await _extract_and_evaluate_packed(group_files, job_id)
+                # Embed in parallel across workers; only the index insert is ordered
+                embeddings = await _embed_batch_for_index([metadata for metadata, _ in extracted])
+            finally:
+                for file_info in group_files:
+                    _discard_in_progress(progress, file_info["filename"])
+
+            for (position, file_info), (metadata, persist), embedding in zip(group, extracted, embeddings):
+                ready[position] = (file_info, metadata, persist, embedding, worker_id, started)
+            if not await flush_ready():
+                print(f"⏹️  Job {job_id} cancelled, worker {worker_id} dropping {len(group)} results")
+                return
+
+    try:
+        await asyncio.gather(*(worker(worker_id) for worker_id in range(worker_count)))
+    finally:
+        progress["finished_at"] = datetime.now().isoformat()
+    print(f"Finished processing {total} files: {progress['completed']} indexed, {progress['failed']} failed")
+
+async def _extract_and_evaluate(file_info: dict, job_id: Optional[str] = None) -> Tuple[ScreenshotMetadata, bool]:
+    """Run Claude extraction and quality evaluation for one file
+
+    Returns the metadata to index and whether it should be persisted to PROCESSED_DIR
+    (minimal metadata for failed files is indexed but not persisted).
+    """
     claude_service = app.state.claude_service
-    search_service = app.state.search_service
+
+    print(f"Processing file: {file_info['filename']}")
+    file_path = UPLOAD_DIR / file_info["saved_as"]
+
+    try:
+        print(f"Calling Claude API for {file_path}")
+        # Add asyncio timeout to prevent hanging
+        ocr_text, visual_description = await asyncio.wait_for(
+            claude_service.analyze_screenshot(str(file_path), file_hash=file_info["hash"]),
+            timeout=settings.INGEST_FILE_TIMEOUT
+        )
+        print(f"Claude API response: OCR length={len(ocr_text) if ocr_text else 0}, Visual length={len(visual_description) if visual_description else 0}")
+    except asyncio.TimeoutError:
+        print(f"❌ Timeout processing {file_info['filename']} - using fallback description")
+        ocr_text = ""
+        visual_description = f"Image uploaded: {file_info['filename']}. Processing timed out, basic indexing applied."
+    except Exception as e:
+        print(f"❌ Error processing {file_info['filename']}: {str(e)}")
+        return _minimal_metadata(file_info, e), False
+
+    return await _evaluate_extraction(file_info, ocr_text, visual_description, job_id)
+
+async def _extract_and_evaluate_packed(files: List[dict], job_id: Optional[str] = None) -> List[Tuple[ScreenshotMetadata, bool]]:
+    """Extract several files with one packed Claude request, then evaluate each
+
+    Files missing from the packed result (e.g. after a timeout) go through
+    _extract_and_evaluate individually.
+    """
+    claude_service = app.state.claude_service
+    image_paths = [str(UPLOAD_DIR / file_info["saved_as"]) for file_info in files]
+    file_hashes = {image_path: file_info["hash"] for file_info, image_path in zip(files, image_paths)}
+
+    try:
+        extractions = await asyncio.wait_for(
+            claude_service.analyze_screenshots_packed(image_paths, file_hashes=file_hashes),
+            timeout=settings.INGEST_FILE_TIMEOUT * len(files)
+        )
+    except Exception as e:
+        print(f"❌ Packed extraction failed for {len(files)} files, processing individually: {e!r}")
+        extractions = {}
+
+    results = []
+    for file_info, image_path in zip(files, image_paths):
+        if image_path in extractions:
+            ocr_text, visual_description = extractions[image_path]
+            results.append(await _evaluate_extraction(file_info, ocr_text, visual_description, job_id))
+        else:
+            results.append(await _extract_and_evaluate(file_info, job_id))
+    return results
+
+async def _evaluate_extraction(file_info: dict, ocr_text: str, visual_description: str, job_id: Optional[str] = None) -> Tuple[ScreenshotMetadata, bool]:
+    """Evaluate an extraction and build the metadata to index"""
     evaluation_service = app.state.evaluation_service
     prompt_manager = app.state.prompt_manager
-    
+
+    # Provide fallback descriptions for empty results
+    if not ocr_text and not visual_description:
+        print(f"Warning: No extraction results for {file_info['filename']}")
+        ocr_text = ""
+        visual_description = f"Image uploaded: {file_info['filename']}. Analysis could not be completed."
+    elif not visual_description:
+        visual_description = f"Image file: {file_info['filename']}"
+
+    try:
+        # Evaluate the extraction quality
+        _set_file_state(job_id, file_info, "evaluating")
+        print("Starting evaluation...")
+        print(f"Debug: Evaluating with OCR='{ocr_text[:100]}...', Visual='{visual_description[:100]}...'")
+        # Rubric scoring is CPU-bound, so it runs in the executor process pool
+        evaluation = await get_executors().run_cpu(evaluation_service.evaluate_extraction, ocr_text, visual_description)
+        print(f"Evaluation completed: {evaluation.get('quality_level', 'unknown')}")
+
+        # Track prompt performance
+        prompt_manager.add_quality_score(
+            "ocr_and_visual",
+            evaluation["confidence_score"],
+            {"filename": file_info["filename"], "file_hash": file_info["hash"]}
+        )
+
+        metadata = ScreenshotMetadata(
+            filename=file_info["filename"],
+            file_hash=file_info["hash"],
+            ocr_text=ocr_text,
+            visual_description=visual_description,
+            processed_at=datetime.now(),
+            evaluation=evaluation
+        )
+        return metadata, True
+
+    except Exception as e:
+        print(f"❌ Error processing {file_info['filename']}: {str(e)}")
+        return _minimal_metadata(file_info, e), False
+
+def _minimal_metadata(file_info: dict, error: Exception) -> ScreenshotMetadata:
+    """Minimal metadata so a failed file is still searchable"""
+    return ScreenshotMetadata(
+        filename=file_info["filename"],
+        file_hash=file_info["hash"],
+        ocr_text="",
+        visual_description=f"Image uploaded: {file_info['filename']}. Processing failed: {str(error)[:100]}",
+        processed_at=datetime.utcnow(),
+        evaluation={"confidence_score": 0.1, "quality_level": "Failed"}
+    )
+
+async def process_screenshots_batch(files: List[dict], job_id: Optional[str] = None):
+    """Process a large set of screenshots through one Message Batch
+
+    Extraction is submitted as a single batch; evaluation and indexing then run in
+    upload order exactly as in process_screenshots, embedding and indexing
+    settings.EMBEDDING_BATCH_SIZE files at a time.
+    """
+    total = len(files)
+    print(f"Starting batch processing of {total} files...")
+
+    progress = _start_ingestion_progress(job_id, total, [file_info["filename"] for file_info in files])
+    try:
+        await _process_batch_extractions(files, job_id, progress)
+    finally:
+        progress["finished_at"] = datetime.now().isoformat()
+    print(f"Finished batch processing {total} files: {progress['completed']} indexed, {progress['failed']} failed")
+
+async def _process_batch_extractions(files: List[dict], job_id: Optional[str], progress: dict):
+    """Submit the batch, then evaluate, embed and index its results chunk by chunk"""
+    claude_service = app.state.claude_service
+    total = len(files)
+
     for file_info in files:
-        print(f"Processing file: {file_info['filename']}")
-        file_path = UPLOAD_DIR / file_info["saved_as"]
-        
-        try:
-            print(f"Calling Claude API for {file_path}")
-            # Add asyncio timeout to prevent hanging
-            ocr_text, visual_description = await asyncio.wait_for(
-                claude_service.analyze_screenshot(str(file_path)),
-                timeout=25.0  # 25 second timeout to stay under Heroku's 30s limit
-            )
-            print(f"Claude API response: OCR length={len(ocr_text) if ocr_text else 0}, Visual length={len(visual_description) if visual_description else 0}")
-            
-            # Provide fallback descriptions for empty results
-            if not ocr_text and not visual_description:
-                print(f"Warning: No extraction results for {file_info['filename']}")
-                ocr_text = ""
-                visual_description = f"Image uploaded: {file_info['filename']}. Analysis could not be completed."
-            elif not visual_description:
-                visual_description = f"Image file: {file_info['filename']}"
-                
-        except asyncio.TimeoutError:
-            print(f"❌ Timeout processing {file_info['filename']} - using fallback description")
-            ocr_text = ""
-            visual_description = f"Image uploaded: {file_info['filename']}. Processing timed out, basic indexing applied."
-            
-        # Evaluate the extraction quality (moved outside try block)
-        try:
-            print("Starting evaluation...")
-            print(f"Debug: Evaluating with OCR='{ocr_text[:100]}...', Visual='{visual_description[:100]}...'")
-            evaluation = evaluation_service.evaluate_extraction(ocr_text, visual_description)
-            print(f"Evaluation completed: {evaluation.get('quality_level', 'unknown')}")
-            
-            # Track prompt performance
-            prompt_manager.add_quality_score(
-                "ocr_and_visual", 
-                evaluation["confidence_score"],
-                {"filename": file_info["filename"], "file_hash": file_info["hash"]}
-            )
-            
-            metadata = ScreenshotMetadata(
-                filename=file_info["filename"],
-                file_hash=file_info["hash"],
-                ocr_text=ocr_text,
-                visual_description=visual_description,
-                processed_at=datetime.now(),
-                evaluation=evaluation
-            )
-            
-            metadata_path = PROCESSED_DIR / f"{file_info['hash']}.json"
-            with open(metadata_path, "w") as f:
-                json.dump(metadata.dict(), f, default=str)
-            
-            search_service.index_screenshot(metadata)
-            
-        except Exception as e:
-            print(f"❌ Error processing {file_info['filename']}: {str(e)}")
-            # Still index with minimal information for search
+        _set_file_state(job_id, file_info, "extracting")
+
+    image_paths = [str(UPLOAD_DIR / file_info["saved_as"]) for file_info in files]
+    file_hashes = {image_path: file_info["hash"] for file_info, image_path in zip(files, image_paths)}
+    try:
+        extractions = await claude_service.analyze_screenshots_batch(image_paths, file_hashes=file_hashes)
+    except Exception as e:
+        print(f"❌ Batch extraction failed: {e}")
+        extractions = {}
+
+    chunk_size = max(1, settings.EMBEDDING_BATCH_SIZE)
+    for chunk_start in range(0, total, chunk_size):
+        if _is_job_cancelled(job_id):
+            print(f"⏹️  Job {job_id} cancelled, stopping batch indexing")
+            break
+
+        chunk = list(zip(files, image_paths))[chunk_start:chunk_start + chunk_size]
+        evaluated = []
+        for file_info, image_path in chunk:
+            if image_path in extractions:
+                ocr_text, visual_description = extractions[image_path]
+                evaluated.append(await _evaluate_extraction(file_info, ocr_text, visual_description, job_id))
+            else:
+                evaluated.append((_minimal_metadata(file_info, Exception("No batch result")), False))
+
+        embeddings = await _embed_batch_for_index([metadata for metadata, _ in evaluated])
+        # Evaluation and embedding yield to other requests; re-check right before the insert
+        if _is_job_cancelled(job_id):
+            print(f"⏹️  Job {job_id} cancelled, stopping batch indexing")
+            break
+        await _index_metadata_batch([
+            (metadata, persist, embedding) for (metadata, persist), embedding in zip(evaluated, embeddings)
+        ])
+
+        for (file_info, _), (metadata, persist) in zip(chunk, evaluated):
+            _discard_in_progress(progress, file_info["filename"])
+            if persist:
+                progress["completed"] += 1
+                _set_file_state(job_id, file_info, "indexed")
+            else:
+                progress["failed"] += 1
+                _set_file_state(job_id, file_info, "failed", metadata.visual_description)
+            progress["last_completed"] = file_info["filename"]
+
+async def _embed_batch_for_index(metadatas: List[ScreenshotMetadata]) -> list:
+    """Compute search embeddings for several screenshots off the event loop
+
+    By default the search service's own model encodes in the I/O thread pool
+    (torch and onnxruntime release the GIL), so the model is held in memory
+    once. With EMBEDDING_IN_PROCESS_POOL the CPU pool encodes instead, at the
+    cost of one model copy per worker process.
+
+    Returns one embedding per screenshot, or Nones when the search service has no
+    embedding model (lightweight search), is still warming up, or encoding
+    fails, in which case indexing encodes (or warm-up embeds) the rows itself.
+    """
+    search_service = app.state.search_service
+    model_name = getattr(search_service, "model_name", None)
+    if not metadatas or not isinstance(model_name, str):
+        return [None] * len(metadatas)
+    if isinstance(getattr(search_service, "model_error", None), str):
+        # The model failed to load, the index is lexical-only
+        return [None] * len(metadatas)
+    try:
+        from app.services.search_service import encode_in_batches, encode_texts
+        texts = [search_service.get_index_text(metadata) for metadata in metadatas]
+        if settings.EMBEDDING_IN_PROCESS_POOL:
+            return list(await get_executors().run_cpu(encode_texts, model_name, texts))
+        is_ready = getattr(search_service, "is_ready", None)
+        if not (callable(is_ready) and is_ready() is True):
+            return [None] * len(metadatas)
+        return list(await get_executors().run_io(encode_in_batches, search_service.model, texts))
+    except Exception as e:
+        print(f"⚠️  Embedding in executor failed for {len(metadatas)} files, encoding inline: {e}")
+        return [None] * len(metadatas)
+
+def _write_metadata(metadata_path: Path, metadata: ScreenshotMetadata):
+    with open(metadata_path, "w") as f:
+        json.dump(metadata.dict(), f, default=str)
+
+async def _index_metadata_batch(items: List[Tuple[ScreenshotMetadata, bool, Optional[object]]]):
+    """Persist processed metadata and add (metadata, persist, embedding) items to the search index in one call"""
+    if not items:
+        return
+    search_service = app.state.search_service
+
+    for metadata, persist, _ in items:
+        if persist:
             try:
-                minimal_metadata = ScreenshotMetadata(
-                    filename=file_info["filename"],
-                    file_hash=file_info["hash"],
-                    ocr_text="",
-                    visual_description=f"Image uploaded: {file_info['filename']}. Processing failed: {str(e)[:100]}",
-                    processed_at=datetime.utcnow(),
-                    evaluation={"confidence_score": 0.1, "quality_level": "Failed"}
-                )
-                search_service.index_screenshot(minimal_metadata)
-                print(f"✅ Indexed {file_info['filename']} with minimal metadata")
-            except Exception as index_error:
-                print(f"❌ Failed to index {file_info['filename']}: {index_error}")
+                metadata_path = PROCESSED_DIR / f"{metadata.file_hash}.json"
+                await get_executors().run_io(_write_metadata, metadata_path, metadata)
+            except Exception as write_error:
+                print(f"❌ Failed to persist {metadata.filename}: {write_error}")
+
+    try:
+        search_service.index_screenshots(
+            [metadata for metadata, _, _ in items],
+            [embedding for _, _, embedding in items]
+        )
+        for metadata, persist, _ in items:
+            if not persist:
+                print(f"✅ Indexed {metadata.filename} with minimal metadata")
+    except Exception as index_error:
+        print(f"❌ Failed to index {len(items)} screenshots: {index_error}")
+    _schedule_index_compaction()
+
+def _schedule_index_compaction():
+    """Compact the search index in the background once enough rows are tombstoned"""
+    needs_compaction = getattr(app.state.search_service, "needs_compaction", None)
+    if callable(needs_compaction) and needs_compaction() is True:
+        _run_in_background(app.state.search_service.compact_in_background())
+
+@app.delete("/screenshots/{file_hash}")
+async def delete_screenshot(file_hash: str):
+    """Remove a screenshot from the search index along with its upload and metadata files"""
+    removed = app.state.search_service.remove(file_hash)
+    deleted_files = []
+    upload_paths = [UPLOAD_DIR / f"{file_hash}{ext}" for ext in ['.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp']]
+    for path in [PROCESSED_DIR / f"{file_hash}.json", *upload_paths]:
+        try:
+            path.unlink()
+            deleted_files.append(path.name)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing {path}: {e}")
+    if not removed and not deleted_files:
+        raise HTTPException(status_code=404, detail=f"Screenshot not found for hash: {file_hash}")
+    _schedule_index_compaction()
+    return {"file_hash": file_hash, "removed_from_index": removed, "deleted_files": deleted_files}
 
 @app.post("/search", response_model=List[SearchResult])
 async def search_screenshots(query: SearchQuery):
     """Search through processed screenshots"""
     search_service = app.state.search_service
     
-    # Different limits based on query type:
+    # Default limits based on query type:
     # - Empty query (show all): return ALL results (no limit)
     # - Search query: return top 5 results
-    if not query.query.strip():
+    # An explicit limit pages through either kind of query
+    if query.limit is not None:
+        top_k = query.limit
+    elif not query.query.strip():
         # Show all results - use a high number to effectively remove limit
         top_k = 1000  # Effectively unlimited for "show all"
     else:
         # Search results - limit to top 5
         top_k = 5
     
-    results = search_service.search(query.query, top_k=top_k)
-    return results
+    results = search_service.search(query.query, top_k=top_k, offset=query.offset)
+    if query.fields is None and not query.snippets:
+        return results
+    return JSONResponse(content=jsonable_encoder(_project_results(query, results)))
+
+# Fields kept in snippet mode when no projection is given: everything but the full texts and rubric
+SNIPPET_MODE_FIELDS = {"filename", "file_hash", "score", "confidence_score", "processed_at", "match_type"}
+
+def _project_results(query: SearchQuery, results: List[SearchResult]) -> List[dict]:
+    """Keep the requested fields of each result and attach snippets in snippet mode"""
+    if query.fields is not None:
+        fields = set(query.fields) | {"file_hash"}
+    else:
+        fields = SNIPPET_MODE_FIELDS if query.snippets else set(SearchResult.model_fields)
+    projected = [result.dict(include=fields) for result in results]
+    if query.snippets:
+        snippets = app.state.search_service.snippets(query.query, [result.file_hash for result in results])
+        for item, result in zip(projected, results):
+            item["snippets"] = snippets.get(result.file_hash)
+    return projected
+
+@app.get("/screenshots/{file_hash}")
+async def get_screenshot(file_hash: str):
+    """Full metadata of one screenshot, for results fetched with snippets or a projection"""
+    metadata = app.state.search_service.get_screenshot(file_hash)
+    if metadata is None:
+        metadata_path = PROCESSED_DIR / f"{file_hash}.json"
+        if not metadata_path.exists():
+            raise HTTPException(status_code=404, detail=f"Screenshot not found for hash: {file_hash}")
+        with open(metadata_path) as f:
+            metadata = ScreenshotMetadata(**json.load(f))
+    return metadata.dict(exclude={"embedding"})
 
 @app.get("/status")
 async def get_status():
@@ -350,7 +828,16 @@ async def get_status():
             "processing_rate": f"{processed_count}/{upload_count}" if upload_count > 0 else "0/0",
             "indexed_screenshots": indexed_count,
             "api_key_configured": bool(settings.ANTHROPIC_API_KEY),
-            "search_service": "available" if search_service else "unavailable"
+            "search_service": "available" if search_service else "unavailable",
+            "ingestion": _ingestion_runs,
+            "extraction_cache": _get_extraction_cache_stats(),
+            "claude_usage": _get_claude_usage_stats(),
+            "rate_limiter": get_rate_limiter().get_stats(),
+            "executors": get_executors().get_stats(),
+            "ann_index": _get_ann_index_stats(),
+            "query_cache": _get_query_cache_stats(),
+            "search_readiness": _get_search_readiness(),
+            "startup_phases": _startup_phases
         }
     except Exception as e:
         return {
@@ -360,6 +847,47 @@ async def get_status():
             "api_key_configured": bool(settings.ANTHROPIC_API_KEY)
         }
 
+@app.get("/ready")
+async def get_ready():
+    """Readiness probe: 503 while the embedding model warms up, 200 once search is fully available
+
+    A search service without an embedding model (lightweight, or one whose model
+    failed to load) is ready in lexical mode.
+    """
+    readiness = _get_search_readiness()
+    warming = readiness is not None and not readiness["ready"] and not readiness.get("error")
+    return JSONResponse(
+        status_code=503 if warming else 200,
+        content={"ready": not warming, "search": readiness, "startup_phases": _startup_phases}
+    )
+
+def _get_search_readiness() -> Optional[dict]:
+    """Get search mode and warm-up phases if the search service loads a model"""
+    get_readiness = getattr(getattr(app.state, "search_service", None), "get_readiness", None)
+    readiness = get_readiness() if callable(get_readiness) else None
+    return readiness if isinstance(readiness, dict) else None
+
+def _get_ann_index_stats() -> Optional[dict]:
+    """Get nearest-neighbour index settings if the search service has one"""
+    ann_index = getattr(app.state.search_service, "ann_index", None)
+    return ann_index.get_stats() if ann_index is not None else None
+
+def _get_query_cache_stats() -> Optional[dict]:
+    """Get query embedding cache counters if the search service has one"""
+    query_cache = getattr(app.state.search_service, "query_cache", None)
+    return query_cache.get_stats() if query_cache is not None else None
+
+def _get_extraction_cache_stats() -> Optional[dict]:
+    """Get extraction cache counters if the Claude service has a cache"""
+    claude_service = getattr(app.state, "claude_service", None)
+    extraction_cache = getattr(claude_service, "extraction_cache", None)
+    return extraction_cache.get_stats() if extraction_cache is not None else None
+
+def _get_claude_usage_stats() -> Optional[dict]:
+    """Get Claude token usage, including prompt cache reads and writes"""
+    claude_service = getattr(app.state, "claude_service", None)
+    return claude_service.get_usage_stats() if claude_service is not None else None
+
 def clear_previous_session():
     """Clear all previous uploads and processed files"""
     import shutil
@@ -381,10 +909,20 @@ def clear_previous_session():
     
     # Clear search service index
     app.state.search_service.clear_index()
+    
+    # Jobs from the previous session reference uploads that no longer exist
+    job_queue = getattr(app.state, "job_queue", None)
+    if job_queue is not None:
+        job_queue.cancel_unfinished_jobs()
 
 @app.post("/process-folder")
-async def process_folder(folder_path: str = Form(...)):
-    """Process all images in a folder"""
+async def process_folder(folder_path: str = Form(...), batch: Optional[bool] = Form(None)):
+    """Process all images in a folder
+
+    batch=true extracts through the Message Batches API (cheaper, but results can
+    take up to CLAUDE_BATCH_TIMEOUT); without it CLAUDE_BATCH_ENABLED decides for
+    folders of at least CLAUDE_BATCH_MIN_FILES files.
+    """
     # Clear previous uploads and processed files for new session
     clear_previous_session()
     folder = Path(folder_path)
@@ -395,26 +933,28 @@ async def process_folder(folder_path: str = Form(...)):
     image_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp'}
     image_files = []
     rejected_files = []
-    MAX_SIZE = 1024 * 1024  # 1MB
+    MAX_SIZE = settings.MAX_FILE_SIZE  # Large images are downsampled before analysis
     
     for file_path in folder.iterdir():
         if file_path.suffix.lower() in image_extensions:
-            file_content = file_path.read_bytes()
-            
             # Check file size
-            if len(file_content) > MAX_SIZE:
+            file_size = file_path.stat().st_size
+            if file_size > MAX_SIZE:
                 rejected_files.append({
                     "filename": file_path.name, 
-                    "reason": f"File too large ({len(file_content) / 1024 / 1024:.1f}MB, max 1MB)"
+                    "reason": f"File too large ({file_size / 1024 / 1024:.1f}MB, max {MAX_SIZE / 1024 / 1024:.0f}MB)"
                 })
                 continue
             
-            file_hash = hashlib.md5(file_content).hexdigest()
-            saved_filename = f"{file_hash}{file_path.suffix}"
-            dest_path = UPLOAD_DIR / saved_filename
-            
-            with open(dest_path, "wb") as f:
-                f.write(file_content)
+            try:
+                file_hash, saved_filename = await _save_upload_stream(_iter_path(file_path), file_path.suffix)
+            except FileTooLargeError as e:
+                # File grew after the size check
+                rejected_files.append({
+                    "filename": file_path.name, 
+                    "reason": f"File too large (over {e.size / 1024 / 1024:.1f}MB, max {MAX_SIZE / 1024 / 1024:.0f}MB)"
+                })
+                continue
             
             image_files.append({
                 "filename": file_path.name,
@@ -425,13 +965,26 @@ async def process_folder(folder_path: str = Form(...)):
     if not image_files and not rejected_files:
         raise HTTPException(status_code=400, detail="No image files found in the specified folder")
     
+    # Message Batches are opt-in, per request or through the configured default
+    if batch is None:
+        batch = settings.CLAUDE_BATCH_ENABLED and len(image_files) >= settings.CLAUDE_BATCH_MIN_FILES
+    use_batch = batch and app.state.claude_service is not None and bool(image_files)
+    
+    job_id = None
     if image_files:
-        asyncio.create_task(process_screenshots(image_files))
+        job_id = app.state.job_queue.create_job(
+            f"folder:{folder}",
+            image_files,
+            mode="batch" if use_batch else "interactive"
+        )
+        _run_in_background(process_job(job_id))
     
     response = {
         "message": f"Processing {len(image_files)} images from folder",
         "files": image_files,
-        "folder_path": str(folder)
+        "folder_path": str(folder),
+        "job_id": job_id,
+        "extraction_mode": "batch" if use_batch else "interactive"
     }
     
     if rejected_files:
@@ -440,6 +993,14 @@ async def process_folder(folder_path: str = Form(...)):
     
     return response
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get ingestion job progress with per-file states, throughput and ETA"""
+    job = app.state.job_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
 @app.get("/prompts/current")
 async def get_current_prompt():
     """Get the current extraction prompt"""
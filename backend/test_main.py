@@ -22,19 +22,22 @@ except ImportError:
     from app.services.simple_search_service import SimpleSearchService as SearchService
 from app.services.evaluation_service import EvaluationService
 from app.services.prompt_manager import PromptManager
+from app.services.job_queue import JobQueue
 from app.config import settings
 
 # Initialize app state for testing
 def setup_app_state():
     """Initialize app state for testing"""
+    if not hasattr(app.state, 'prompt_manager'):
+        app.state.prompt_manager = PromptManager()
     if not hasattr(app.state, 'claude_service'):
-        app.state.claude_service = ClaudeService(api_key=settings.ANTHROPIC_API_KEY)
+        app.state.claude_service = ClaudeService(api_key=settings.ANTHROPIC_API_KEY, prompt_manager=app.state.prompt_manager)
     if not hasattr(app.state, 'search_service'):
         app.state.search_service = SearchService()
     if not hasattr(app.state, 'evaluation_service'):
         app.state.evaluation_service = EvaluationService()
-    if not hasattr(app.state, 'prompt_manager'):
-        app.state.prompt_manager = PromptManager()
+    if not hasattr(app.state, 'job_queue'):
+        app.state.job_queue = JobQueue()
 
 # Test client with app state setup
 setup_app_state()
@@ -62,11 +65,11 @@ def sample_image_bytes():
 
 @pytest.fixture
 def large_image_bytes():
-    """Create a large image over 1MB for testing"""
+    """Create a large image over the 10MB upload limit for testing"""
     import numpy as np
     # Create a large image with random data to prevent compression
-    # 1200x1200 with random RGB data should be well over 1MB
-    width, height = 1200, 1200
+    # 2000x2000 with random RGB data should be well over 10MB
+    width, height = 2000, 2000
     
     # Create random image data
     np.random.seed(42)  # For reproducible tests
@@ -179,6 +182,37 @@ class TestFileUpload:
         response = client.post("/upload-screenshots", files={})
         assert response.status_code == 422  # Validation error
 
+    def test_streamed_upload_is_content_addressed(self, monkeypatch, tmp_path, sample_image_bytes):
+        """Uploads are hashed while streaming and renamed to their md5 name"""
+        import main
+        monkeypatch.setattr(main, "UPLOAD_DIR", tmp_path)
+        monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 64)
+
+        response = client.post("/upload-screenshots", files={"files": ("test.png", sample_image_bytes, "image/png")})
+        assert response.status_code == 200
+
+        file_hash = hashlib.md5(sample_image_bytes).hexdigest()
+        assert response.json()["files"][0]["hash"] == file_hash
+        assert (tmp_path / f"{file_hash}.png").read_bytes() == sample_image_bytes
+        assert not list(tmp_path.glob("*.part"))
+
+    def test_stream_rejected_once_limit_is_passed(self, monkeypatch, tmp_path):
+        """Streaming stops at the first chunk past MAX_FILE_SIZE and leaves no temp file"""
+        import main
+        monkeypatch.setattr(main, "UPLOAD_DIR", tmp_path)
+        monkeypatch.setattr(settings, "MAX_FILE_SIZE", 100)
+        consumed = []
+
+        async def chunks():
+            for i in range(10):
+                consumed.append(i)
+                yield b"x" * 40
+
+        with pytest.raises(main.FileTooLargeError):
+            asyncio.run(main._save_upload_stream(chunks(), ".png"))
+        assert len(consumed) == 3
+        assert not list(tmp_path.iterdir())
+
 class TestFolderProcessing:
     """Test folder processing functionality"""
     
@@ -335,6 +369,271 @@ Be thorough and accurate. Return only valid JSON.'''
         finally:
             Path(temp_path).unlink()
 
+    def test_analyze_screenshot_does_not_block_event_loop(self, sample_image_bytes):
+        """Test concurrent analyses overlap instead of serializing on the event loop"""
+        service = ClaudeService("test-api-key")
+        service.extraction_cache = None
+
+        async def slow_create(**kwargs):
+            await asyncio.sleep(0.2)
+            response = Mock()
+            response.content = [Mock(text='{"extracted_text": "Hello", "visual_description": "A page"}')]
+            return response
+
+        service.client.beta.prompt_caching.messages.create = slow_create
+
+        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as f:
+            f.write(sample_image_bytes)
+            temp_path = f.name
+
+        async def run_concurrently():
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            results = await asyncio.gather(*(service.analyze_screenshot(temp_path) for _ in range(4)))
+            elapsed = loop.time() - started
+            await service.aclose()
+            return results, elapsed
+
+        try:
+            results, elapsed = asyncio.run(run_concurrently())
+            assert all(result == ("Hello", "A page") for result in results)
+            assert elapsed < 0.6
+        finally:
+            Path(temp_path).unlink()
+
+class TestRateLimiter:
+    """Test the shared adaptive rate limiter"""
+
+    def test_rate_limit_pauses_and_halves_concurrency(self):
+        """A 429 halves the concurrency limit and pauses callers for retry-after"""
+        from app.services.rate_limiter import AdaptiveRateLimiter
+        limiter = AdaptiveRateLimiter(requests_per_minute=600, max_concurrency=8)
+        limiter.on_rate_limited(retry_after=0.3)
+        assert limiter.get_stats()["concurrency_limit"] == 4
+
+        async def timed_acquire():
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            async with limiter.slot():
+                return loop.time() - started
+
+        assert asyncio.run(timed_acquire()) >= 0.25
+        for _ in range(40):
+            limiter.on_success()
+        assert limiter.get_stats()["concurrency_limit"] == 8
+
+    def test_observes_rate_limit_headers(self):
+        """anthropic-ratelimit-* headers set the request rate and remaining budget"""
+        from app.services.rate_limiter import AdaptiveRateLimiter
+        limiter = AdaptiveRateLimiter(requests_per_minute=50, max_concurrency=8)
+        limiter.observe_headers({
+            "anthropic-ratelimit-requests-limit": "1000",
+            "anthropic-ratelimit-requests-remaining": "3"
+        })
+        stats = limiter.get_stats()
+        assert stats["requests_per_minute"] == 1000
+        assert stats["available_tokens"] <= 3.1
+
+    def test_claude_service_retries_after_429(self, sample_image_bytes):
+        """RateLimitError retry-after is honoured through the shared limiter"""
+        import httpx
+        import anthropic
+        from app.services.rate_limiter import AdaptiveRateLimiter
+        service = ClaudeService("test-api-key")
+        service.extraction_cache = None
+        service.rate_limiter = AdaptiveRateLimiter(requests_per_minute=600, max_concurrency=4)
+
+        calls = []
+
+        async def create(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                response = httpx.Response(
+                    429,
+                    headers={"retry-after": "0.2"},
+                    request=httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+                )
+                raise anthropic.RateLimitError("rate limited", response=response, body=None)
+            response = Mock()
+            response.content = [Mock(text='{"extracted_text": "Hello", "visual_description": "A page"}')]
+            return response
+
+        service.client.beta.prompt_caching.messages.create = create
+
+        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as f:
+            f.write(sample_image_bytes)
+            temp_path = f.name
+
+        try:
+            result = asyncio.run(service.analyze_screenshot(temp_path))
+            assert result == ("Hello", "A page")
+            assert len(calls) == 2
+            stats = service.rate_limiter.get_stats()
+            assert stats["rate_limited"] == 1
+            assert stats["last_retry_after"] == 0.2
+        finally:
+            Path(temp_path).unlink()
+
+class TestExtractionCache:
+    """Test the persistent extraction cache"""
+
+    def test_cache_hit_miss_and_key_variants(self, tmp_path):
+        """Entries are keyed by hash, prompt digest and model"""
+        from app.services.extraction_cache import ExtractionCache
+        cache = ExtractionCache(cache_dir=str(tmp_path), max_entries=10)
+
+        assert cache.get("abc", "1.0", "model-a") is None
+        cache.put("abc", "1.0", "model-a", "Hello", "A page")
+        assert cache.get("abc", "1.0", "model-a") == ("Hello", "A page")
+        assert cache.get("abc", "2.0", "model-a") is None
+        assert cache.get("abc", "1.0", "model-b") is None
+
+        # A fresh instance reads the same entries from disk
+        reopened = ExtractionCache(cache_dir=str(tmp_path), max_entries=10)
+        assert reopened.get("abc", "1.0", "model-a") == ("Hello", "A page")
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 3
+        assert stats["entries"] == 1
+
+    def test_cache_evicts_least_recently_used(self, tmp_path):
+        """The cache stays within its size bound"""
+        from app.services.extraction_cache import ExtractionCache
+        cache = ExtractionCache(cache_dir=str(tmp_path), max_entries=5)
+
+        for i in range(8):
+            cache.put(f"hash{i}", "1.0", "model", f"text {i}", f"description {i}")
+
+        assert cache.get_stats()["entries"] <= 5
+        assert cache.get_stats()["evictions"] > 0
+        assert cache.get("hash7", "1.0", "model") == ("text 7", "description 7")
+        assert cache.get("hash0", "1.0", "model") is None
+
+    def test_analyze_screenshot_uses_cache(self, tmp_path, sample_image_bytes):
+        """Re-analyzing a known screenshot makes no API call"""
+        from app.services.extraction_cache import ExtractionCache
+        service = ClaudeService("test-api-key", extraction_cache=ExtractionCache(cache_dir=str(tmp_path / "cache")))
+        response = Mock()
+        response.content = [Mock(text='{"extracted_text": "Hello", "visual_description": "A page"}')]
+        service.client.beta.prompt_caching.messages.create = AsyncMock(return_value=response)
+
+        image_path = tmp_path / "shot.png"
+        image_path.write_bytes(sample_image_bytes)
+
+        first = asyncio.run(service.analyze_screenshot(str(image_path)))
+        second = asyncio.run(service.analyze_screenshot(str(image_path)))
+
+        assert first == second == ("Hello", "A page")
+        assert service.client.beta.prompt_caching.messages.create.call_count == 1
+        assert service.extraction_cache.get_stats()["hits"] == 1
+
+    def test_prompt_update_misses_the_cache(self, monkeypatch, tmp_path):
+        """Updating the prompt through the endpoint changes the cache key of the shared service"""
+        from app.services.extraction_cache import ExtractionCache
+        monkeypatch.chdir(tmp_path)
+        prompt_manager = PromptManager()
+        service = ClaudeService(
+            "test-api-key",
+            extraction_cache=ExtractionCache(cache_dir=str(tmp_path / "cache")),
+            prompt_manager=prompt_manager
+        )
+        monkeypatch.setattr(app.state, "prompt_manager", prompt_manager)
+        monkeypatch.setattr(app.state, "claude_service", service)
+        service._store_in_cache("abc", "Hello", "A page")
+        assert service._lookup_cache("abc") == ("Hello", "A page")
+
+        response = client.post("/prompts/update", data={"new_prompt": "NEW PROMPT"})
+
+        assert response.json()["version"] == "2.0"
+        assert service._system_blocks()[0]["text"] == "NEW PROMPT"
+        assert service._lookup_cache("abc") is None
+
+    def test_known_file_hash_is_not_recomputed(self, monkeypatch, tmp_path, sample_image_bytes):
+        """A caller-supplied hash keys the cache without hashing the file again"""
+        from app.services import claude_service as claude_module
+        from app.services.extraction_cache import ExtractionCache
+        service = ClaudeService("test-api-key", extraction_cache=ExtractionCache(cache_dir=str(tmp_path / "cache")))
+        response = Mock()
+        response.content = [Mock(text='{"extracted_text": "Hello", "visual_description": "A page"}')]
+        service.client.beta.prompt_caching.messages.create = AsyncMock(return_value=response)
+        monkeypatch.setattr(claude_module, "_md5_hexdigest", Mock(side_effect=AssertionError("re-hashed")))
+
+        image_path = tmp_path / "shot.png"
+        image_path.write_bytes(sample_image_bytes)
+        result = asyncio.run(service.analyze_screenshot(str(image_path), file_hash="knownhash"))
+
+        assert result == ("Hello", "A page")
+        assert service._lookup_cache("knownhash") == ("Hello", "A page")
+
+class TestImagePreprocessor:
+    """Test image preprocessing before analysis"""
+
+    def _encode(self, image, image_format):
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format)
+        return buffer.getvalue()
+
+    def test_small_supported_image_passes_through(self, sample_image_bytes):
+        """Images already fit for the API are sent untouched"""
+        from app.services.image_preprocessor import preprocess_image
+        assert preprocess_image(sample_image_bytes) == (sample_image_bytes, "image/png")
+
+    def test_large_image_is_downsampled(self):
+        """Retina-sized screenshots are scaled to the model's useful resolution"""
+        from app.services.image_preprocessor import preprocess_image
+        original = self._encode(Image.new('RGB', (3200, 2000), color='white'), 'PNG')
+
+        processed, media_type = preprocess_image(original)
+
+        with Image.open(io.BytesIO(processed)) as image:
+            assert max(image.size) <= settings.IMAGE_MAX_DIMENSION
+            assert image.size[0] * image.size[1] <= settings.IMAGE_MAX_PIXELS
+        assert media_type in ("image/png", "image/webp")
+
+    def test_bmp_is_converted(self):
+        """Formats the API cannot take are re-encoded"""
+        from app.services.image_preprocessor import preprocess_image
+        original = self._encode(Image.new('RGB', (64, 64), color='blue'), 'BMP')
+
+        processed, media_type = preprocess_image(original)
+
+        assert media_type == "image/png"
+        with Image.open(io.BytesIO(processed)) as image:
+            assert image.format == "PNG"
+
+    def test_analyze_screenshot_sends_converted_media_type(self, tmp_path):
+        """BMP uploads reach the API labelled with their converted format"""
+        service = ClaudeService("test-api-key")
+        service.extraction_cache = None
+        response = Mock()
+        response.content = [Mock(text='{"extracted_text": "Hello", "visual_description": "A page"}')]
+        service.client.beta.prompt_caching.messages.create = AsyncMock(return_value=response)
+
+        image_path = tmp_path / "shot.bmp"
+        Image.new('RGB', (64, 64), color='green').save(image_path, format='BMP')
+
+        asyncio.run(service.analyze_screenshot(str(image_path)))
+
+        image_block = service.client.beta.prompt_caching.messages.create.call_args.kwargs["messages"][0]["content"][0]
+        assert image_block["source"]["media_type"] == "image/png"
+
+    def test_preprocessing_failure_still_sends_png(self, monkeypatch, tmp_path):
+        """When preprocessing fails a BMP is re-encoded instead of forwarded with the wrong label"""
+        import io
+        import base64
+        from app.services import claude_service as claude_module
+        monkeypatch.setattr(claude_module, "preprocess_image", Mock(side_effect=RuntimeError("resize failed")))
+        service = ClaudeService("test-api-key")
+        image_path = tmp_path / "shot.bmp"
+        Image.new('RGB', (64, 64), color='green').save(image_path, format='BMP')
+
+        image_data, media_type = asyncio.run(service._prepare_image(str(image_path), image_path.read_bytes()))
+
+        assert media_type == "image/png"
+        assert Image.open(io.BytesIO(base64.b64decode(image_data))).format == "PNG"
+        assert service._get_media_type("shot.bmp") == "image/bmp"
+
 class TestSearchService:
     """Test search service functionality"""
     
@@ -393,6 +692,802 @@ class TestSearchService:
         service.clear_index()
         assert service.get_indexed_count() == 0
 
+def make_search_service(monkeypatch, tmp_path):
+    """SearchService with a deterministic stand-in for the embedding model"""
+    from app.services import search_service
+
+    class HashingModel:
+        def encode(self, texts, batch_size=None):
+            single = isinstance(texts, str)
+            seeds = [int(hashlib.md5(text.encode()).hexdigest()[:8], 16) for text in ([texts] if single else texts)]
+            rows = [np.abs(np.random.default_rng(seed).standard_normal(32)) for seed in seeds]
+            return rows[0] if single else np.array(rows)
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(search_service, "load_embedding_model", lambda name: HashingModel())
+    monkeypatch.setattr(settings, "EMBEDDING_STORE_DIR", str(tmp_path / "embeddings"))
+    return search_service.SearchService()
+
+@pytest.fixture
+def full_service(monkeypatch, tmp_path):
+    return make_search_service(monkeypatch, tmp_path)
+
+class TestIndexUpdates:
+    """Test upsert and removal by file hash"""
+
+    def _metadata(self, file_hash, text, description="A page"):
+        from datetime import datetime
+        return ScreenshotMetadata(
+            filename=f"{file_hash}.png", file_hash=file_hash, ocr_text=text,
+            visual_description=description, processed_at=datetime.now()
+        )
+
+    def test_simple_service_upsert_and_remove(self):
+        """The lightweight service replaces in place and removes by swapping in the last entry"""
+        from app.services.simple_search_service import SimpleSearchService
+        service = SimpleSearchService()
+        for file_hash in ["a", "b", "c"]:
+            service.index_screenshot(self._metadata(file_hash, file_hash))
+        service.index_screenshot(self._metadata("a", "updated"))
+
+        assert [s.ocr_text for s in service.screenshots] == ["updated", "b", "c"]
+        assert service.remove("a") is True
+        assert service.remove("a") is False
+        assert [s.file_hash for s in service.screenshots] == ["c", "b"]
+        assert service.rows == {"c": 0, "b": 1}
+
+    def test_reindexing_a_hash_replaces_its_row(self, full_service):
+        """Same text updates in place; changed text tombstones the old row"""
+        full_service.index_screenshots([self._metadata("h1", "invoice total"), self._metadata("h2", "login page")])
+        reevaluated = self._metadata("h1", "invoice total")
+        reevaluated.evaluation = {"confidence_score": 0.9}
+        full_service.index_screenshot(reevaluated)
+        assert len(full_service.screenshots) == 2
+        assert full_service.screenshots[0].evaluation == {"confidence_score": 0.9}
+
+        full_service.index_screenshot(self._metadata("h1", "receipt amount"))
+        assert full_service.get_indexed_count() == 2
+        assert full_service.rows["h1"] == 2
+        assert full_service._tombstones == {0}
+        results = full_service.search("invoice", top_k=5)
+        assert sorted(r.file_hash for r in results) == ["h1", "h2"]
+        assert all(r.ocr_text != "invoice total" for r in results)
+        assert [r.file_hash for r in full_service.search("receipt", top_k=5)][0] == "h1"
+
+    def test_remove_and_compaction(self, full_service, monkeypatch):
+        """Removed rows disappear from results and compaction drops them from every structure"""
+        monkeypatch.setattr(settings, "SEARCH_COMPACTION_MIN_ROWS", 2)
+        full_service.index_screenshots([self._metadata(f"h{i}", f"document number{i} shared") for i in range(6)])
+        assert full_service.remove("h1") and full_service.remove("h4")
+        assert not full_service.remove("h1")
+        assert full_service.needs_compaction()
+        assert {r.file_hash for r in full_service.search("shared", top_k=10)} == {"h0", "h2", "h3", "h5"}
+
+        asyncio.run(full_service.compact_in_background())
+        assert len(full_service.screenshots) == 4
+        assert len(full_service.vectors) == 4
+        assert full_service.ocr_terms.doc_count == 4
+        assert full_service._tombstones == set()
+        assert full_service.rows == {"h0": 0, "h2": 1, "h3": 2, "h5": 3}
+        assert {r.file_hash for r in full_service.search("shared", top_k=10)} == {"h0", "h2", "h3", "h5"}
+
+    def test_archive_compaction_keeps_referenced_embeddings(self, full_service):
+        """Replaced and removed screenshots' archived rows are dropped; live rows still map to their vectors"""
+        full_service.index_screenshots([self._metadata(f"h{i}", f"document number{i}") for i in range(4)])
+        full_service.index_screenshot(self._metadata("h1", "document number1 re-extracted"))
+        full_service.remove("h2")
+        archive = full_service.archive
+        assert archive.count == 5
+        assert full_service.compact_archive() == 2  # 2 of 5 rows are unreferenced, over the default ratio
+
+        assert archive.count == 3
+        stored = full_service._archive_vectors()
+        for row, screenshot in enumerate(full_service.screenshots):
+            if row in full_service._tombstones:
+                assert full_service._archive_rows[row] == -1
+                continue
+            expected = full_service.model.encode(full_service.get_index_text(screenshot))
+            assert np.allclose(stored[full_service._archive_rows[row]], expected)
+        assert full_service.compact_archive(force=True) == 0
+
+    def test_compaction_discarded_if_index_changes(self, full_service):
+        """A compaction that raced with an insert does not overwrite it"""
+        full_service.index_screenshots([self._metadata(f"h{i}", f"text{i}") for i in range(3)])
+        full_service.remove("h0")
+        snapshot = full_service._compaction_snapshot()
+
+        async def racing_run_io(fn, *args):
+            full_service.index_screenshot(self._metadata("h9", "late arrival"))
+            return fn(*args)
+
+        with patch("app.services.search_service.get_executors") as executors:
+            executors.return_value.run_io = racing_run_io
+            asyncio.run(full_service.compact_in_background())
+        assert len(snapshot[0]) == 2
+        assert full_service.rows["h9"] == 3
+        assert full_service._tombstones == {0}
+
+    def test_delete_endpoint(self, monkeypatch, tmp_path):
+        """DELETE /screenshots/{hash} removes the index entry and its files"""
+        import main
+        monkeypatch.setattr(main, "UPLOAD_DIR", tmp_path)
+        monkeypatch.setattr(main, "PROCESSED_DIR", tmp_path)
+        search_service = Mock()
+        search_service.remove.return_value = True
+        search_service.needs_compaction.return_value = False
+        monkeypatch.setattr(app.state, "search_service", search_service)
+        (tmp_path / "abc.png").write_bytes(b"png")
+        (tmp_path / "abc.json").write_text("{}")
+
+        response = client.delete("/screenshots/abc")
+        assert response.status_code == 200
+        assert sorted(response.json()["deleted_files"]) == ["abc.json", "abc.png"]
+        search_service.remove.assert_called_once_with("abc")
+
+        search_service.remove.return_value = False
+        assert client.delete("/screenshots/abc").status_code == 404
+
+class TestSearchWarmUp:
+    """Test deferred model loading and lexical-only search during warm-up"""
+
+    def _metadata(self, file_hash, text):
+        from datetime import datetime
+        return ScreenshotMetadata(
+            filename=f"{file_hash}.png", file_hash=file_hash, ocr_text=text,
+            visual_description="A page", processed_at=datetime.now()
+        )
+
+    def test_lexical_search_until_model_loads(self, monkeypatch, tmp_path):
+        """Rows indexed while the model loads are searchable lexically and get vectors once it is ready"""
+        import threading
+        from app.services import search_service
+        loading = threading.Event()
+        model = Mock()
+        model.encode.side_effect = lambda texts, batch_size=None: (
+            np.ones(8, dtype=np.float32) if isinstance(texts, str) else np.ones((len(texts), 8), dtype=np.float32)
+        )
+
+        def load(name):
+            loading.wait(timeout=10)
+            return model
+
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(search_service, "load_embedding_model", load)
+        monkeypatch.setattr(settings, "EMBEDDING_STORE_DIR", str(tmp_path / "embeddings"))
+        service = search_service.SearchService(warm_up_in_background=True)
+        service.index_screenshots([self._metadata("h1", "invoice total"), self._metadata("h2", "login page")])
+
+        assert not service.is_ready()
+        assert service.get_readiness()["mode"] == "lexical"
+        assert [r.file_hash for r in service.search("invoice", top_k=5)] == ["h1"]
+        assert len(service.vectors) == 0
+        model.encode.assert_not_called()
+
+        loading.set()
+        assert service._ready.wait(timeout=10)
+        assert len(service.vectors) == 2
+        assert {"lexical_index_loaded", "model_loaded", "ready"} <= set(service.get_readiness()["phases"])
+        assert {r.file_hash for r in service.search("invoice", top_k=5)} == {"h1", "h2"}
+
+    def test_no_compaction_during_warm_up(self, monkeypatch, tmp_path):
+        """Compaction waits for warm-up, and warm-up vectors invalidate an in-flight compaction"""
+        import threading
+        from app.services import search_service
+        loading = threading.Event()
+        model = Mock()
+        model.encode.side_effect = lambda texts, batch_size=None: np.ones((len(texts), 8), dtype=np.float32)
+
+        def load(name):
+            loading.wait(timeout=10)
+            return model
+
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(search_service, "load_embedding_model", load)
+        monkeypatch.setattr(settings, "EMBEDDING_STORE_DIR", str(tmp_path / "embeddings"))
+        monkeypatch.setattr(settings, "SEARCH_COMPACTION_MIN_ROWS", 1)
+        service = search_service.SearchService(warm_up_in_background=True)
+        service.index_screenshots([self._metadata(f"h{i}", f"text{i}") for i in range(3)])
+        service.remove("h0")
+
+        assert not service.needs_compaction()
+        asyncio.run(service.compact_in_background())
+        service.compact()
+        assert len(service.screenshots) == 3
+
+        generation = service._generation
+        loading.set()
+        assert service._ready.wait(timeout=10)
+        assert service._generation > generation
+        service.compact()
+        assert len(service.screenshots) == len(service.vectors) == 2
+
+    def test_model_failure_keeps_lexical_search(self, monkeypatch, tmp_path):
+        """A model that fails to load leaves a working lexical index"""
+        from app.services import search_service
+
+        def load(name):
+            raise ImportError("No module named 'sentence_transformers'")
+
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(search_service, "load_embedding_model", load)
+        monkeypatch.setattr(settings, "EMBEDDING_STORE_DIR", str(tmp_path / "embeddings"))
+        service = search_service.SearchService()
+        service.index_screenshot(self._metadata("h1", "invoice total"))
+
+        assert not service.is_ready()
+        assert "sentence_transformers" in service.get_readiness()["error"]
+        assert [r.file_hash for r in service.search("invoice", top_k=5)] == ["h1"]
+
+    def test_ready_endpoint(self, monkeypatch):
+        """/ready is 503 while the model warms up and 200 once ready or lexical-only"""
+        search_service = Mock()
+        monkeypatch.setattr(app.state, "search_service", search_service)
+
+        search_service.get_readiness.return_value = {"ready": False, "mode": "lexical", "phases": {}, "error": None}
+        assert client.get("/ready").status_code == 503
+
+        search_service.get_readiness.return_value = {"ready": True, "mode": "hybrid", "phases": {"ready": 1.0}, "error": None}
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["search"]["mode"] == "hybrid"
+
+        search_service.get_readiness.return_value = {"ready": False, "mode": "lexical", "phases": {}, "error": "ImportError"}
+        assert client.get("/ready").status_code == 200
+
+class TestEncoders:
+    """Test the pluggable embedding backends"""
+
+    def test_mean_pool_ignores_padding(self):
+        """Padding positions do not dilute the sentence embedding"""
+        from app.services.encoders import mean_pool
+        tokens = np.array([[[1.0, 2.0], [3.0, 4.0], [100.0, 100.0]]], dtype=np.float32)
+        pooled = mean_pool(tokens, np.array([[1, 1, 0]]))
+        assert pooled.tolist() == [[2.0, 3.0]]
+
+    def test_cosine_parity(self):
+        """Parity is the row-wise cosine similarity, independent of scale"""
+        from app.services.encoders import cosine_parity
+        reference = np.array([[1.0, 0.0], [0.0, 1.0]])
+        parity = cosine_parity(reference, np.array([[2.0, 0.0], [1.0, 1.0]]))
+        assert parity == pytest.approx([1.0, np.sqrt(0.5)])
+
+    def test_backend_selection(self, monkeypatch):
+        """The configured backend picks the encoder; unknown names are rejected"""
+        from app.services import encoders
+        from app.services.search_service import load_embedding_model
+        created = []
+        monkeypatch.setattr(encoders, "TorchEncoder", lambda name, quantize=False: created.append((name, quantize)))
+        monkeypatch.setattr(settings, "EMBEDDING_BACKEND", "torch-int8")
+        load_embedding_model("all-MiniLM-L6-v2")
+        assert created == [("all-MiniLM-L6-v2", True)]
+        with pytest.raises(ValueError):
+            encoders.create_encoder("all-MiniLM-L6-v2", "tensorflow")
+
+class TestSearchRanking:
+    """Test the vectorized top-k pipeline and result paging"""
+
+    def test_rank_page_masks_partitions_and_sorts(self):
+        """Only scores above the threshold are ranked; ties go to the later row"""
+        from app.services.search_service import rank_page
+        scores = np.array([0.5, 0.05, 0.9, 0.5, -np.inf, 0.7, 0.2], dtype=np.float32)
+        assert rank_page(scores, 0, 10).tolist() == [2, 5, 3, 0, 6]
+        assert rank_page(scores, 1, 2).tolist() == [5, 3]
+        assert rank_page(scores, 5, 3).tolist() == []
+        assert rank_page(scores, 0, 2, rows=np.array([0, 1, 6])).tolist() == [0, 6]
+
+    def test_pages_concatenate_to_the_full_ranking(self, full_service):
+        """Consecutive offsets return consecutive slices of the same ranking"""
+        from datetime import datetime
+        full_service.index_screenshots([
+            ScreenshotMetadata(
+                filename=f"h{i}.png", file_hash=f"h{i}", processed_at=datetime.now(),
+                ocr_text=f"shared {'invoice ' * (i % 4)} note{i}", visual_description="A page"
+            )
+            for i in range(12)
+        ])
+        ranking = [r.file_hash for r in full_service.search("shared invoice", top_k=12)]
+        pages = [r.file_hash for offset in range(0, 12, 5) for r in full_service.search("shared invoice", top_k=5, offset=offset)]
+        assert len(ranking) == 12
+        assert pages == ranking
+        assert all(isinstance(r.score, float) for r in full_service.search("shared", top_k=3))
+
+    def test_search_endpoint_pages(self, monkeypatch):
+        """limit and offset are passed through; defaults stay 5 and 1000"""
+        search_service = Mock()
+        search_service.search.return_value = []
+        monkeypatch.setattr(app.state, "search_service", search_service)
+
+        client.post("/search", json={"query": "login"})
+        assert search_service.search.call_args.kwargs == {"top_k": 5, "offset": 0}
+        client.post("/search", json={"query": ""})
+        assert search_service.search.call_args.kwargs == {"top_k": 1000, "offset": 0}
+        client.post("/search", json={"query": "login", "limit": 20, "offset": 40})
+        assert search_service.search.call_args.kwargs == {"top_k": 20, "offset": 40}
+        assert client.post("/search", json={"query": "login", "offset": -1}).status_code == 422
+
+class TestSnippets:
+    """Test field projection, snippets and full-text lookup"""
+
+    TEXT = ("Welcome back. " * 20) + "Enter your password to log in. Forgot password? " + ("Footer links. " * 20)
+
+    def test_build_snippet_covers_matches(self):
+        """The window covers the densest run of matches with offsets relative to the snippet"""
+        from app.services.snippets import build_snippet, find_term_spans
+        spans = find_term_spans(self.TEXT, ["password"])
+        snippet = build_snippet(self.TEXT, spans, width=60)
+        assert len(snippet["text"]) == 60
+        assert self.TEXT[snippet["start"]:snippet["end"]] == snippet["text"]
+        assert [snippet["text"][start:end] for start, end in snippet["highlights"]] == ["password", "password"]
+        assert build_snippet("short", [], width=60) == {"text": "short", "start": 0, "end": 5, "highlights": []}
+
+    def test_index_positions_match_text_scan(self):
+        """Spans from the BM25 index positions equal a rescan of the text"""
+        from app.services.bm25 import BM25Index
+        from app.services.snippets import find_term_spans
+        index = BM25Index(positions=True)
+        index.add(0, "Nothing here")
+        index.add(1, self.TEXT)
+        assert index.term_spans(1, ["password", "forgot", "missing"]) == find_term_spans(self.TEXT, ["password", "forgot"])
+        assert index.term_spans(0, ["password"]) == []
+
+    def test_search_projection_and_snippets(self, full_service, monkeypatch):
+        """fields and snippets shrink results; the default response is unchanged"""
+        from datetime import datetime
+        full_service.index_screenshot(ScreenshotMetadata(
+            filename="login.png", file_hash="h1", ocr_text=self.TEXT, visual_description="Blue login button",
+            processed_at=datetime.now(), evaluation={"confidence_score": 0.9, "rubric": {"ocr": 4}}
+        ))
+        monkeypatch.setattr(app.state, "search_service", full_service)
+
+        full = client.post("/search", json={"query": "password"}).json()
+        assert full[0]["ocr_text"] == self.TEXT and full[0]["evaluation"]["rubric"] == {"ocr": 4}
+
+        projected = client.post("/search", json={"query": "password", "fields": ["score"]}).json()
+        assert projected == [{"file_hash": "h1", "score": 0.9}]
+
+        snippet_mode = client.post("/search", json={"query": "password", "snippets": True}).json()[0]
+        assert "ocr_text" not in snippet_mode and "evaluation" not in snippet_mode
+        ocr_snippet = snippet_mode["snippets"]["ocr_text"]
+        assert [ocr_snippet["text"][start:end] for start, end in ocr_snippet["highlights"]] == ["password", "password"]
+        assert len(json.dumps(snippet_mode)) < len(json.dumps(full[0]))
+
+        assert client.post("/search", json={"query": "password", "fields": ["secret"]}).status_code == 422
+
+    def test_get_screenshot_by_hash(self, monkeypatch):
+        """Full text is fetched on demand by hash"""
+        from datetime import datetime
+        from app.services.simple_search_service import SimpleSearchService
+        service = SimpleSearchService()
+        service.index_screenshot(ScreenshotMetadata(
+            filename="a.png", file_hash="h1", ocr_text=self.TEXT, visual_description="A page", processed_at=datetime.now()
+        ))
+        monkeypatch.setattr(app.state, "search_service", service)
+        response = client.get("/screenshots/h1")
+        assert response.status_code == 200
+        assert response.json()["ocr_text"] == self.TEXT
+        assert "embedding" not in response.json()
+        assert client.get("/screenshots/missing-hash").status_code == 404
+
+class TestBatchedIndexing:
+    """Test bulk indexing APIs"""
+
+    def test_encode_in_batches_sorts_by_length_and_keeps_order(self):
+        """Texts are encoded longest-first in fixed-size batches, rows come back in input order"""
+        from app.services.search_service import encode_in_batches
+
+        class RecordingModel:
+            def __init__(self):
+                self.batches = []
+
+            def encode(self, texts, batch_size=None):
+                self.batches.append(list(texts))
+                return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+        texts = ["a", "ccc", "bb", "dddddd", "ee"]
+        model = RecordingModel()
+        embeddings = encode_in_batches(model, texts, batch_size=2)
+
+        assert model.batches == [["dddddd", "ccc"], ["bb", "ee"], ["a"]]
+        assert embeddings[:, 0].tolist() == [1, 3, 2, 6, 2]
+
+    def test_simple_search_index_screenshots_replaces_duplicates(self):
+        """The lightweight service accepts batches and keeps one entry per hash"""
+        from app.services.simple_search_service import SimpleSearchService
+        from datetime import datetime
+        service = SimpleSearchService()
+
+        def metadata(file_hash, text):
+            return ScreenshotMetadata(
+                filename=f"{file_hash}.png", file_hash=file_hash, ocr_text=text,
+                visual_description="A page", processed_at=datetime.now()
+            )
+
+        service.index_screenshot(metadata("h1", "old"))
+        service.index_screenshots([metadata("h1", "new"), metadata("h2", "other")], [None, None])
+
+        assert service.get_indexed_count() == 2
+        assert {s.ocr_text for s in service.screenshots} == {"new", "other"}
+        assert len(service.search("", top_k=1, offset=1)) == 1
+
+class TestVectorStore:
+    """Test the contiguous normalized embedding matrix"""
+
+    def test_growth_keeps_rows_normalized(self):
+        """Appends past the initial capacity keep every row, L2-normalized"""
+        from app.services.vector_store import VectorStore
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((10, 8)).astype(np.float32)
+        store = VectorStore(initial_capacity=3)
+        for vector in vectors:
+            store.add(vector)
+
+        assert len(store) == 10
+        assert store.matrix.dtype == np.float32
+        assert np.allclose(np.linalg.norm(store.matrix, axis=1), 1.0, atol=1e-6)
+
+        query = rng.standard_normal(8).astype(np.float32)
+        expected = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+        assert np.allclose(store.scores(query), expected, atol=1e-5)
+
+        store.clear()
+        assert len(store) == 0
+        assert store.scores(query).shape == (0,)
+
+    def test_top_k_matches_full_sort(self):
+        """argpartition top-k returns the same ranking as a full argsort"""
+        from app.services.vector_store import top_k_indices
+        scores = np.random.default_rng(1).random(1000)
+        assert list(top_k_indices(scores, 5)) == list(np.argsort(scores)[-5:][::-1])
+        assert len(top_k_indices(scores[:3], 10)) == 3
+
+    def test_quantized_scores_approximate_float(self):
+        """int8 codes track float scores closely; binary codes preserve the ranking coarsely"""
+        from app.services.vector_store import VectorStore
+        rng = np.random.default_rng(3)
+        vectors = rng.standard_normal((500, 384)).astype(np.float32)
+        query = vectors[7] + 0.1 * rng.standard_normal(384).astype(np.float32)
+        exact = VectorStore()
+        exact.add(vectors)
+
+        int8 = VectorStore(quantization="int8")
+        int8.add(vectors)
+        assert int8.nbytes * 3.5 < exact.nbytes
+        assert np.abs(int8.scores(query) - exact.scores(query)).max() < 0.02
+        assert np.allclose(int8.matrix, exact.matrix, atol=0.01)
+
+        binary = VectorStore(quantization="binary")
+        binary.add(vectors)
+        assert binary.nbytes * 30 < exact.nbytes
+        assert np.argmax(binary.scores(query)) == 7
+        assert np.allclose(binary.row_scores(query, np.array([7, 8])), binary.scores(query)[[7, 8]])
+
+        compacted = int8.compacted(np.array([7, 9]))
+        assert len(compacted) == 2
+        assert np.array_equal(compacted.matrix, int8.matrix[[7, 9]])
+
+        with pytest.raises(ValueError):
+            VectorStore(quantization="float16")
+
+    def test_quantized_search_rescores_to_float_results(self, monkeypatch, tmp_path):
+        """Quantized stores return the float store's top-k after exact rescoring"""
+        from datetime import datetime
+        words = ["login", "invoice", "settings", "profile", "error", "report", "chart", "email"]
+        rng = np.random.default_rng(4)
+        screenshots = [
+            ScreenshotMetadata(
+                filename=f"h{i}.png", file_hash=f"h{i}", processed_at=datetime.now(),
+                ocr_text=" ".join([*rng.choice(words, 3), f"note{i}"]), visual_description="A page"
+            )
+            for i in range(80)
+        ]
+
+        rankings = {}
+        for mode in ["none", "int8", "binary"]:
+            monkeypatch.setattr(settings, "VECTOR_QUANTIZATION", mode)
+            (tmp_path / mode).mkdir()
+            service = make_search_service(monkeypatch, tmp_path / mode)
+            service.index_screenshots([s.model_copy() for s in screenshots])
+            assert service.screenshots[0].embedding is None
+            rankings[mode] = [
+                [(r.file_hash, round(r.score, 4)) for r in service.search(query, top_k=5)]
+                for query in ["login error", "chart", "invoice report email"]
+            ]
+        assert rankings["int8"] == rankings["none"]
+        assert rankings["binary"] == rankings["none"]
+
+class TestEmbeddingArchive:
+    """Test on-disk embedding persistence"""
+
+    def test_rows_survive_reopen_as_memmap(self, tmp_path):
+        """Appended embeddings are memory-mapped back by key after a restart"""
+        from app.services.vector_store import EmbeddingArchive
+        vectors = np.random.default_rng(0).standard_normal((3, 4)).astype(np.float32)
+        archive = EmbeddingArchive(str(tmp_path), "model-a")
+        archive.append(["a", "b"], vectors[:2])
+        archive.append(["c"], vectors[2])
+
+        reopened = EmbeddingArchive(str(tmp_path), "model-a")
+        stored = reopened.memmap()
+        assert reopened.rows == {"a": 0, "b": 1, "c": 2}
+        assert isinstance(stored, np.memmap)
+        assert np.array_equal(stored[reopened.rows["b"]], vectors[1])
+
+    def test_model_change_and_torn_writes(self, tmp_path):
+        """Another model's embeddings are discarded; incomplete rows are trimmed"""
+        from app.services.vector_store import EmbeddingArchive
+        archive = EmbeddingArchive(str(tmp_path), "model-a")
+        archive.append(["a", "b"], np.ones((2, 4), dtype=np.float32))
+        with open(archive.vectors_path, "ab") as f:
+            f.write(b"\x00" * 6)  # Half-written third row without a key
+
+        trimmed = EmbeddingArchive(str(tmp_path), "model-a")
+        assert trimmed.count == 2
+        assert archive.vectors_path.stat().st_size == 2 * 4 * 4
+
+        switched = EmbeddingArchive(str(tmp_path), "model-b")
+        assert switched.count == 0
+        assert switched.memmap() is None
+        assert not archive.vectors_path.exists()
+
+    def test_backend_recorded_in_manifest(self, tmp_path):
+        """Embeddings of another encoder backend are discarded like another model's"""
+        import json
+        from app.services.vector_store import EmbeddingArchive
+        archive = EmbeddingArchive(str(tmp_path), "model-a", "torch")
+        archive.append(["a"], np.ones((1, 4), dtype=np.float32))
+        assert json.loads(archive.manifest_path.read_text())["backend"] == "torch"
+
+        assert EmbeddingArchive(str(tmp_path), "model-a", "torch").count == 1
+        switched = EmbeddingArchive(str(tmp_path), "model-a", "onnx-int8")
+        assert switched.count == 0
+        switched.append(["a"], np.ones((1, 4), dtype=np.float32))
+        assert json.loads(switched.manifest_path.read_text())["backend"] == "onnx-int8"
+
+    def test_compact_rewrites_referenced_keys(self, tmp_path):
+        """Compaction keeps the newest row of each kept key in order and survives a reopen"""
+        from app.services.vector_store import EmbeddingArchive
+        vectors = np.arange(20, dtype=np.float32).reshape(5, 4)
+        archive = EmbeddingArchive(str(tmp_path), "model-a")
+        archive.append(["a", "b", "c", "d"], vectors[:4])
+        archive.append(["b"], vectors[4])  # Supersedes row 1
+
+        assert archive.compact({"a", "b", "x"}) == 3
+        assert archive.rows == {"a": 0, "b": 1}
+        reopened = EmbeddingArchive(str(tmp_path), "model-a")
+        assert reopened.rows == {"a": 0, "b": 1}
+        assert np.array_equal(reopened.memmap(), vectors[[0, 4]])
+        assert reopened.compact({"a", "b"}) == 0
+
+    def test_files_without_manifest_are_discarded(self, tmp_path):
+        """A compaction interrupted between swapping files leaves nothing to misread"""
+        from app.services.vector_store import EmbeddingArchive
+        archive = EmbeddingArchive(str(tmp_path), "model-a")
+        archive.append(["a", "b"], np.ones((2, 4), dtype=np.float32))
+        archive.manifest_path.unlink()
+
+        reopened = EmbeddingArchive(str(tmp_path), "model-a")
+        assert reopened.count == 0
+        assert not archive.vectors_path.exists()
+        reopened.append(["c"], np.zeros((1, 4), dtype=np.float32))
+        assert reopened.rows == {"c": 0}
+
+class TestAnnIndex:
+    """Test the IVF approximate nearest-neighbour index"""
+
+    def _clustered_store(self, size=2000, dim=16):
+        from app.services.vector_store import VectorStore
+        rng = np.random.default_rng(0)
+        centres = rng.standard_normal((20, dim))
+        store = VectorStore()
+        store.add(centres[rng.integers(20, size=size)] + 0.3 * rng.standard_normal((size, dim)))
+        return store, centres
+
+    def test_untrained_index_is_exact(self):
+        """Below min_rows the IVF index scores every row"""
+        from app.services.ann_index import IVFFlatIndex
+        store, centres = self._clustered_store(size=50)
+        index = IVFFlatIndex(store, min_rows=100)
+        index.add(0, len(store))
+
+        rows, scores = index.search(centres[0])
+        assert index.centroids is None
+        assert list(rows) == list(range(50))
+        assert np.allclose(scores, store.scores(centres[0]))
+
+    def test_recall_against_exact_search(self):
+        """Probing a few lists finds most of the exact top-10, probing all finds every one"""
+        from app.services.ann_index import IVFFlatIndex
+        from app.services.vector_store import top_k_indices
+        store, centres = self._clustered_store()
+        index = IVFFlatIndex(store, nlist=32, nprobe=4, min_rows=0)
+        index.train()
+
+        def top_rows(query):
+            rows, scores = index.search(query)
+            return set(rows[top_k_indices(scores, 10)].tolist())
+
+        queries = centres + 0.3 * np.random.default_rng(1).standard_normal(centres.shape)
+        exact = [set(top_k_indices(store.scores(query), 10).tolist()) for query in queries]
+        recall = np.mean([len(top_rows(query) & truth) / 10 for query, truth in zip(queries, exact)])
+        assert recall >= 0.9
+
+        index.nprobe = 32
+        assert all(top_rows(query) == truth for query, truth in zip(queries, exact))
+
+    def test_incremental_insert_is_searchable(self):
+        """Rows added after training land in a list and are returned for their own query"""
+        from app.services.ann_index import IVFFlatIndex
+        store, centres = self._clustered_store()
+        index = IVFFlatIndex(store, nlist=32, nprobe=1, min_rows=0)
+        index.train()
+
+        vector = centres[3] * 2
+        start = store.add(vector)
+        index.add(start, 1)
+
+        rows, scores = index.search(vector)
+        assert start in rows
+        assert rows[np.argmax(scores)] == start
+        assert index.trained_rows == 2000
+
+    def test_retrains_after_growth(self):
+        """Centroids are rebuilt once the store outgrows the trained size"""
+        from app.services.ann_index import IVFFlatIndex
+        store, _ = self._clustered_store(size=100)
+        index = IVFFlatIndex(store, nlist=4, min_rows=100, retrain_growth=2.0)
+        index.add(0, len(store))
+        assert index.trained_rows == 100
+
+        more = np.random.default_rng(2).standard_normal((100, 16))
+        index.add(store.add(more), len(more))
+        assert index.trained_rows == 200
+        assert sum(len(rows) for rows in index._lists) == 200
+
+class TestQueryEmbeddingCache:
+    """Test the in-memory query embedding cache"""
+
+    def test_hits_are_keyed_by_model_and_normalized_query(self):
+        """Whitespace variants share an entry, other models do not"""
+        from app.services.query_cache import QueryEmbeddingCache
+        cache = QueryEmbeddingCache(max_entries=10, ttl_seconds=0)
+        vector = np.ones(4, dtype=np.float32)
+
+        assert cache.get("model-a", "login button") is None
+        cache.put("model-a", "login button", vector)
+        assert cache.get("model-a", "  login   button ") is vector
+        assert cache.get("model-b", "login button") is None
+        assert not vector.flags.writeable
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 2
+        assert stats["hit_rate"] == 0.333
+
+    def test_lru_eviction_and_ttl(self, monkeypatch):
+        """Least recently used entries go first and stale entries expire"""
+        from app.services import query_cache
+        now = [1000.0]
+        monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+        cache = query_cache.QueryEmbeddingCache(max_entries=2, ttl_seconds=60)
+
+        cache.put("m", "a", np.zeros(2))
+        cache.put("m", "b", np.zeros(2))
+        cache.get("m", "a")
+        cache.put("m", "c", np.zeros(2))
+        assert cache.get("m", "b") is None
+        assert cache.get("m", "a") is not None
+
+        now[0] += 61
+        assert cache.get("m", "c") is None
+        assert cache.get_stats()["evictions"] == 1
+        assert cache.get_stats()["expirations"] == 1
+
+    def test_repeat_search_skips_encoding(self):
+        """SearchService only runs the model once for a repeated query"""
+        from unittest.mock import MagicMock
+        from app.services.query_cache import QueryEmbeddingCache
+        from app.services.search_service import SearchService as FullSearchService
+        service = FullSearchService.__new__(FullSearchService)
+        service.model_name = "test-model"
+        service.model = MagicMock()
+        service.model.encode.return_value = np.ones(4, dtype=np.float32)
+        service.query_cache = QueryEmbeddingCache(max_entries=10)
+
+        service._encode_query("login")
+        service._encode_query("login ")
+        assert service.model.encode.call_count == 1
+
+class TestBM25Index:
+    """Test BM25 lexical scoring"""
+
+    TEXTS = [
+        "Login button, click here",
+        "Sign-in page with a LOGIN form and a login link",
+        "Settings menu: dark mode toggle",
+        "",
+        "Invoice total due",
+    ]
+
+    def _index(self):
+        from app.services.bm25 import BM25Index
+        index = BM25Index(k1=1.2, b=0.75)
+        for doc_id, text in enumerate(self.TEXTS):
+            index.add(doc_id, text)
+        return index
+
+    def test_scores_match_reference_bm25(self):
+        """Vectorized sparse scores equal a per-document BM25 computation"""
+        from app.services.bm25 import tokenize
+        index = self._index()
+        docs = [tokenize(text) for text in self.TEXTS]
+        average_length = sum(len(doc) for doc in docs) / len(docs)
+
+        def reference(terms):
+            idf = {t: np.log1p((len(docs) - sum(t in d for d in docs) + 0.5) / (sum(t in d for d in docs) + 0.5)) for t in terms}
+            scores = []
+            for doc in docs:
+                score = 0.0
+                for t in terms:
+                    tf = doc.count(t)
+                    score += idf[t] * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * len(doc) / average_length))
+                scores.append(min(score / sum(idf.values()), 1.0))
+            return scores
+
+        for query in ["login", "login form", "dark toggle", "invoice missingword"]:
+            assert np.allclose(index.scores(tokenize(query)), reference(tokenize(query)), atol=1e-5), query
+        assert index.scores([]).tolist() == [0.0] * 5
+
+    def test_rare_terms_outweigh_common_ones(self):
+        """A match on a rare term scores higher than a match on a common one"""
+        index = self._index()
+        scores = index.scores(["login", "invoice"])
+        assert scores[4] > scores[0] > 0
+        assert scores[2] == 0.0
+
+    def test_incremental_add_is_scored(self):
+        """Documents added after a query are included in the next one"""
+        index = self._index()
+        assert index.scores(["toolbar"]).tolist() == [0.0] * 5
+        index.add(5, "Toolbar with a search field")
+        scores = index.scores(["toolbar"])
+        assert len(scores) == 6 and scores[5] > 0
+        with pytest.raises(ValueError):
+            index.add(9, "out of order")
+
+        index.clear()
+        assert index.scores(["toolbar"]).shape == (0,)
+
+    def test_interleaved_adds_append_segments(self):
+        """Adding between queries builds small segments that merge, with the same scores as one build"""
+        from app.services.bm25 import BM25Index
+        rng = np.random.default_rng(0)
+        words = ["login", "invoice", "settings", "toolbar", "error", "chart"]
+        texts = [" ".join(rng.choice(words, size=rng.integers(1, 8))) for _ in range(200)]
+        incremental = BM25Index()
+        for doc_id, text in enumerate(texts):
+            incremental.add(doc_id, text)
+            incremental.scores(["login"])
+        batch = BM25Index()
+        for doc_id, text in enumerate(texts):
+            batch.add(doc_id, text)
+        for query in [["login"], ["chart", "error"], ["toolbar", "missing"]]:
+            assert np.allclose(incremental.scores(query), batch.scores(query), atol=1e-6)
+        assert len(incremental._segments) <= 8
+
+    def test_removed_documents_leave_the_statistics(self):
+        """After a removal, scores equal an index that never held the document"""
+        from app.services.bm25 import BM25Index
+        index = self._index()
+        index.remove(1)
+        index.remove(1)
+        fresh = BM25Index(k1=1.2, b=0.75)
+        for doc_id, text in enumerate(self.TEXTS[:1] + self.TEXTS[2:]):
+            fresh.add(doc_id, text)
+        for query in [["login"], ["login", "form"], ["invoice", "dark"]]:
+            scores = index.scores(query)
+            assert scores[1] == 0.0
+            assert np.allclose(np.delete(scores, 1), fresh.scores(query), atol=1e-6)
+
 class TestEvaluationService:
     """Test evaluation service"""
     
@@ -423,6 +1518,597 @@ class TestEvaluationService:
         assert result["confidence_score"] < 0.5
         assert len(result["overall_suggestions"]) > 0
 
+class TestIngestionPipeline:
+    """Test the concurrent screenshot ingestion pipeline"""
+
+    def test_process_screenshots_concurrent_and_ordered(self, monkeypatch, tmp_path):
+        """Files are extracted concurrently but indexed in upload order"""
+        import main
+
+        files = [
+            {"filename": f"shot{i}.png", "saved_as": f"hash{i}.png", "hash": f"hash{i}"}
+            for i in range(6)
+        ]
+        active = 0
+        peak = 0
+
+        async def fake_analyze(image_path, file_hash=None):
+            nonlocal active, peak
+            assert file_hash == Path(image_path).stem  # Hash from the upload, not recomputed
+            active += 1
+            peak = max(peak, active)
+            index = int(Path(image_path).stem[len("hash"):])
+            # Later files finish first to exercise the ordering buffer
+            await asyncio.sleep(0.01 * (len(files) - index))
+            active -= 1
+            return f"text {index}", f"description {index}"
+
+        claude_service = Mock()
+        claude_service.analyze_screenshot = fake_analyze
+        search_service = Mock()
+        monkeypatch.setattr(app.state, "claude_service", claude_service)
+        monkeypatch.setattr(app.state, "search_service", search_service)
+        monkeypatch.setattr(app.state, "prompt_manager", Mock())
+        monkeypatch.setattr(main, "PROCESSED_DIR", tmp_path)
+        monkeypatch.setattr(settings, "INGEST_MAX_WORKERS", 3)
+
+        monkeypatch.setattr(main, "_ingestion_runs", {})
+
+        asyncio.run(main.process_screenshots(files))
+
+        indexed = [
+            metadata.file_hash
+            for call in search_service.index_screenshots.call_args_list
+            for metadata in call.args[0]
+        ]
+        assert indexed == [f["hash"] for f in files]
+        assert peak == 3
+        assert len(list(tmp_path.glob("*.json"))) == len(files)
+        (progress,) = main._ingestion_runs.values()
+        assert progress["completed"] == len(files)
+        assert progress["in_progress"] == []
+        assert progress["finished_at"] is not None
+
+    def test_embedding_uses_the_shared_model(self, monkeypatch, tmp_path):
+        """Ingestion embeds with the search service's loaded model, not a per-process copy"""
+        import main
+        from datetime import datetime
+        service = make_search_service(monkeypatch, tmp_path)
+        monkeypatch.setattr(app.state, "search_service", service)
+        monkeypatch.setattr(main, "get_executors", Mock(return_value=Mock(
+            run_cpu=AsyncMock(side_effect=AssertionError("process pool used")),
+            run_io=AsyncMock(side_effect=lambda fn, *args: fn(*args))
+        )))
+        metadatas = [
+            ScreenshotMetadata(filename=f"{h}.png", file_hash=h, ocr_text=text, visual_description="A page", processed_at=datetime.now())
+            for h, text in [("h1", "invoice total"), ("h2", "login page")]
+        ]
+
+        embeddings = asyncio.run(main._embed_batch_for_index(metadatas))
+
+        for metadata, embedding in zip(metadatas, embeddings):
+            assert np.allclose(embedding, service.model.encode(service.get_index_text(metadata)))
+        service._ready.clear()
+        assert asyncio.run(main._embed_batch_for_index(metadatas)) == [None, None]
+
+    def test_concurrent_runs_keep_separate_progress(self, monkeypatch, tmp_path):
+        """Two overlapping runs with the same filenames do not disturb each other"""
+        import main
+
+        async def fake_analyze(image_path, file_hash=None):
+            await asyncio.sleep(0.01)
+            return "text", "description"
+
+        claude_service = Mock()
+        claude_service.analyze_screenshot = fake_analyze
+        monkeypatch.setattr(app.state, "claude_service", claude_service)
+        monkeypatch.setattr(app.state, "search_service", Mock())
+        monkeypatch.setattr(app.state, "prompt_manager", Mock())
+        monkeypatch.setattr(main, "PROCESSED_DIR", tmp_path)
+        monkeypatch.setattr(main, "_ingestion_runs", {})
+
+        def run_files(prefix):
+            return [{"filename": f"shot{i}.png", "saved_as": f"{prefix}{i}.png", "hash": f"{prefix}{i}"} for i in range(4)]
+
+        async def overlapping():
+            await asyncio.gather(main.process_screenshots(run_files("a")), main.process_screenshots(run_files("b")))
+
+        asyncio.run(overlapping())
+        assert [run["completed"] for run in main._ingestion_runs.values()] == [4, 4]
+        assert all(run["in_progress"] == [] for run in main._ingestion_runs.values())
+
+    def test_results_of_cancelled_job_are_not_indexed(self, monkeypatch, tmp_path):
+        """A job cancelled while extraction is in flight indexes nothing afterwards"""
+        import main
+
+        files = [{"filename": f"shot{i}.png", "saved_as": f"hash{i}.png", "hash": f"hash{i}"} for i in range(3)]
+        job_queue = JobQueue(db_path=str(tmp_path / "jobs.db"))
+        job_id = job_queue.create_job("upload", files)
+        files = job_queue.get_pending_files(job_id)
+
+        async def fake_analyze(image_path, file_hash=None):
+            # The session is cleared while this request is in flight
+            job_queue.cancel_unfinished_jobs()
+            return "text", "description"
+
+        claude_service = Mock()
+        claude_service.analyze_screenshot = fake_analyze
+        search_service = Mock()
+        monkeypatch.setattr(app.state, "job_queue", job_queue)
+        monkeypatch.setattr(app.state, "claude_service", claude_service)
+        monkeypatch.setattr(app.state, "search_service", search_service)
+        monkeypatch.setattr(app.state, "prompt_manager", Mock())
+        monkeypatch.setattr(main, "PROCESSED_DIR", tmp_path)
+
+        asyncio.run(main.process_screenshots(files, job_id=job_id))
+        search_service.index_screenshots.assert_not_called()
+
+    def test_files_parked_behind_an_earlier_file_are_not_final(self, monkeypatch, tmp_path):
+        """Later files finished first stay resumable until the earlier file lets them into the index"""
+        import main
+
+        files = [{"filename": f"shot{i}.png", "saved_as": f"hash{i}.png", "hash": f"hash{i}"} for i in range(3)]
+        job_queue = JobQueue(db_path=str(tmp_path / "jobs.db"))
+        job_id = job_queue.create_job("upload", files)
+        files = job_queue.get_pending_files(job_id)
+        embedded = []
+
+        async def fake_embed(metadatas):
+            embedded.extend(metadata.file_hash for metadata in metadatas)
+            return [None] * len(metadatas)
+
+        claude_service = Mock()
+        search_service = Mock()
+        monkeypatch.setattr(app.state, "job_queue", job_queue)
+        monkeypatch.setattr(app.state, "claude_service", claude_service)
+        monkeypatch.setattr(app.state, "search_service", search_service)
+        monkeypatch.setattr(app.state, "prompt_manager", Mock())
+        monkeypatch.setattr(main, "PROCESSED_DIR", tmp_path)
+        monkeypatch.setattr(main, "_embed_batch_for_index", fake_embed)
+        monkeypatch.setattr(main, "_ingestion_runs", {})
+        monkeypatch.setattr(settings, "INGEST_MAX_WORKERS", 3)
+
+        async def scenario():
+            release_first = asyncio.Event()
+
+            async def fake_analyze(image_path, file_hash=None):
+                if file_hash == "hash0":
+                    await release_first.wait()
+                return f"text {file_hash}", "description"
+
+            claude_service.analyze_screenshot = fake_analyze
+            task = asyncio.create_task(main.process_screenshots(files, job_id=job_id))
+            while sorted(embedded) != ["hash1", "hash2"]:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+
+            search_service.index_screenshots.assert_not_called()
+            assert [f["hash"] for f in job_queue.get_pending_files(job_id)] == ["hash0", "hash1", "hash2"]
+            (progress,) = main._ingestion_runs.values()
+            assert progress["completed"] == 0
+
+            release_first.set()
+            await task
+
+        asyncio.run(scenario())
+        assert job_queue.get_pending_files(job_id) == []
+        indexed = [m.file_hash for call in search_service.index_screenshots.call_args_list for m in call.args[0]]
+        assert indexed == ["hash0", "hash1", "hash2"]
+        assert main._ingestion_runs[job_id]["completed"] == 3
+
+    def test_process_screenshots_packed_groups(self, monkeypatch, tmp_path):
+        """With packing enabled files are extracted in groups and still indexed in order"""
+        import main
+
+        files = [
+            {"filename": f"shot{i}.png", "saved_as": f"hash{i}.png", "hash": f"hash{i}"}
+            for i in range(5)
+        ]
+        groups = []
+
+        async def fake_packed(image_paths, file_hashes=None):
+            groups.append([Path(path).stem for path in image_paths])
+            assert file_hashes == {path: Path(path).stem for path in image_paths}
+            # hash3 has no packed entry and must go through the single-image path
+            return {
+                path: (f"packed {Path(path).stem}", "A page")
+                for path in image_paths if not path.endswith("hash3.png")
+            }
+
+        claude_service = Mock()
+        claude_service.analyze_screenshots_packed = fake_packed
+        claude_service.analyze_screenshot = AsyncMock(return_value=("single", "A page"))
+        search_service = Mock()
+        monkeypatch.setattr(app.state, "claude_service", claude_service)
+        monkeypatch.setattr(app.state, "search_service", search_service)
+        monkeypatch.setattr(app.state, "prompt_manager", Mock())
+        monkeypatch.setattr(main, "PROCESSED_DIR", tmp_path)
+        monkeypatch.setattr(settings, "CLAUDE_PACK_SIZE", 2)
+
+        asyncio.run(main.process_screenshots(files))
+
+        # The last file is alone, so it uses a plain single-image request
+        assert sorted(groups) == [["hash0", "hash1"], ["hash2", "hash3"]]
+        assert claude_service.analyze_screenshot.await_count == 2
+        indexed = [metadata for call in search_service.index_screenshots.call_args_list for metadata in call.args[0]]
+        assert [metadata.file_hash for metadata in indexed] == [f["hash"] for f in files]
+        assert indexed[3].ocr_text == "single"
+
+class TestExecutors:
+    """Test the ingestion executor pools"""
+
+    def test_cpu_work_runs_in_worker_process(self):
+        """Evaluation runs in a separate process and queue depth is tracked"""
+        import os
+        from app.services.executors import IngestExecutors
+        executors = IngestExecutors(cpu_workers=1, io_workers=2)
+
+        async def run():
+            evaluation_service = EvaluationService()
+            evaluation = await executors.run_cpu(evaluation_service.evaluate_extraction, "Login page text", "A login form")
+            return evaluation, await executors.run_cpu(os.getpid)
+
+        try:
+            evaluation, worker_pid = asyncio.run(run())
+        finally:
+            executors.shutdown()
+
+        assert "confidence_score" in evaluation
+        assert worker_pid != os.getpid()
+        stats = executors.get_stats()
+        assert stats["cpu"]["queue_depth"] == 0
+        assert stats["cpu"]["completed"] == 2
+
+    def test_status_reports_executors(self):
+        """The status endpoint exposes pool sizes and queue depth"""
+        response = client.get("/status")
+        assert response.status_code == 200
+        assert "queue_depth" in response.json()["executors"]["cpu"]
+
+class TestJobQueue:
+    """Test durable ingestion jobs"""
+
+    def test_job_progress_endpoint(self, monkeypatch, tmp_path, sample_image_bytes):
+        """A processed job reports every file as indexed"""
+        import main
+
+        upload_dir = tmp_path / "uploads"
+        upload_dir.mkdir()
+        files = []
+        for i in range(3):
+            (upload_dir / f"hash{i}.png").write_bytes(sample_image_bytes)
+            files.append({"filename": f"shot{i}.png", "saved_as": f"hash{i}.png", "hash": f"hash{i}"})
+
+        job_queue = JobQueue(db_path=str(tmp_path / "jobs.db"))
+        claude_service = Mock()
+        claude_service.analyze_screenshot = AsyncMock(return_value=("Sample text", "Sample description"))
+        monkeypatch.setattr(app.state, "job_queue", job_queue)
+        monkeypatch.setattr(app.state, "claude_service", claude_service)
+        monkeypatch.setattr(app.state, "search_service", Mock())
+        monkeypatch.setattr(app.state, "prompt_manager", Mock())
+        monkeypatch.setattr(main, "UPLOAD_DIR", upload_dir)
+        monkeypatch.setattr(main, "PROCESSED_DIR", tmp_path)
+
+        job_id = job_queue.create_job("upload", files)
+        asyncio.run(main.process_job(job_id))
+
+        response = client.get(f"/jobs/{job_id}")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "completed"
+        assert data["counts"]["indexed"] == 3
+        assert data["remaining"] == 0
+        assert data["throughput_per_minute"] > 0
+        assert [f["state"] for f in data["files"]] == ["indexed"] * 3
+
+    def test_unknown_job(self):
+        """Unknown job ids return 404"""
+        response = client.get("/jobs/does-not-exist")
+        assert response.status_code == 404
+
+    def test_resume_requeues_interrupted_files(self, tmp_path):
+        """Files interrupted mid-processing are queued again after a restart"""
+        db_path = str(tmp_path / "jobs.db")
+        job_queue = JobQueue(db_path=db_path)
+        files = [{"filename": f"shot{i}.png", "saved_as": f"hash{i}.png", "hash": f"hash{i}"} for i in range(3)]
+        job_id = job_queue.create_job("upload", files)
+        job_queue.start_job(job_id)
+        job_queue.update_file_state(job_id, 0, "indexed")
+        job_queue.update_file_state(job_id, 1, "extracting")
+
+        # Simulate a restart with a fresh connection to the same database
+        restarted = JobQueue(db_path=db_path)
+        assert restarted.get_resumable_jobs() == [job_id]
+        assert [f["position"] for f in restarted.get_pending_files(job_id)] == [1, 2]
+        assert restarted.get_job(job_id)["counts"]["queued"] == 2
+
+        restarted.cancel_unfinished_jobs()
+        assert restarted.get_resumable_jobs() == []
+
+class TestMessageBatches:
+    """Test Message Batches ingestion against the local stub server"""
+
+    def _stub_service(self, tmp_path):
+        import httpx
+        from anthropic_stub_server import app as stub_app
+        from app.services.extraction_cache import ExtractionCache
+        http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_app))
+        return ClaudeService(
+            "test-api-key",
+            extraction_cache=ExtractionCache(cache_dir=str(tmp_path / "cache")),
+            base_url="http://anthropic-stub",
+            http_client=http_client
+        )
+
+    def test_batch_with_interactive_fallback(self, monkeypatch, tmp_path):
+        """Batch results are parsed and errored items fall back to interactive requests"""
+        from anthropic_stub_server import stub_state
+        monkeypatch.setitem(stub_state, "batches", {})
+        monkeypatch.setitem(stub_state, "interactive_requests", 0)
+        monkeypatch.setitem(stub_state, "polls_until_ended", 2)
+        monkeypatch.setitem(stub_state, "fail_custom_ids", {"img-1"})
+        monkeypatch.setattr(settings, "CLAUDE_BATCH_POLL_INTERVAL", 0)
+
+        image_paths = []
+        for i in range(3):
+            image = Image.new('RGB', (20, 20), color=(i * 80, 0, 0))
+            image_path = tmp_path / f"shot{i}.png"
+            image.save(image_path, format='PNG')
+            image_paths.append(str(image_path))
+
+        service = self._stub_service(tmp_path)
+        results = asyncio.run(service.analyze_screenshots_batch(image_paths))
+
+        assert set(results) == set(image_paths)
+        assert all(text.startswith("Stub text") for text, _ in results.values())
+        assert len(stub_state["batches"]) == 1
+        assert stub_state["interactive_requests"] == 1
+
+        # Everything is cached now, so a rerun submits nothing
+        rerun = asyncio.run(self._stub_service(tmp_path).analyze_screenshots_batch(image_paths))
+        assert rerun == results
+        assert len(stub_state["batches"]) == 1
+
+    def test_batch_split_by_count_and_bytes(self, monkeypatch, tmp_path):
+        """Large inputs are submitted as several bounded batches"""
+        from anthropic_stub_server import stub_state
+        monkeypatch.setitem(stub_state, "batches", {})
+        monkeypatch.setitem(stub_state, "interactive_requests", 0)
+        monkeypatch.setitem(stub_state, "polls_until_ended", 1)
+        monkeypatch.setitem(stub_state, "fail_custom_ids", set())
+        monkeypatch.setattr(settings, "CLAUDE_BATCH_POLL_INTERVAL", 0)
+        monkeypatch.setattr(settings, "CLAUDE_BATCH_MAX_REQUESTS", 2)
+
+        image_paths = []
+        for i in range(5):
+            image_path = tmp_path / f"split{i}.png"
+            Image.new('RGB', (20, 20), color=(0, i * 50, 0)).save(image_path, format='PNG')
+            image_paths.append(str(image_path))
+
+        results = asyncio.run(self._stub_service(tmp_path).analyze_screenshots_batch(image_paths))
+        assert set(results) == set(image_paths)
+        assert len(stub_state["batches"]) == 3
+        assert stub_state["interactive_requests"] == 0
+
+        monkeypatch.setitem(stub_state, "batches", {})
+        monkeypatch.setattr(settings, "CLAUDE_BATCH_MAX_REQUESTS", 500)
+        monkeypatch.setattr(settings, "CLAUDE_BATCH_MAX_BYTES", 1)
+        asyncio.run(self._stub_service(tmp_path / "fresh").analyze_screenshots_batch(image_paths))
+        assert len(stub_state["batches"]) == 5
+
+    def test_folder_batch_mode_is_opt_in(self, monkeypatch, tmp_path, sample_image_bytes):
+        """/process-folder uses interactive extraction unless batch mode is requested"""
+        import main
+        folder = tmp_path / "folder"
+        folder.mkdir()
+        for i in range(3):
+            (folder / f"shot{i}.png").write_bytes(sample_image_bytes + bytes([i]))
+        (tmp_path / "uploads").mkdir()
+        monkeypatch.setattr(main, "UPLOAD_DIR", tmp_path / "uploads")
+        monkeypatch.setattr(main, "PROCESSED_DIR", tmp_path)
+        monkeypatch.setattr(main, "process_job", AsyncMock())
+        monkeypatch.setattr(app.state, "claude_service", Mock())
+        monkeypatch.setattr(app.state, "search_service", Mock())
+        monkeypatch.setattr(app.state, "job_queue", JobQueue(db_path=str(tmp_path / "jobs.db")))
+        monkeypatch.setattr(settings, "CLAUDE_BATCH_MIN_FILES", 1)
+
+        assert client.post("/process-folder", data={"folder_path": str(folder)}).json()["extraction_mode"] == "interactive"
+        response = client.post("/process-folder", data={"folder_path": str(folder), "batch": "true"})
+        assert response.json()["extraction_mode"] == "batch"
+
+    def test_batch_job_indexes_in_order(self, monkeypatch, tmp_path, sample_image_bytes):
+        """Batch-mode jobs evaluate and index every file in upload order"""
+        import main
+
+        upload_dir = tmp_path / "uploads"
+        upload_dir.mkdir()
+        files = []
+        for i in range(4):
+            (upload_dir / f"hash{i}.png").write_bytes(sample_image_bytes)
+            files.append({"filename": f"shot{i}.png", "saved_as": f"hash{i}.png", "hash": f"hash{i}"})
+
+        claude_service = Mock()
+        claude_service.analyze_screenshots_batch = AsyncMock(return_value={
+            str(upload_dir / f["saved_as"]): (f"text {i}", f"description {i}") for i, f in enumerate(files)
+        })
+        search_service = Mock()
+        job_queue = JobQueue(db_path=str(tmp_path / "jobs.db"))
+        monkeypatch.setattr(app.state, "job_queue", job_queue)
+        monkeypatch.setattr(app.state, "claude_service", claude_service)
+        monkeypatch.setattr(app.state, "search_service", search_service)
+        monkeypatch.setattr(app.state, "prompt_manager", Mock())
+        monkeypatch.setattr(main, "UPLOAD_DIR", upload_dir)
+        monkeypatch.setattr(main, "PROCESSED_DIR", tmp_path)
+
+        job_id = job_queue.create_job("folder:test", files, mode="batch")
+        asyncio.run(main.process_job(job_id))
+
+        claude_service.analyze_screenshots_batch.assert_awaited_once()
+        indexed = [
+            metadata.file_hash
+            for call in search_service.index_screenshots.call_args_list
+            for metadata in call.args[0]
+        ]
+        assert indexed == [f["hash"] for f in files]
+        job = job_queue.get_job(job_id)
+        assert job["mode"] == "batch"
+        assert job["status"] == "completed"
+
+class TestPromptCaching:
+    """Test the cached system prompt prefix"""
+
+    def test_prefix_is_written_once_then_read(self, monkeypatch, tmp_path):
+        """The second screenshot reads the system prefix cached by the first"""
+        import httpx
+        from anthropic_stub_server import app as stub_app, stub_state
+        monkeypatch.setitem(stub_state, "cached_prefixes", set())
+
+        service = ClaudeService(
+            "test-api-key",
+            base_url="http://anthropic-stub",
+            http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_app))
+        )
+        service.extraction_cache = None
+
+        image_paths = []
+        for i in range(2):
+            image_path = tmp_path / f"cached{i}.png"
+            Image.new('RGB', (20, 20), color=(0, 0, i * 100)).save(image_path, format='PNG')
+            image_paths.append(str(image_path))
+
+        async def analyze_all():
+            return [await service.analyze_screenshot(path) for path in image_paths]
+
+        asyncio.run(analyze_all())
+
+        stats = service.get_usage_stats()
+        assert stats["requests"] == 2
+        assert stats["cache_creation_input_tokens"] > 0
+        assert stats["cache_read_input_tokens"] == stats["cache_creation_input_tokens"]
+        assert stats["cache_hit_requests"] == 1
+        assert stats["parse_paths"]["tool_use"] == 2
+
+    def test_prompt_is_a_cached_system_prefix(self):
+        """The instructions precede the image as a cache_control system block"""
+        service = ClaudeService("test-api-key")
+        params = service._build_message_params("aGVsbG8=", "image/png")
+
+        assert params["system"][0]["cache_control"] == {"type": "ephemeral"}
+        assert params["system"][0]["text"] == service.prompt_manager.get_current_prompt("ocr_and_visual")
+        assert params["messages"][0]["content"][0]["type"] == "image"
+        assert service._build_packed_message_params([("aGVsbG8=", "image/png")] * 2)["system"] == params["system"]
+
+class TestStructuredOutput:
+    """Test schema-enforced extraction through a forced tool call"""
+
+    def test_tool_input_is_parsed_strictly(self):
+        """Valid tool input is used as-is; malformed input raises instead of guessing"""
+        from types import SimpleNamespace
+        service = ClaudeService("test-api-key")
+        params = service._build_message_params("aGVsbG8=", "image/png")
+        assert params["tool_choice"] == {"type": "tool", "name": params["tools"][0]["name"]}
+
+        valid = [SimpleNamespace(type="tool_use", input={"extracted_text": " Hello ", "visual_description": "A page"})]
+        assert service._parse_message_content(valid) == ("Hello", "A page")
+
+        invalid = [SimpleNamespace(type="tool_use", input={"extracted_text": "Hello"})]
+        with pytest.raises(ValueError):
+            service._parse_message_content(invalid)
+
+        assert service.parse_stats["tool_use"] == 1
+        assert service.parse_stats["invalid_tool_input"] == 1
+
+    def test_text_fallback_paths_are_counted(self):
+        """Plain text responses record which fallback parser handled them"""
+        from types import SimpleNamespace
+        service = ClaudeService("test-api-key")
+        responses = [
+            '```json\n{"extracted_text": "Hi", "visual_description": "A page"}\n```',
+            "OCR_TEXT: Hi\nVISUAL_DESCRIPTION: A page",
+        ]
+        for text in responses:
+            service._parse_message_content([SimpleNamespace(type="text", text=text)])
+
+        stats = service.get_usage_stats()
+        assert stats["parse_paths"]["json"] == 1
+        assert stats["parse_paths"]["labelled_sections"] == 1
+        assert stats["parse_fallback_rate"] == 1.0
+
+class TestPackedExtraction:
+    """Test extracting several screenshots per Claude request"""
+
+    def _image_paths(self, tmp_path, count):
+        image_paths = []
+        for i in range(count):
+            image_path = tmp_path / f"packed{i}.png"
+            Image.new('RGB', (20, 20), color=(0, i * 60, 0)).save(image_path, format='PNG')
+            image_paths.append(str(image_path))
+        return image_paths
+
+    def test_packed_request_against_stub(self, monkeypatch, tmp_path):
+        """Three screenshots are extracted by one request and then cached"""
+        import httpx
+        from anthropic_stub_server import app as stub_app, stub_state
+        from app.services.extraction_cache import ExtractionCache
+        monkeypatch.setitem(stub_state, "interactive_requests", 0)
+
+        def stub_service():
+            return ClaudeService(
+                "test-api-key",
+                extraction_cache=ExtractionCache(cache_dir=str(tmp_path / "cache")),
+                base_url="http://anthropic-stub",
+                http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_app))
+            )
+
+        image_paths = self._image_paths(tmp_path, 3)
+        results = asyncio.run(stub_service().analyze_screenshots_packed(image_paths))
+
+        assert stub_state["interactive_requests"] == 1
+        assert [results[path][0] for path in image_paths] == [
+            f"Stub text for image {index} of 3" for index in range(1, 4)
+        ]
+
+        rerun = asyncio.run(stub_service().analyze_screenshots_packed(image_paths))
+        assert rerun == results
+        assert stub_state["interactive_requests"] == 1
+
+    def test_invalid_entries_fall_back_to_single_requests(self, tmp_path):
+        """Images without a valid packed entry are retried one by one"""
+        service = ClaudeService("test-api-key")
+        service.extraction_cache = None
+        calls = []
+
+        async def create(**kwargs):
+            image_count = sum(
+                1 for block in kwargs["messages"][0]["content"] if block["type"] == "image"
+            )
+            calls.append(image_count)
+            response = Mock()
+            if image_count > 1:
+                response.content = [Mock(text=json.dumps([
+                    {"image_index": 3, "extracted_text": "third", "visual_description": "Third page"},
+                    {"image_index": 1, "extracted_text": "first", "visual_description": "First page"},
+                    {"image_index": 2, "extracted_text": "second"}
+                ]))]
+            else:
+                response.content = [Mock(text='{"extracted_text": "single", "visual_description": "Single page"}')]
+            return response
+
+        service.client.beta.prompt_caching.messages.create = create
+        image_paths = self._image_paths(tmp_path, 3)
+        results = asyncio.run(service.analyze_screenshots_packed(image_paths))
+
+        assert calls == [3, 1]
+        assert results[image_paths[0]] == ("first", "First page")
+        assert results[image_paths[1]] == ("single", "Single page")
+        assert results[image_paths[2]] == ("third", "Third page")
+
+    def test_unindexed_array_of_wrong_length_is_rejected(self):
+        """A short array without image_index cannot be lined up with the input"""
+        service = ClaudeService("test-api-key")
+        content = json.dumps([{"extracted_text": "a", "visual_description": "b"}])
+        assert service._parse_packed_response(content, 2) == [None, None]
+
 class TestSessionManagement:
     """Test session management and cleanup"""
     
@@ -14,7 +14,7 @@ interface FileValidationResult {
   invalidFiles: File[];
 }
 
-const MAX_FILE_SIZE = 1024 * 1024; // 1MB in bytes
+const MAX_FILE_SIZE = 10 * 1024 * 1024; // 10MB in bytes
 const ALLOWED_IMAGE_TYPES = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp', 'image/bmp'];
 
 const UnifiedUpload: React.FC<UnifiedUploadProps> = ({ 
@@ -99,12 +99,12 @@ const UnifiedUpload: React.FC<UnifiedUploadProps> = ({
     }
     
     if (validation.oversizedFiles.length > 0) {
-      errors.push(`${validation.oversizedFiles.length} files over 1MB limit skipped`);
+      errors.push(`${validation.oversizedFiles.length} files over 10MB limit skipped`);
     }
 
     if (validation.validFiles.length === 0) {
       setUploadStatus('error');
-      setUploadMessage('No valid images found. Please select images under 1MB.');
+      setUploadMessage('No valid images found. Please select images under 10MB.');
       setValidationErrors(errors);
       return;
     }
@@ -178,7 +178,7 @@ const UnifiedUpload: React.FC<UnifiedUploadProps> = ({
       <div className="flex items-center gap-2 mb-4">
         <FileImage className="w-5 h-5 text-red-500" />
         <h3 className="text-lg font-semibold text-white">Add Your Visual Memories</h3>
-        <div className="ml-auto text-xs text-gray-400">Max 1MB per image</div>
+        <div className="ml-auto text-xs text-gray-400">Max 10MB per image</div>
       </div>
       
       {/* Main Upload Area */}
@@ -224,7 +224,7 @@ const UnifiedUpload: React.FC<UnifiedUploadProps> = ({
                   Drop images here or choose what to upload
                 </p>
                 <p className="text-sm text-gray-400 mb-4">
-                  Supported: JPEG, PNG, GIF, WebP, BMP • Max size: 1MB each
+                  Supported: JPEG, PNG, GIF, WebP, BMP • Max size: 10MB each
                 </p>
                 
                 {/* Action Buttons */}
@@ -315,7 +315,7 @@ const UnifiedUpload: React.FC<UnifiedUploadProps> = ({
           <h4 className="text-white font-medium mb-2">Upload Requirements:</h4>
           <ul className="text-sm text-gray-300 space-y-1">
             <li>• Only image files (JPEG, PNG, GIF, WebP, BMP)</li>
-            <li>• Maximum file size: 1MB per image</li>
+            <li>• Maximum file size: 10MB per image</li>
             <li>• You can select multiple images or an entire folder</li>
             <li>• Drag and drop is also supported</li>
           </ul>
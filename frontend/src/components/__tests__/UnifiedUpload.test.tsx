@@ -34,14 +34,14 @@ describe('UnifiedUpload Component', () => {
     expect(screen.getByText('Drop images here or choose what to upload')).toBeInTheDocument();
     expect(screen.getByText('Select Images')).toBeInTheDocument();
     expect(screen.getByText('Select Folder')).toBeInTheDocument();
-    expect(screen.getByText('Max 1MB per image')).toBeInTheDocument();
+    expect(screen.getByText('Max 10MB per image')).toBeInTheDocument();
   });
 
   test('shows file size and type restrictions', () => {
     render(<UnifiedUpload {...mockProps} />);
     
     expect(screen.getByText(/Supported: JPEG, PNG, GIF, WebP, BMP/)).toBeInTheDocument();
-    expect(screen.getByText(/Max size: 1MB each/)).toBeInTheDocument();
+    expect(screen.getByText(/Max size: 10MB each/)).toBeInTheDocument();
   });
 
   test('validates file types correctly', async () => {
@@ -74,7 +74,7 @@ describe('UnifiedUpload Component', () => {
 
     render(<UnifiedUpload {...mockProps} />);
     
-    const oversizedFile = createMockFile('large.png', 2000000, 'image/png'); // 2MB
+    const oversizedFile = createMockFile('large.png', 12000000, 'image/png'); // 12MB
     const validFile = createMockFile('small.png', 500000, 'image/png'); // 500KB
     
     const fileInput = screen.getByText('Select Images').closest('div')?.querySelector('input[type="file"]') as HTMLInputElement;
@@ -87,7 +87,7 @@ describe('UnifiedUpload Component', () => {
     fireEvent.change(fileInput);
 
     await waitFor(() => {
-      expect(screen.getByText(/files over 1MB limit skipped/)).toBeInTheDocument();
+      expect(screen.getByText(/files over 10MB limit skipped/)).toBeInTheDocument();
     });
   });
 
@@ -152,7 +152,7 @@ describe('UnifiedUpload Component', () => {
     fireEvent.change(fileInput);
 
     await waitFor(() => {
-      expect(screen.getByText('No valid images found. Please select images under 1MB.')).toBeInTheDocument();
+      expect(screen.getByText('No valid images found. Please select images under 10MB.')).toBeInTheDocument();
     });
   });
 
@@ -172,7 +172,7 @@ describe('UnifiedUpload Component', () => {
     await waitFor(() => {
       expect(screen.getByText('Upload Requirements:')).toBeInTheDocument();
       expect(screen.getByText(/Only image files \(JPEG, PNG, GIF, WebP, BMP\)/)).toBeInTheDocument();
-      expect(screen.getByText(/Maximum file size: 1MB per image/)).toBeInTheDocument();
+      expect(screen.getByText(/Maximum file size: 10MB per image/)).toBeInTheDocument();
     });
   });
 